@@ -25,6 +25,8 @@ ENHANCEMENTS, OR MODIFICATIONS.
 
 from boac.api import cache_utils
 from boac.api.util import admin_required
+from boac.externals import data_loch
+from boac.lib import search_index
 from boac.lib.http import tolerant_jsonify
 from boac.merged.sis_terms import current_term_id
 from boac.models.job_progress import JobProgress
@@ -55,6 +57,12 @@ def clear_cachejob():
     })
 
 
+@app.route('/api/admin/data_loch/query_stats')
+@admin_required
+def get_data_loch_query_stats():
+    return tolerant_jsonify(data_loch.get_query_stats())
+
+
 @app.route('/api/admin/manually_added_advisees')
 @admin_required
 def get_manually_added_advisees():
@@ -62,6 +70,12 @@ def get_manually_added_advisees():
     return tolerant_jsonify([{'sid': advisee.sid} for advisee in advisees])
 
 
+@app.route('/api/admin/search_index')
+@admin_required
+def get_search_index_status():
+    return tolerant_jsonify(search_index.get_status())
+
+
 @app.route('/api/admin/cachejob/continue')
 @admin_required
 def start_continuation_of_interrupted_job():
@@ -24,12 +24,17 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import copy
+from datetime import datetime
+from queue import Empty, Queue
 import re
 from threading import Thread
+import time
 
 from boac import std_commit
 from boac.externals import data_loch
-from boac.merged.sis_terms import all_term_ids, current_term_id
+from boac.merged.sis_terms import all_term_ids, current_term_id, end_term_context, start_term_context
 from boac.models.alert import Alert
 from boac.models.curated_group import CuratedGroupStudent
 from boac.models.job_progress import JobProgress
@@ -90,55 +95,236 @@ def continue_request_handler():
         }
 
 
-def background_thread_refresh(app_arg, term_id):
+def background_thread_refresh(app_arg, term_id, continuation=False):
     with app_arg.app_context():
         try:
             refresh_current_term_index()
-            load_term(term_id)
-            JobProgress().end()
+            # Resolve term metadata once for the duration of the job.
+            start_term_context()
+            failed_stages = load_term(term_id, continuation=continuation)
+            # Cached cohort results predate the refresh, whether or not every stage succeeded.
+            clear_cohort_query_cache()
+            if failed_stages:
+                app.logger.error(f'Background thread is stopping after failed stages: {failed_stages}')
+                JobProgress().update(f"Failed stages: {', '.join(failed_stages)}")
+            else:
+                JobProgress().end()
+                rebuild_typeahead_indexes()
         except Exception as e:
             app.logger.exception(e)
             app.logger.error('Background thread is stopping')
             JobProgress().update(f'An unexpected error occured: {e}')
             raise e
+        finally:
+            end_term_context()
+
+
+def load_term(term_id=current_term_id(use_cache=False), continuation=False):
+    """Run the refresh stages for one term, or for all terms, and return names of any stages that failed."""
+    term_ids = all_term_ids() if term_id == 'all' else [term_id]
+    return run_refresh_stages(refresh_stages(term_ids), continuation=continuation)
+
+
+class RefreshStage:
+
+    def __init__(self, name, run, depends_on=()):
+        self.name = name
+        self.run = run
+        self.depends_on = depends_on
+
+
+class StageProgress:
+    """Items (cohorts, curated groups) already handled by a stage, so that a continuation can skip them."""
+
+    def __init__(self, stage_name, done, checkpoints):
+        self.stage_name = stage_name
+        self.done = set(done)
+        self._checkpoints = checkpoints
+        self._pending = []
+
+    def flush(self):
+        if self._pending:
+            self._checkpoints.put((self.stage_name, self._pending))
+            self._pending = []
+
+    def mark_done(self, item_id):
+        self.done.add(item_id)
+        self._pending.append(item_id)
+        if len(self._pending) >= app.config['REFRESH_JOB_CHECKPOINT_BATCH_SIZE']:
+            self.flush()
+
+
+def refresh_stages(term_ids):
+    stages = [RefreshStage(f'alerts_{t}', lambda progress, t=t: refresh_alerts(t)) for t in term_ids]
+    this_term_id = current_term_id()
+    if this_term_id in term_ids:
+        stages += [
+            RefreshStage('department_memberships', lambda progress: refresh_department_memberships()),
+            RefreshStage(
+                'calnet_attributes',
+                lambda progress: refresh_calnet_attributes(),
+                depends_on=['department_memberships'],
+            ),
+            RefreshStage(
+                'filtered_cohort_counts',
+                lambda progress: load_filtered_cohort_counts(progress),
+                # Department refresh deletes orphaned memberships, so cohorts and groups are counted after it.
+                depends_on=[f'alerts_{this_term_id}', 'department_memberships', 'calnet_attributes'],
+            ),
+            RefreshStage(
+                'curated_group_lists',
+                lambda progress: update_curated_group_lists(progress),
+                depends_on=['department_memberships', 'calnet_attributes'],
+            ),
+            RefreshStage('summary_profiles', lambda progress: refresh_summary_profiles(this_term_id)),
+        ]
+    return stages
+
+
+def run_refresh_stages(stages, continuation=False):
+    """Run stages on a bounded worker pool, each as soon as the stages it depends on are done.
+
+    Stage status, duration and item checkpoints are recorded in JobProgress, from this thread only. On continuation,
+    stages already done are skipped and a partly done stage resumes after its last checkpoint. Stages that fail, and
+    stages depending on them, are left for a continuation; their names are returned.
+    """
+    return RefreshScheduler(stages, continuation).run()
+
+
+class RefreshScheduler:
+
+    def __init__(self, stages, continuation):
+        self.checkpoints = Queue()
+        self.running = {}
+        job_state = JobProgress().get() or {}
+        self.stage_states = copy.deepcopy(job_state.get('stages', {})) if continuation else {}
+        for stage in stages:
+            state = self.stage_states.setdefault(stage.name, {'doneItems': []})
+            if state.get('status') != 'done':
+                state['status'] = 'pending'
+        self.pending = [stage for stage in stages if self.stage_states[stage.name]['status'] != 'done']
+        self.saved_at = time.time()
+        self.unsaved_checkpoints = False
+
+    def run(self):
+        max_workers = app.config['REFRESH_JOB_MAX_WORKERS']
+        executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+        try:
+            while self.pending or self.running:
+                done_names = {name for name, state in self.stage_states.items() if state['status'] == 'done'}
+                for stage in [s for s in self.pending if set(s.depends_on) <= done_names]:
+                    self.pending.remove(stage)
+                    self.running[self._submit(executor, stage)] = stage
+                if not self.running:
+                    break
+                finished, _ = wait(self.running, timeout=1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._finish(future)
+                if not finished:
+                    self._save_checkpoints()
+        finally:
+            if executor:
+                executor.shutdown()
+        return [name for name, state in self.stage_states.items() if state['status'] != 'done']
+
+    def _finish(self, future):
+        stage = self.running.pop(future)
+        state = self.stage_states[stage.name]
+        state['end'] = _now()
+        error = future.exception()
+        if error:
+            app.logger.error(f'Stage {stage.name} failed', exc_info=error)
+            state.update({'status': 'failed', 'error': str(error)})
+            self._record(f'Stage {stage.name} failed: {error}')
+        else:
+            state.update({'status': 'done', 'duration': round(future.result(), 3)})
+            app.logger.info(f"Stage {stage.name} done in {state['duration']} seconds")
+            self._record(f'Stage {stage.name} done')
+
+    def _drain_checkpoints(self):
+        drained = False
+        while True:
+            try:
+                stage_name, item_ids = self.checkpoints.get_nowait()
+            except Empty:
+                return drained
+            self.stage_states[stage_name]['doneItems'] += item_ids
+            drained = True
+
+    def _record(self, description):
+        self._drain_checkpoints()
+        self._save(description)
+
+    def _save(self, description):
+        JobProgress().update(description, properties={'stages': copy.deepcopy(self.stage_states)})
+        self.saved_at = time.time()
+        self.unsaved_checkpoints = False
+
+    def _save_checkpoints(self):
+        # Between stage events, save new checkpoints now and then, without logging a step for each save.
+        self.unsaved_checkpoints = self._drain_checkpoints() or self.unsaved_checkpoints
+        if self.unsaved_checkpoints and time.time() - self.saved_at >= app.config['REFRESH_JOB_CHECKPOINT_INTERVAL']:
+            self._save(None)
+
+    def _submit(self, executor, stage):
+        state = self.stage_states[stage.name]
+        state.update({'status': 'running', 'start': _now(), 'end': None, 'duration': None, 'error': None})
+        self._record(f'Stage {stage.name} started')
+        progress = StageProgress(stage.name, state['doneItems'], self.checkpoints)
+        if executor:
+            return executor.submit(_run_stage, app._get_current_object(), stage, progress)
+        # With a single worker, run the stage in this thread and context.
+        future = Future()
+        try:
+            future.set_result(_run_stage(None, stage, progress))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
 
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-def load_all_terms():
-    job_progress = JobProgress().get()
-    terms_done = job_progress.get('terms_done', [])
-    all_terms = all_term_ids()
-    while terms_done != all_terms:
-        if len(terms_done) == len(all_terms):
-            app.logger.error(f'Unexpected terms_done value; stopping load: {terms_done}')
-            return
-        term_id = next(t for t in all_terms if t not in terms_done)
-        load_term(term_id)
-        terms_done.append(term_id)
-        JobProgress().update(f'Term {term_id} loaded', properties={'terms_done': terms_done})
 
+def _run_stage(app_arg, stage, progress):
+    start = time.time()
+    try:
+        if app_arg:
+            # Each worker gets an app context, and with it a database session, of its own.
+            with app_arg.app_context():
+                start_term_context()
+                try:
+                    stage.run(progress)
+                finally:
+                    end_term_context()
+        else:
+            stage.run(progress)
+    finally:
+        progress.flush()
+    return time.time() - start
 
-def load_term(term_id=current_term_id(use_cache=False)):
-    if term_id == 'all':
-        load_all_terms()
-        return
 
-    JobProgress().update(f'About to refresh alerts for term {term_id}')
-    refresh_alerts(term_id)
+def clear_cohort_query_cache():
+    from boac.merged import student
+    student.clear_cohort_query_cache()
+    std_commit()
 
-    if term_id == current_term_id():
-        JobProgress().update('About to refresh department memberships')
-        refresh_department_memberships()
-        JobProgress().update('About to refresh CalNet attributes for active users')
-        refresh_calnet_attributes()
-        JobProgress().update('About to load filtered cohort counts')
-        load_filtered_cohort_counts()
-        JobProgress().update('About to update curated group memberships')
-        update_curated_group_lists()
+
+def rebuild_typeahead_indexes():
+    if app.config['TYPEAHEAD_INDEX_ENABLED']:
+        from boac.merged.advisor_directory import advisor_directory
+        from boac.merged.student_name_index import student_name_index
+        student_name_index.rebuild()
+        advisor_directory.rebuild()
 
 
 def refresh_alerts(term_id):
-    Alert.deactivate_all_for_term(term_id)
-    Alert.update_all_for_term(term_id)
+    Alert.update_all_for_term(term_id, deactivate_missing=True)
+
+
+def refresh_summary_profiles(term_id):
+    from boac.merged import student
+    student.refresh_summary_profiles(term_id)
 
 
 def refresh_calnet_attributes():
@@ -156,6 +342,7 @@ def refresh_current_term_index():
     from boac.models import json_cache
     json_cache.clear('current_term_index')
     sis_terms.get_current_term_index()
+    sis_terms.refresh_term_context()
     app.logger.info('Cached current and future SIS terms')
 
 
@@ -190,20 +377,17 @@ def refresh_department_memberships():
     Scheduler.delete_orphans()
 
 
-def load_filtered_cohort_counts():
+def load_filtered_cohort_counts(progress=None):
     from boac.models.cohort_filter import CohortFilter
-    for cohort in CohortFilter.query.all():
-        # Remove!
-        cohort.clear_sids_and_student_count()
-        cohort.update_alert_count(None)
-        # Reload!
-        cohort.to_api_json(include_students=False, include_alerts_for_user_id=cohort.owner_id)
+    CohortFilter.refresh_all_counts(progress)
 
 
-def update_curated_group_lists():
+def update_curated_group_lists(progress=None):
     """Remove no-longer-accessible students from curated group lists."""
     from boac.models.curated_group import CuratedGroup
     for curated_group in CuratedGroup.query.all():
+        if progress and curated_group.id in progress.done:
+            continue
         all_sids = CuratedGroupStudent.get_sids(curated_group.id)
         available_students = [s['sid'] for s in data_loch.get_student_profiles(all_sids)]
         if len(all_sids) > len(available_students):
@@ -211,3 +395,5 @@ def update_curated_group_lists():
             app.logger.info(f'Deleting inaccessible SIDs from curated group {curated_group.id}: {unavailable_sids}')
             for sid in unavailable_sids:
                 CuratedGroup.remove_student(curated_group.id, sid)
+        if progress:
+            progress.mark_done(curated_group.id)
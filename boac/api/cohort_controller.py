@@ -122,12 +122,14 @@ def get_cohort(cohort_id):
     include_students = True if include_students is None else include_students
     offset = get_param(request.args, 'offset', 0)
     limit = get_param(request.args, 'limit', 50)
+    cursor = get_param(request.args, 'cursor', None)
     benchmark('begin cohort filter query')
     cohort = CohortFilter.find_by_id(
         int(cohort_id),
         order_by=order_by,
         offset=int(offset),
         limit=int(limit),
+        cursor=cursor,
         include_alerts_for_user_id=current_user.get_id(),
         include_profiles=True,
         include_students=include_students,
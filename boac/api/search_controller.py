@@ -29,12 +29,13 @@ from itertools import islice
 from boac import db
 from boac.api.errors import BadRequestError, ForbiddenRequestError
 from boac.api.util import add_alert_counts, advising_data_access_required, advisor_required, ce3_required, is_unauthorized_search
-from boac.externals.data_loch import get_enrolled_primary_sections, get_enrolled_primary_sections_for_parsed_code, match_advising_note_authors_by_name
+from boac.externals.data_loch import get_enrolled_primary_sections, get_enrolled_primary_sections_for_parsed_code
 from boac.lib import util
 from boac.lib.http import tolerant_jsonify
 from boac.merged.admitted_student import search_for_admitted_students
-from boac.merged.advising_appointment import search_advising_appointments
-from boac.merged.advising_note import search_advising_notes
+from boac.merged.advising_appointment import search_advising_appointments_page
+from boac.merged.advising_note import search_advising_notes_page
+from boac.merged.advisor_directory import match_advising_note_authors_by_name
 from boac.merged.calnet import get_uid_for_csid
 from boac.merged.sis_terms import current_term_id
 from boac.merged.student import search_for_students
@@ -214,7 +215,7 @@ def _appointments_search(search_phrase, params):
     if datetime_from and datetime_to and datetime_to <= datetime_from:
         raise BadRequestError('dateFrom must be less than dateTo')
 
-    appointment_results = search_advising_appointments(
+    appointment_results, next_cursor = search_advising_appointments_page(
         search_phrase=search_phrase,
         advisor_uid=advisor_uid,
         student_csid=student_csid,
@@ -223,9 +224,11 @@ def _appointments_search(search_phrase, params):
         datetime_to=datetime_to,
         offset=offset,
         limit=limit,
+        cursor=appointment_options.get('cursor'),
     )
     return {
         'appointments': appointment_results,
+        'appointmentsNextCursor': next_cursor,
     }
 
 
@@ -235,15 +238,19 @@ def _student_search(search_phrase, params, order_by):
         order_by=order_by,
         offset=util.get(params, 'offset', 0),
         limit=util.get(params, 'limit', 50),
+        cursor=util.get(params, 'cursor'),
     )
     students = student_results['students']
     sids = [s['sid'] for s in students]
     alert_counts = Alert.current_alert_counts_for_sids(current_user.get_id(), sids)
     add_alert_counts(alert_counts, students)
-    return {
+    feed = {
         'students': students,
         'totalStudentCount': student_results['totalStudentCount'],
     }
+    if 'nextCursor' in student_results:
+        feed['nextCursor'] = student_results['nextCursor']
+    return feed
 
 
 def _course_search(search_phrase):
@@ -324,7 +331,7 @@ def _notes_search(search_phrase, params):
     if datetime_from and datetime_to and datetime_to <= datetime_from:
         raise BadRequestError('dateFrom must be less than dateTo')
 
-    notes_results = search_advising_notes(
+    notes_results, next_cursor = search_advising_notes_page(
         search_phrase=search_phrase,
         author_csid=author_csid,
         author_uid=author_uid,
@@ -334,7 +341,9 @@ def _notes_search(search_phrase, params):
         datetime_to=datetime_to,
         offset=offset,
         limit=limit,
+        cursor=note_options.get('cursor'),
     )
     return {
         'notes': notes_results,
+        'notesNextCursor': next_cursor,
     }
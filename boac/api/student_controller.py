@@ -25,9 +25,10 @@ ENHANCEMENTS, OR MODIFICATIONS.
 
 from boac.api.errors import BadRequestError, ResourceNotFoundError
 from boac.api.util import advisor_required, put_notifications
-from boac.externals.data_loch import match_students_by_name_or_sid, query_historical_sids
+from boac.externals.data_loch import query_historical_sids
 from boac.lib.http import tolerant_jsonify
 from boac.merged.student import get_student_and_terms_by_sid, get_student_and_terms_by_uid, query_students
+from boac.merged.student_name_index import match_students_by_name_or_sid
 from flask import current_app as app, request
 from flask_login import login_required
 
@@ -39,6 +39,7 @@ from boac.lib import util
 from boac.lib.http import response_with_csv_download, tolerant_jsonify
 from boac.lib.util import to_bool_or_none
 from boac.merged import calnet
+from boac.merged.advisor_directory import calnet_users_for_uids
 from boac.merged.user_session import UserSession
 from boac.models.appointment import Appointment
 from boac.models.authorized_user import AuthorizedUser
@@ -248,7 +249,7 @@ def user_search():
             users = AuthorizedUser.users_with_uid_like(snippet, include_deleted=True)
         else:
             users = AuthorizedUser.get_all_active_users(include_deleted=True)
-        users = list(calnet.get_calnet_users_for_uids(app, [u.uid for u in users]).values())
+        users = list(calnet_users_for_uids([u.uid for u in users]).values())
         if not search_by_uid:
             any_ = r'.*'
             pattern = re.compile(any_ + any_.join(snippet.split()) + any_, re.IGNORECASE)
@@ -24,10 +24,9 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 from functools import wraps
-import json
 
 from boac.api.errors import BadRequestError, ResourceNotFoundError
-from boac.externals.data_loch import get_admitted_students_by_sids, get_sis_holds, get_student_profiles
+from boac.externals.data_loch import get_admitted_students_by_sids, get_sis_holds, get_student_profiles, parse_json
 from boac.lib.berkeley import dept_codes_where_advising
 from boac.lib.http import response_with_csv_download
 from boac.lib.util import join_if_present
@@ -285,7 +284,7 @@ def put_notifications(student):
             },
         })
     for row in get_sis_holds(sid):
-        hold = json.loads(row['feed'])
+        hold = parse_json(row['feed'])
         reason = hold.get('reason', {})
         student['notifications']['hold'].append({
             **hold,
@@ -431,7 +430,7 @@ def response_with_students_csv_download(sids, fieldnames, benchmark):
 
     for student in get_student_profiles(sids=sids):
         profile = student.get('profile')
-        profile = profile and json.loads(profile)
+        profile = profile and parse_json(profile)
         profile['academicStanding'] = _get_last_element(academic_standing.get(profile['sid']))
         profile['termGpa'] = _get_last_element(term_gpas.get(profile['sid']))
         row = {}
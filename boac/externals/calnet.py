@@ -23,11 +23,16 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from contextlib import contextmanager
 import os
+from queue import Empty, Full, LifoQueue
 import ssl
+from threading import Lock
+import time
 
 from boac.lib import mockingbird
 import ldap3
+from ldap3.core.exceptions import LDAPCommunicationError
 
 SCHEMA_DICT = {
     'berkeleyEduAffiliations': 'affiliations',
@@ -46,6 +51,10 @@ SCHEMA_DICT = {
 
 BATCH_QUERY_MAXIMUM = 500
 
+# Pools of idle, bound connections per (host, bind).
+connection_pools = {}
+connection_pools_lock = Lock()
+
 
 def client(app):
     if mockingbird._environment_supports_mocks():
@@ -69,30 +78,43 @@ class Client:
         conn = ldap3.Connection(self.server, user=self.bind, password=self.password, auto_bind=ldap3.AUTO_BIND_TLS_BEFORE_BIND)
         return conn
 
-    def search_csids(self, csids, search_expired=False):
+    def search_csids(self, csids, search_expired=False, include_expired=False):
+        return self._search(csids, 'berkeleyeducsid', search_expired, include_expired)
+
+    def search_uids(self, uids, search_expired=False, include_expired=False):
+        return self._search(uids, 'uid', search_expired, include_expired)
+
+    def _search(self, ids, id_type, search_expired, include_expired):
+        """With include_expired, search active and expired people at once and flag each entry by its DN."""
+        ids = list(ids)
         all_out = []
-        for i in range(0, len(csids), BATCH_QUERY_MAXIMUM):
-            csids_batch = csids[i:i + BATCH_QUERY_MAXIMUM]
-            with self.connect() as conn:
-                search_filter = self._ldap_search_filter(csids_batch, 'berkeleyeducsid', search_expired)
-                conn.search('dc=berkeley,dc=edu', search_filter, attributes=ldap3.ALL_ATTRIBUTES)
-                all_out += [_attributes_to_dict(entry, search_expired) for entry in conn.entries]
+        for i in range(0, len(ids), BATCH_QUERY_MAXIMUM):
+            search_filter = self._ldap_search_filter(ids[i:i + BATCH_QUERY_MAXIMUM], id_type, search_expired, include_expired)
+            for entry in self._search_entries(search_filter):
+                expired = _is_expired_entry(entry) if include_expired else search_expired
+                all_out.append(_attributes_to_dict(entry, expired))
         return all_out
 
-    def search_uids(self, uids, search_expired=False):
-        all_out = []
-        for i in range(0, len(uids), BATCH_QUERY_MAXIMUM):
-            uids_batch = uids[i:i + BATCH_QUERY_MAXIMUM]
-            with self.connect() as conn:
-                search_filter = self._ldap_search_filter(uids_batch, 'uid', search_expired)
+    def _search_entries(self, search_filter):
+        pool = _get_connection_pool(self)
+        try:
+            with pool.connection() as conn:
                 conn.search('dc=berkeley,dc=edu', search_filter, attributes=ldap3.ALL_ATTRIBUTES)
-                all_out += [_attributes_to_dict(entry, search_expired) for entry in conn.entries]
-        return all_out
+                return conn.entries
+        except LDAPCommunicationError as e:
+            # The server may have dropped an idle connection. Retry once on a new one.
+            self.app.logger.warning(f'LDAP search failed on pooled connection, will reconnect: {e}')
+            with pool.connection(fresh=True) as conn:
+                conn.search('dc=berkeley,dc=edu', search_filter, attributes=ldap3.ALL_ATTRIBUTES)
+                return conn.entries
 
     @classmethod
-    def _ldap_search_filter(cls, ids, id_type, search_expired=False):
+    def _ldap_search_filter(cls, ids, id_type, search_expired=False, include_expired=False):
         ids_filter = ''.join(f'({id_type}={_id})' for _id in ids)
-        ou_scope = '(ou=expired people)' if search_expired else '(ou=people) (ou=advcon people)'
+        if include_expired:
+            ou_scope = '(ou=people) (ou=advcon people) (ou=expired people)'
+        else:
+            ou_scope = '(ou=expired people)' if search_expired else '(ou=people) (ou=advcon people)'
         return f"""(&
             (objectclass=person)
             (|
@@ -104,6 +126,53 @@ class Client:
         )"""
 
 
+class ConnectionPool:
+    """Thread-safe pool of LDAP connections. Each connection is handed to one thread at a time."""
+
+    def __init__(self, connect, size, idle_timeout):
+        self._connect = connect
+        self.idle_timeout = idle_timeout
+        self.idle = LifoQueue(maxsize=size)
+
+    @contextmanager
+    def connection(self, fresh=False):
+        conn = None if fresh else self._checkout()
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        except Exception:
+            _close(conn)
+            raise
+        self._checkin(conn)
+
+    def clear(self):
+        while True:
+            try:
+                conn, last_used = self.idle.get_nowait()
+            except Empty:
+                return
+            _close(conn)
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self.idle.get_nowait()
+            except Empty:
+                return None
+            if not conn.closed and time.time() - last_used < self.idle_timeout:
+                return conn
+            _close(conn)
+
+    def _checkin(self, conn):
+        if conn.closed:
+            return
+        try:
+            self.idle.put_nowait((conn, time.time()))
+        except Full:
+            _close(conn)
+
+
 class MockClient(Client):
     def __init__(self, app):
         self.app = app
@@ -116,9 +185,43 @@ class MockClient(Client):
     def connect(self):
         conn = ldap3.Connection(self.server, user=self.bind, password=self.password, client_strategy=ldap3.MOCK_SYNC)
         conn.strategy.entries_from_json(_fixture_path('search_entries'))
+        # Pooled connections are used outside of a with-block, which would otherwise open and bind them.
+        conn.bind()
         return conn
 
 
+def clear_connection_pools():
+    with connection_pools_lock:
+        pools = list(connection_pools.values())
+        connection_pools.clear()
+    for pool in pools:
+        pool.clear()
+
+
+def _get_connection_pool(cl):
+    key = (type(cl).__name__, cl.host, cl.bind)
+    with connection_pools_lock:
+        pool = connection_pools.get(key)
+        if pool is None:
+            pool = connection_pools[key] = ConnectionPool(
+                connect=cl.connect,
+                size=cl.app.config['LDAP_POOL_SIZE'],
+                idle_timeout=cl.app.config['LDAP_POOL_IDLE_TIMEOUT'],
+            )
+    return pool
+
+
+def _close(conn):
+    try:
+        conn.unbind()
+    except Exception:
+        pass
+
+
+def _is_expired_entry(entry):
+    return 'ou=expired people' in entry.entry_dn.lower()
+
+
 def _attributes_to_dict(entry, expired_per_ldap):
     out = dict.fromkeys(SCHEMA_DICT.values(), None)
     out['expired'] = expired_per_ldap
@@ -23,45 +23,310 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+import hashlib
+import importlib
+import inspect
+import json
 import re
+from threading import BoundedSemaphore, Lock
 
 from boac import db
 from boac.lib.berkeley import previous_term_id, sis_term_id_for_name
 from boac.lib.mockingdata import fixture
-from boac.lib.util import join_if_present, tolerant_remove
+from boac.lib.util import join_if_present, keyset_filter, tolerant_remove
 from flask import current_app as app
 import sqlalchemy
 from sqlalchemy import create_engine
 from sqlalchemy.sql import text
+from sqlalchemy.util import LRUCache
 
 
 # Lazy init to support testing.
 data_loch_db_rds = None
 
+# Query statistics per call site, i.e., per name of the function that invoked safe_execute_rds.
+query_stats = {}
+query_stats_lock = Lock()
+
+# Query shapes, i.e. statements normalized to their joined tables and filter clauses, keyed by fingerprint.
+query_shapes = LRUCache(1024)
+
+# Compiled forms of our (mostly fixed) query strings, shared across pooled connections.
+compiled_query_cache = LRUCache(1024)
+
+# Decoder for JSON text columns, resolved from config on first use.
+json_decoder = None
+
+# Worker threads for independent Data Loch reads issued by a single request. Lazy init, like the engine. Each worker
+# holds a slot while its query runs; with no slot free, reads run in the calling thread rather than queue.
+query_executor = None
+query_executor_lock = Lock()
+query_executor_slots = None
+
 
 def safe_execute_rds(string, **kwargs):
+    call_site = inspect.currentframe().f_back.f_code.co_name
+    return _safe_execute(string, get_data_loch_db_rds(), call_site, **kwargs)
+
+
+def stream_rds(string, batch_size=None, **kwargs):
+    """Return a generator of rows read through a server-side cursor, batch_size rows per round trip.
+
+    Unlike safe_execute_rds, a query error is raised from the generator, even if it comes after some rows were read.
+    """
+    call_site = inspect.currentframe().f_back.f_code.co_name
+    batch_size = batch_size or app.config['DATA_LOCH_RDS_STREAM_BATCH_SIZE']
+    return _stream_execute(string, get_data_loch_db_rds(), call_site, batch_size, **kwargs)
+
+
+def parse_json(value):
+    """Decode a JSON text column. Values the driver has already decoded (see DATA_LOCH_RDS_CAST_JSON_COLUMNS) pass through."""
+    if value is None or not isinstance(value, (str, bytes)):
+        return value
+    return get_json_decoder()(value)
+
+
+def get_json_decoder():
+    global json_decoder
+    if json_decoder is None:
+        json_decoder = _load_json_decoder(app.config['DATA_LOCH_JSON_DECODERS'])
+    return json_decoder
+
+
+def _load_json_decoder(module_names):
+    for module_name in module_names:
+        try:
+            return importlib.import_module(module_name).loads
+        except ImportError:
+            app.logger.debug(f'JSON decoder {module_name} is not installed')
+    return json.loads
+
+
+def _json_column(column, alias):
+    if app.config['DATA_LOCH_RDS_CAST_JSON_COLUMNS']:
+        return f'{column}::json AS {alias}'
+    return f'{column} AS {alias}'
+
+
+def submit_rds(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on a Data Loch query thread and return a Future of its result.
+
+    Workers push an app context of their own, so fn may read config and query the loch; it must not depend on the
+    request context (e.g., current_user). With fewer than two workers configured, or all workers busy with other
+    reads, fn runs inline. Loch connections in use thus never exceed request threads plus workers.
+    """
+    executor = _get_query_executor()
+    if executor and query_executor_slots.acquire(blocking=False):
+        try:
+            future = executor.submit(_run_in_app_context, app._get_current_object(), fn, *args, **kwargs)
+        except Exception:
+            query_executor_slots.release()
+            raise
+        future.add_done_callback(lambda f: query_executor_slots.release())
+        return future
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _get_query_executor():
+    global query_executor, query_executor_slots
+    max_workers = app.config['DATA_LOCH_RDS_QUERY_WORKERS']
+    if max_workers < 2:
+        return None
+    with query_executor_lock:
+        if query_executor is None:
+            query_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='data_loch')
+            query_executor_slots = BoundedSemaphore(max_workers)
+    return query_executor
+
+
+def _run_in_app_context(app_arg, fn, *args, **kwargs):
+    with app_arg.app_context():
+        return fn(*args, **kwargs)
+
+
+def get_data_loch_db_rds():
     global data_loch_db_rds
     if data_loch_db_rds is None:
-        data_loch_db_rds = create_engine(app.config['DATA_LOCH_RDS_URI'])
-    return _safe_execute(string, data_loch_db_rds, **kwargs)
+        connect_args = {}
+        statement_timeout = app.config['DATA_LOCH_RDS_STATEMENT_TIMEOUT']
+        if statement_timeout:
+            connect_args['options'] = f'-c statement_timeout={int(statement_timeout)}'
+        data_loch_db_rds = create_engine(
+            app.config['DATA_LOCH_RDS_URI'],
+            connect_args=connect_args,
+            max_overflow=app.config['DATA_LOCH_RDS_MAX_OVERFLOW'],
+            pool_pre_ping=app.config['DATA_LOCH_RDS_POOL_PRE_PING'],
+            pool_recycle=app.config['DATA_LOCH_RDS_POOL_RECYCLE'],
+            pool_size=app.config['DATA_LOCH_RDS_POOL_SIZE'],
+            pool_timeout=app.config['DATA_LOCH_RDS_POOL_TIMEOUT'],
+            json_deserializer=get_json_decoder(),
+        )
+    return data_loch_db_rds
+
+
+def get_query_stats():
+    with query_stats_lock:
+        stats = {call_site: dict(s) for call_site, s in query_stats.items()}
+    for s in stats.values():
+        s['meanTime'] = s['totalTime'] / s['count'] if s['count'] else None
+    pool_status = data_loch_db_rds.pool.status() if data_loch_db_rds else None
+    return {
+        'pool': pool_status,
+        'queries': stats,
+        'shapes': _get_query_shape_stats(),
+    }
+
 
+def reset_query_stats():
+    with query_stats_lock:
+        query_stats.clear()
+        query_shapes.clear()
 
-def _safe_execute(string, db, **kwargs):
+
+def _safe_execute(string, db, call_site, **kwargs):
+    s = _text(string)
+    statement_timeout = app.config['DATA_LOCH_RDS_STATEMENT_TIMEOUT_OVERRIDES'].get(call_site)
+    ts = datetime.now().timestamp()
     try:
-        s = text(string)
-        ts = datetime.now().timestamp()
-        dbresp = db.execute(s, **kwargs)
+        with db.connect() as connection:
+            connection = connection.execution_options(compiled_cache=compiled_query_cache)
+            if statement_timeout is None:
+                dbresp = connection.execute(s, **kwargs)
+                keys, rows = dbresp.keys(), dbresp.fetchall()
+            else:
+                # A transaction-scoped setting will not leak into the next checkout of this pooled connection.
+                with connection.begin():
+                    connection.execute(f'SET LOCAL statement_timeout = {int(statement_timeout)}')
+                    dbresp = connection.execute(s, **kwargs)
+                    keys, rows = dbresp.keys(), dbresp.fetchall()
     except sqlalchemy.exc.SQLAlchemyError as err:
         app.logger.error(f'SQL {s} threw {err}')
+        _record_query_stats(call_site, datetime.now().timestamp() - ts, error=True, string=string)
         return None
-    rows = dbresp.fetchall()
     query_time = datetime.now().timestamp() - ts
-    row_array = [dict(r) for r in rows]
-    app.logger.debug(f'Query returned {len(row_array)} rows in {query_time} seconds:\n{string}\n{kwargs}')
+    row_array = [dict(zip(keys, r)) for r in rows]
+    _record_query_stats(call_site, query_time, row_count=len(row_array), string=string)
+    app.logger.debug(f'Query returned {len(row_array)} rows in {query_time} seconds ({call_site}):\n{string}\n{kwargs}')
     return row_array
 
 
+def _stream_execute(string, db, call_site, batch_size, **kwargs):
+    s = _text(string)
+    statement_timeout = app.config['DATA_LOCH_RDS_STATEMENT_TIMEOUT_OVERRIDES'].get(call_site)
+    ts = datetime.now().timestamp()
+    row_count = 0
+    error = False
+    try:
+        with db.connect() as connection:
+            connection = connection.execution_options(
+                compiled_cache=compiled_query_cache,
+                max_row_buffer=batch_size,
+                stream_results=True,
+            )
+            # Named cursors only live as long as their transaction.
+            with connection.begin():
+                if statement_timeout is not None:
+                    connection.execute(f'SET LOCAL statement_timeout = {int(statement_timeout)}')
+                dbresp = connection.execute(s, **kwargs)
+                keys = dbresp.keys()
+                while True:
+                    rows = dbresp.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    row_count += len(rows)
+                    for r in rows:
+                        yield dict(zip(keys, r))
+    except sqlalchemy.exc.SQLAlchemyError as err:
+        app.logger.error(f'SQL {s} threw {err} after {row_count} rows')
+        error = True
+        # Rows already yielded are a partial result, which the consumer must not mistake for a complete one.
+        raise
+    finally:
+        query_time = datetime.now().timestamp() - ts
+        _record_query_stats(call_site, query_time, row_count=row_count, error=error, string=string)
+        app.logger.debug(f'Query streamed {row_count} rows in {query_time} seconds ({call_site}):\n{string}\n{kwargs}')
+
+
+def _record_query_stats(call_site, query_time, row_count=0, error=False, string=None):
+    with query_stats_lock:
+        stats = query_stats.get(call_site)
+        if stats is None:
+            stats = query_stats[call_site] = {
+                'count': 0,
+                'errors': 0,
+                'maxTime': 0,
+                'rows': 0,
+                'totalTime': 0,
+            }
+        stats['count'] += 1
+        stats['errors'] += 1 if error else 0
+        stats['maxTime'] = max(stats['maxTime'], query_time)
+        stats['rows'] += row_count
+        stats['totalTime'] += query_time
+        if string is not None:
+            fingerprint, normalized_sql = query_shape(string)
+            shape = query_shapes.get(fingerprint)
+            if shape is None:
+                shape = query_shapes[fingerprint] = {
+                    'callSite': call_site,
+                    'count': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'sql': normalized_sql,
+                    'times': deque(maxlen=app.config['DATA_LOCH_RDS_QUERY_SHAPE_SAMPLES']),
+                }
+            shape['count'] += 1
+            shape['errors'] += 1 if error else 0
+            shape['rows'] += row_count
+            shape['times'].append(query_time)
+
+
+def _get_query_shape_stats():
+    with query_stats_lock:
+        shapes = {fingerprint: dict(shape, times=sorted(shape['times'])) for fingerprint, shape in _query_shape_items()}
+    for shape in shapes.values():
+        times = shape.pop('times')
+        shape['maxTime'] = times[-1] if times else None
+        for percentile in [50, 95, 99]:
+            shape[f'p{percentile}Time'] = times[round((len(times) - 1) * percentile / 100)] if times else None
+    return shapes
+
+
+def _query_shape_items():
+    # LRUCache.items() exposes its internal records; look up values through the public interface instead.
+    for fingerprint in list(query_shapes.keys()):
+        shape = query_shapes.get(fingerprint)
+        if shape is not None:
+            yield fingerprint, shape
+
+
+@lru_cache(maxsize=1024)
+def query_shape(string):
+    """Return the fingerprint and normalized SQL of a statement.
+
+    Literals and whitespace are normalized away, so that statements which differ only in embedded values (GPA ranges,
+    boolean criteria) share a shape, while each distinct combination of JOINs and filter clauses gets its own.
+    """
+    normalized_sql = re.sub(r"'(?:[^']|'')*'", '?', string)
+    normalized_sql = re.sub(r'\b(?:\d+(?:\.\d+)?|true|false)\b', '?', normalized_sql, flags=re.IGNORECASE)
+    normalized_sql = ' '.join(normalized_sql.split())
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16], normalized_sql
+
+
+@lru_cache(maxsize=1024)
+def _text(string):
+    return text(string)
+
+
 def advising_notes_schema():
     return app.config['DATA_LOCH_ADVISING_NOTES_SCHEMA']
 
@@ -179,7 +444,7 @@ def get_enrolled_primary_sections_for_parsed_code(term_id, subject_area, catalog
 
 
 def get_sis_holds(sid):
-    sql = f"""SELECT feed
+    sql = f"""SELECT {_json_column('feed', 'feed')}
         FROM {student_schema()}.student_holds
         WHERE sid = '{sid}'
         """
@@ -277,7 +542,7 @@ def get_team_groups(group_codes=None, team_code=None):
 
 
 def get_athletics_profiles(sids):
-    sql = f"""SELECT sid, profile
+    sql = f"""SELECT sid, {_json_column('profile', 'profile')}
         FROM {asc_schema()}.student_profiles
         WHERE sid = ANY(:sids)
         """
@@ -285,7 +550,7 @@ def get_athletics_profiles(sids):
 
 
 def get_coe_profiles(sids):
-    sql = f"""SELECT sid, profile
+    sql = f"""SELECT sid, {_json_column('profile', 'profile')}
         FROM {coe_schema()}.student_profiles
         WHERE sid = ANY(:sids)
         """
@@ -317,7 +582,7 @@ def get_basic_student_data(sids):
 
 
 def get_student_profiles(sids=None):
-    sql = f"""SELECT p.sid, p.profile, d.gender, d.minority
+    sql = f"""SELECT p.sid, {_json_column('p.profile', 'profile')}, d.gender, d.minority
         FROM {student_schema()}.student_profiles p
         LEFT JOIN {student_schema()}.demographics d ON d.sid = p.sid
         """
@@ -328,27 +593,59 @@ def get_student_profiles(sids=None):
         return safe_execute_rds(sql)
 
 
+def get_student_profile_sids():
+    sql = f'SELECT sid FROM {student_schema()}.student_profiles ORDER BY sid'
+    return safe_execute_rds(sql)
+
+
+def get_student_profiles_with_advising_data(sids, include_coe=False):
+    """Return SIS profiles together with ASC and, optionally, COE profile fragments in one round trip."""
+    if include_coe:
+        coe_column = _json_column('coe.profile', 'coe_profile')
+        coe_join = f'LEFT JOIN {coe_schema()}.student_profiles coe ON coe.sid = p.sid'
+    else:
+        coe_column = 'NULL AS coe_profile'
+        coe_join = ''
+    sql = f"""SELECT
+        p.sid, {_json_column('p.profile', 'profile')}, d.gender, d.minority,
+        {_json_column('asc_p.profile', 'asc_profile')}, {coe_column}
+        FROM {student_schema()}.student_profiles p
+        LEFT JOIN {student_schema()}.demographics d ON d.sid = p.sid
+        LEFT JOIN {asc_schema()}.student_profiles asc_p ON asc_p.sid = p.sid
+        {coe_join}
+        WHERE p.sid = ANY(:sids)
+        """
+    return safe_execute_rds(sql, sids=sids)
+
+
+def stream_student_profiles():
+    sql = f"""SELECT p.sid, {_json_column('p.profile', 'profile')}, d.gender, d.minority
+        FROM {student_schema()}.student_profiles p
+        LEFT JOIN {student_schema()}.demographics d ON d.sid = p.sid"""
+    return stream_rds(sql)
+
+
 def query_historical_sids(sids):
     sql = f'SELECT sid FROM {student_schema()}.student_profiles_hist_enr WHERE sid = ANY(:sids) ORDER BY sid'
     return safe_execute_rds(sql, sids=sids)
 
 
 def get_historical_student_profiles_for_sids(sids):
-    sql = f"""SELECT sid, uid, profile
+    sql = f"""SELECT sid, uid, {_json_column('profile', 'profile')}
         FROM {student_schema()}.student_profiles_hist_enr
         WHERE sid = ANY(:sids)"""
     return safe_execute_rds(sql, sids=sids)
 
 
 def get_historical_student_profiles_for_uid(uid):
-    sql = f"""SELECT sid, uid, profile
+    sql = f"""SELECT sid, uid, {_json_column('profile', 'profile')}
         FROM {student_schema()}.student_profiles_hist_enr
         WHERE uid = :uid"""
     return safe_execute_rds(sql, uid=uid)
 
 
 def get_historical_enrollments_for_sid(sid, latest_term_id=None):
-    sql = f"""SELECT term_id, enrollment_term
+    sql = f"""SELECT term_id, {_json_column('enrollment_term', 'enrollment_term')}
         FROM {student_schema()}.student_enrollment_terms_hist_enr
         WHERE sid = :sid
         AND term_id >= '{earliest_term_id()}'"""
@@ -359,7 +656,7 @@ def get_historical_enrollments_for_sid(sid, latest_term_id=None):
 
 
 def get_historical_enrollments_for_term(term_id, sids):
-    sql = f"""SELECT term_id, sid, enrollment_term
+    sql = f"""SELECT term_id, sid, {_json_column('enrollment_term', 'enrollment_term')}
         FROM {student_schema()}.student_enrollment_terms_hist_enr
         WHERE term_id = :term_id
         AND sid = ANY(:sids)"""
@@ -389,7 +686,7 @@ def get_term_gpas(sids):
 
 
 def get_enrollments_for_sid(sid, latest_term_id=None):
-    sql = f"""SELECT term_id, enrollment_term
+    sql = f"""SELECT term_id, {_json_column('enrollment_term', 'enrollment_term')}
         FROM {student_schema()}.student_enrollment_terms
         WHERE sid = :sid
         AND term_id >= '{earliest_term_id()}'"""
@@ -400,7 +697,7 @@ def get_enrollments_for_sid(sid, latest_term_id=None):
 
 
 def get_enrollments_for_term(term_id, sids=None):
-    sql = f"""SELECT sid, enrollment_term
+    sql = f"""SELECT sid, {_json_column('enrollment_term', 'enrollment_term')}
         FROM {student_schema()}.student_enrollment_terms
         WHERE term_id = :term_id"""
     if sids is not None:
@@ -408,6 +705,13 @@ def get_enrollments_for_term(term_id, sids=None):
     return safe_execute_rds(sql, term_id=term_id, sids=sids)
 
 
+def stream_enrollments_for_term(term_id):
+    sql = f"""SELECT sid, {_json_column('enrollment_term', 'enrollment_term')}
+        FROM {student_schema()}.student_enrollment_terms
+        WHERE term_id = :term_id"""
+    return stream_rds(sql, term_id=term_id)
+
+
 def match_appointment_advisors_by_name(prefixes, limit=None):
     prefix_conditions = []
     prefix_kwargs = {}
@@ -481,6 +785,27 @@ def match_students_by_name_or_sid(prefixes, limit=None):
     return safe_execute_rds(sql, **prefix_kwargs)
 
 
+def get_advising_note_authors_for_index():
+    sql = f"""SELECT a.first_name, a.last_name, a.sid, a.uid, an.name
+        FROM {advising_notes_schema()}.advising_note_authors a
+        JOIN {advising_notes_schema()}.advising_note_author_names an ON an.uid = a.uid"""
+    return safe_execute_rds(sql)
+
+
+def get_student_names_for_index():
+    sql = f"""SELECT sas.sid, sas.uid, sas.first_name, sas.last_name, sn.name
+        FROM {student_schema()}.student_academic_status sas
+        JOIN {student_schema()}.student_names sn ON sn.sid = sas.sid"""
+    return safe_execute_rds(sql)
+
+
+def get_historical_student_names_for_index():
+    sql = f"""SELECT DISTINCT s.sid, s.uid, s.first_name, s.last_name
+        FROM {student_schema()}.student_names_hist_enr s
+        JOIN {student_schema()}.student_name_index_hist_enr idx ON idx.sid = s.sid"""
+    return safe_execute_rds(sql)
+
+
 def get_asc_advising_notes(sid):
     sql = f"""
         SELECT
@@ -635,6 +960,7 @@ def search_advising_appointments(
     topic=None,
     datetime_from=None,
     datetime_to=None,
+    after=None,
     offset=None,
     limit=None,
 ):
@@ -661,6 +987,7 @@ def search_advising_appointments(
         topic=topic,
         datetime_from=datetime_from,
         datetime_to=datetime_to,
+        after=after,
         offset=offset,
         limit=limit,
     )
@@ -674,6 +1001,7 @@ def search_advising_notes(
     topic=None,
     datetime_from=None,
     datetime_to=None,
+    after=None,
     offset=None,
     limit=None,
 ):
@@ -699,6 +1027,7 @@ def search_advising_notes(
         topic=topic,
         datetime_from=datetime_from,
         datetime_to=datetime_to,
+        after=after,
         offset=offset,
         limit=limit,
     )
@@ -715,6 +1044,7 @@ def search_sis_advising(
     topic=None,
     datetime_from=None,
     datetime_to=None,
+    after=None,
     offset=None,
     limit=None,
 ):
@@ -757,6 +1087,12 @@ def search_sis_advising(
         {sid_filter}
         {date_filter}
         ORDER BY rank DESC, an.id"""
+    keyset_params = {}
+    if after:
+        # Keyset pagination: resume after the (rank, id) of the last result of the previous page.
+        sql = f"""SELECT * FROM ({sql}) AS results
+            WHERE {keyset_filter('rank', 'id', after, keyset_params)}
+            ORDER BY rank DESC, id"""
 
     if offset is not None and offset > 0:
         sql += ' OFFSET :offset'
@@ -772,6 +1108,7 @@ def search_sis_advising(
         datetime_to=datetime_to,
         offset=offset,
         limit=limit,
+        **keyset_params,
     )
     return safe_execute_rds(sql, **params)
 
@@ -906,6 +1243,7 @@ def get_students_query(     # noqa
     majors=None,
     midpoint_deficient_grade=None,
     minors=None,
+    name_match_sids=None,
     scope=(),
     search_phrase=None,
     sids=(),
@@ -932,6 +1270,14 @@ def get_students_query(     # noqa
         if len(words) == 1 and re.match(r'^\d+$', words[0]):
             query_filter += ' AND (sas.sid LIKE :sid_phrase)'
             query_bindings.update({'sid_phrase': f'{words[0]}%'})
+        # Names already matched in memory, by the caller, need no joins.
+        elif name_match_sids is not None:
+            name_filter = 'sas.sid = ANY(:name_match_sids)'
+            if len(words) == 1:
+                name_filter = f'sas.email_address LIKE :email_string OR {name_filter}'
+                query_bindings.update({'email_string': f'{search_phrase.lower()}%'})
+            query_filter += f' AND ({name_filter})'
+            query_bindings.update({'name_match_sids': list(name_match_sids)})
         # If a single word, search on both name and email.
         elif len(words) == 1:
             name_string = ''.join(re.split('\W', words[0]))
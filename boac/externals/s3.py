@@ -23,6 +23,10 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from collections import OrderedDict
+from threading import Lock
+import time
+
 import boto3
 from flask import current_app as app
 import smart_open
@@ -30,14 +34,59 @@ import smart_open
 
 """Client code to run file operations against S3."""
 
+# Lifetime of assumed-role credentials. URLs signed with them stop working when they expire.
+STS_CREDENTIALS_DURATION = 900
+
+# Assumed-role credentials and S3 clients built from them, keyed by region and access key, shared until shortly
+# before the credentials expire.
+sts_credentials = None
+sts_credentials_expire_at = 0
+s3_clients = {}
+sts_lock = Lock()
+
+# Signed URLs by (bucket, key), as (url, expire_at) pairs, least recently used first.
+signed_urls = OrderedDict()
+signed_urls_lock = Lock()
+
 
 def build_s3_url(bucket, key):
     return f's3://{bucket}/{key}'
 
 
 def get_signed_urls(bucket, keys, expiration):
-    client = _get_client()
-    return {key: _get_signed_url(client, bucket, key, expiration) for key in keys}
+    """Return a signed URL per key, reusing previously signed URLs that are not about to expire."""
+    now = time.time()
+    min_expire_at = now + app.config['AWS_CREDENTIALS_REFRESH_MARGIN']
+    urls = {}
+    with signed_urls_lock:
+        for key in keys:
+            cached = signed_urls.get((bucket, key))
+            if cached and cached[1] > min_expire_at:
+                signed_urls.move_to_end((bucket, key))
+                urls[key] = cached[0]
+    unsigned_keys = [key for key in keys if key not in urls]
+    if unsigned_keys:
+        client, credentials_expire_at = _get_client_and_expiry()
+        expire_at = min(now + expiration, credentials_expire_at)
+        signed = {key: _get_signed_url(client, bucket, key, expiration) for key in unsigned_keys}
+        with signed_urls_lock:
+            for key, url in signed.items():
+                signed_urls[(bucket, key)] = (url, expire_at)
+                signed_urls.move_to_end((bucket, key))
+            while len(signed_urls) > app.config['S3_SIGNED_URL_CACHE_MAX_ENTRIES']:
+                signed_urls.popitem(last=False)
+        urls.update(signed)
+    return urls
+
+
+def clear_caches():
+    global sts_credentials, sts_credentials_expire_at
+    with sts_lock:
+        sts_credentials = None
+        sts_credentials_expire_at = 0
+        s3_clients.clear()
+    with signed_urls_lock:
+        signed_urls.clear()
 
 
 def stream_object(bucket, key):
@@ -59,19 +108,40 @@ def put_binary_data_to_s3(bucket, key, binary_data):
     _get_client().put_object(Body=binary_data, Bucket=bucket, Key=key, ServerSideEncryption=app.config['DATA_LOCH_S3_ENCRYPTION'])
 
 
-def _get_sts_credentials():
+def _assume_role():
     sts_client = boto3.client('sts')
     role_arn = app.config['AWS_APP_ROLE_ARN']
     assumed_role_object = sts_client.assume_role(
         RoleArn=role_arn,
         RoleSessionName='AssumeAppRoleSession',
-        DurationSeconds=900,
+        DurationSeconds=STS_CREDENTIALS_DURATION,
     )
     return assumed_role_object['Credentials']
 
 
-def _get_session():
-    credentials = _get_sts_credentials()
+def _get_sts_credentials():
+    credentials, expire_at = _get_sts_credentials_and_expiry()
+    return credentials
+
+
+def _get_sts_credentials_and_expiry():
+    with sts_lock:
+        _renew_sts_credentials_if_expiring()
+        return sts_credentials, sts_credentials_expire_at
+
+
+def _renew_sts_credentials_if_expiring():
+    # Callers hold sts_lock.
+    global sts_credentials, sts_credentials_expire_at
+    if time.time() + app.config['AWS_CREDENTIALS_REFRESH_MARGIN'] >= sts_credentials_expire_at:
+        expire_at = time.time() + STS_CREDENTIALS_DURATION
+        sts_credentials = _assume_role()
+        sts_credentials_expire_at = expire_at
+        s3_clients.clear()
+
+
+def _get_session(credentials=None):
+    credentials = credentials or _get_sts_credentials()
     return boto3.Session(
         aws_access_key_id=credentials['AccessKeyId'],
         aws_secret_access_key=credentials['SecretAccessKey'],
@@ -80,8 +150,21 @@ def _get_session():
 
 
 def _get_client():
-    session = _get_session()
-    return session.client('s3', region_name=app.config['DATA_LOCH_S3_REGION'])
+    client, expire_at = _get_client_and_expiry()
+    return client
+
+
+def _get_client_and_expiry():
+    region_name = app.config['DATA_LOCH_S3_REGION']
+    # Credentials are read, and a client built from them, in one critical section so that a client is never cached
+    # from credentials that another thread has just rotated out. Clients are thread-safe, sessions are not.
+    with sts_lock:
+        _renew_sts_credentials_if_expiring()
+        client_key = (region_name, sts_credentials['AccessKeyId'])
+        client = s3_clients.get(client_key)
+        if client is None:
+            client = s3_clients[client_key] = _get_session(sts_credentials).client('s3', region_name=region_name)
+        return client, sts_credentials_expire_at
 
 
 def _get_signed_url(client, bucket, key, expiration):
@@ -0,0 +1,113 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from bisect import bisect_left
+from threading import Lock, Thread
+import time
+
+from flask import current_app as app
+
+"""In-memory prefix indexes for typeahead, built from the data loch and held per process."""
+
+
+class PrefixIndex:
+    """Values keyed by strings, kept as sorted arrays so that prefix lookups are two bisections."""
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.keys = [key for key, value in pairs]
+        self.values = [value for key, value in pairs]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def match(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + chr(0x10ffff), start)
+        return self.values[start:end]
+
+
+class LazyIndex:
+    """Holds an index built by a loader function, without blocking requests on a (re)build.
+
+    Until the first build completes, get() returns None and callers fall back to querying the database. A build
+    older than TYPEAHEAD_INDEX_TTL seconds is still served while a background thread replaces it. After a failed build,
+    the next is not started for TYPEAHEAD_INDEX_RETRY_INTERVAL seconds.
+    """
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self.index = None
+        self.loaded_at = None
+        self.failed_at = None
+        self.build_thread = None
+        self.lock = Lock()
+
+    def get(self):
+        if not app.config['TYPEAHEAD_INDEX_ENABLED']:
+            return None
+        now = time.time()
+        if self.failed_at and now - self.failed_at < app.config['TYPEAHEAD_INDEX_RETRY_INTERVAL']:
+            return self.index
+        if self.index is None or now - self.loaded_at > app.config['TYPEAHEAD_INDEX_TTL']:
+            self._start_build()
+        return self.index
+
+    def rebuild(self):
+        started_at = time.time()
+        try:
+            index = self.load()
+        except Exception:
+            self.failed_at = time.time()
+            raise
+        if index is None:
+            app.logger.warning(f'Failed to build {self.name} index')
+            self.failed_at = time.time()
+            return None
+        self.index = index
+        self.loaded_at = started_at
+        self.failed_at = None
+        app.logger.info(f'Built {self.name} index of {len(index)} entries in {time.time() - started_at:.3f} seconds')
+        return index
+
+    def clear(self):
+        self.index = None
+        self.loaded_at = None
+        self.failed_at = None
+
+    def _start_build(self):
+        with self.lock:
+            if self.build_thread is None or not self.build_thread.is_alive():
+                self.build_thread = Thread(target=self._build, args=[app._get_current_object()], daemon=True)
+                self.build_thread.start()
+
+    def _build(self, app_arg):
+        with app_arg.app_context():
+            try:
+                self.rebuild()
+            except Exception as e:
+                app.logger.error(f'Failed to build {self.name} index')
+                app.logger.exception(e)
@@ -0,0 +1,157 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from threading import Condition, Thread
+import time
+
+from boac import db, std_commit
+from flask import current_app as app
+from sqlalchemy import text
+
+# Materialized views behind note, appointment and advisor name search, refreshed after the writes that affect them.
+APPOINTMENT_SEARCH_INDEXES = ('appointments_fts_index', 'advisor_author_index')
+NOTE_SEARCH_INDEXES = ('notes_fts_index', 'advisor_author_index')
+
+# Refresh state per view. 'staleSince' is the time of the earliest write not yet covered by a refresh. After
+# 'failures' consecutive failed refreshes, the next is not tried before 'retryAt'.
+index_states = {}
+index_lock = Condition()
+refresh_thread = None
+
+
+def request_refresh(view_names):
+    """Mark views stale after a committed write.
+
+    With SEARCH_INDEX_REFRESH_ASYNC, return at once: a worker thread refreshes each view concurrently, once writes
+    have paused for SEARCH_INDEX_REFRESH_DEBOUNCE seconds or SEARCH_INDEX_REFRESH_MAX_DELAY seconds after the first
+    stale write. Otherwise, refresh within the current transaction.
+    """
+    if not app.config['SEARCH_INDEX_REFRESH_ASYNC']:
+        for view_name in view_names:
+            db.session.execute(text(f'REFRESH MATERIALIZED VIEW {view_name}'))
+        std_commit()
+        return
+    now = time.time()
+    with index_lock:
+        for view_name in view_names:
+            state = _get_state(view_name)
+            state['requestedAt'] = now
+            state['staleSince'] = state['staleSince'] or now
+        _start_worker()
+        index_lock.notify()
+
+
+def get_status():
+    now = time.time()
+    with index_lock:
+        states = {view_name: dict(state) for view_name, state in index_states.items()}
+    for state in states.values():
+        state['lagSeconds'] = now - state['staleSince'] if state['staleSince'] else 0
+        state.pop('requestedAt')
+    return states
+
+
+def _get_state(view_name):
+    state = index_states.get(view_name)
+    if state is None:
+        state = index_states[view_name] = {
+            'errors': 0,
+            'failures': 0,
+            'lastLagSeconds': None,
+            'lastRefreshedAt': None,
+            'lastRefreshSeconds': None,
+            'refreshCount': 0,
+            'requestedAt': None,
+            'retryAt': None,
+            'staleSince': None,
+        }
+    return state
+
+
+def _start_worker():
+    global refresh_thread
+    if refresh_thread is None or not refresh_thread.is_alive():
+        refresh_thread = Thread(target=_refresh_worker, args=[app._get_current_object()], daemon=True)
+        refresh_thread.start()
+
+
+def _refresh_worker(app_arg):
+    with app_arg.app_context():
+        while True:
+            for view_name, stale_since in _wait_for_due_views():
+                _refresh_concurrently(view_name, stale_since)
+
+
+def _wait_for_due_views():
+    with index_lock:
+        while True:
+            now = time.time()
+            due_at = {
+                view_name: max(
+                    min(
+                        state['requestedAt'] + app.config['SEARCH_INDEX_REFRESH_DEBOUNCE'],
+                        state['staleSince'] + app.config['SEARCH_INDEX_REFRESH_MAX_DELAY'],
+                    ),
+                    state['retryAt'] or 0,
+                ) for view_name, state in index_states.items() if state['staleSince']
+            }
+            due_views = [(view_name, index_states[view_name]['staleSince']) for view_name, t in due_at.items() if t <= now]
+            if due_views:
+                # Writes from here on mark the view stale again, to be covered by a later refresh.
+                for view_name, stale_since in due_views:
+                    index_states[view_name]['staleSince'] = None
+                return due_views
+            index_lock.wait(timeout=min(due_at.values()) - now if due_at else None)
+
+
+def _refresh_concurrently(view_name, stale_since):
+    started_at = time.time()
+    try:
+        # REFRESH ... CONCURRENTLY cannot run in a transaction block; it leaves the view readable while it runs.
+        with db.engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').execute(
+                text(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}'),
+            )
+    except Exception as e:
+        app.logger.error(f'Failed to refresh search index {view_name}')
+        app.logger.exception(e)
+        with index_lock:
+            state = index_states[view_name]
+            state['errors'] += 1
+            state['failures'] += 1
+            # Back off exponentially from the debounce interval, so that a persistent failure is not retried nonstop.
+            backoff = app.config['SEARCH_INDEX_REFRESH_DEBOUNCE'] * 2 ** state['failures']
+            state['retryAt'] = time.time() + min(backoff, app.config['SEARCH_INDEX_REFRESH_MAX_BACKOFF'])
+            state['staleSince'] = min(stale_since, state['staleSince'] or stale_since)
+        return
+    finished_at = time.time()
+    with index_lock:
+        state = index_states[view_name]
+        state['failures'] = 0
+        state['retryAt'] = None
+        state['lastLagSeconds'] = finished_at - stale_since
+        state['lastRefreshedAt'] = finished_at
+        state['lastRefreshSeconds'] = finished_at - started_at
+        state['refreshCount'] += 1
@@ -23,11 +23,15 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
 from html.parser import HTMLParser
 import inspect
+from itertools import chain
 import re
 import string
+import threading
 import time
 
 from autolink import linkify
@@ -230,56 +234,84 @@ class HTMLTagStripper(HTMLParser):
         self.fed = []
 
 
-tag_stripper = HTMLTagStripper()
 stemmer = SnowballStemmer('english')
+# HTMLParser instances hold parse state, so each thread gets its own.
+_thread_local = threading.local()
 
 
-def search_result_text_snippet(text, search_terms, search_pattern):
-    tag_stripper.feed(text)
-    tag_stripped_body = tag_stripper.get_data()
-    tag_stripper.reset()
+def strip_html_tags(text):
+    if '<' not in text and '&' not in text:
+        return text
+    tag_stripper = getattr(_thread_local, 'tag_stripper', None)
+    if tag_stripper is None:
+        tag_stripper = _thread_local.tag_stripper = HTMLTagStripper()
+    try:
+        tag_stripper.feed(text)
+        return tag_stripper.get_data()
+    finally:
+        tag_stripper.reset()
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    # Note vocabulary is small relative to note volume, so most words are stemmed only once per process.
+    return stemmer.stem(word)
+
+
+@lru_cache(maxsize=16)
+def _compile(pattern):
+    return re.compile(pattern)
+
 
+def search_result_text_snippet(text, search_terms, search_pattern):
+    tag_stripped_body = strip_html_tags(text)
     snippet_padding = app.config['NOTES_SEARCH_RESULT_SNIPPET_PADDING']
-    words = list(re.finditer(search_pattern, tag_stripped_body))
-    stemmed_search_terms = [stemmer.stem(term) for term in search_terms]
+    stemmed_search_terms = {stem(term) for term in search_terms}
+    words = _compile(search_pattern).finditer(tag_stripped_body)
 
-    snippet = None
+    # Scan up to the first word matching a search term, remembering where the words before it start.
+    preceding_starts = deque(maxlen=snippet_padding + 1)
+    default_end = None
     match_index = None
-    start_position = 0
-
     for index, word_match in enumerate(words):
-        stem = stemmer.stem(word_match.group(0))
-        if match_index is None and stem in stemmed_search_terms:
+        preceding_starts.append(word_match.start(0))
+        if index == snippet_padding:
+            default_end = word_match.end(0)
+        if stem(word_match.group(0)) in stemmed_search_terms:
             match_index = index
-            if index > snippet_padding:
-                start_position = words[index - snippet_padding].start(0)
-            snippet = '...' if start_position > 0 else ''
-        if match_index is not None:
-            snippet += tag_stripped_body[start_position:word_match.start(0)]
-            if stem in stemmed_search_terms:
-                snippet += '<strong>'
-            snippet += word_match.group(0)
-            if stem in stemmed_search_terms:
-                snippet += '</strong>'
-            if index == len(words) - 1:
-                snippet += tag_stripped_body[word_match.end(0):len(tag_stripped_body)]
-                break
-            elif index == match_index + snippet_padding:
-                end_position = words[index].end(0)
-                snippet += tag_stripped_body[word_match.end(0):end_position]
-                snippet += '...'
-                break
-            else:
-                start_position = word_match.end(0)
-
-    if snippet:
-        return snippet
-    else:
-        if len(words) > snippet_padding:
-            end_position = words[snippet_padding].end(0)
-            return tag_stripped_body[0:end_position] + '...'
-        else:
+            break
+
+    if match_index is None:
+        if default_end is None:
             return tag_stripped_body
+        return tag_stripped_body[0:default_end] + '...'
+
+    start_position = preceding_starts[0] if match_index > snippet_padding else 0
+    parts = ['...' if start_position > 0 else '']
+    # Highlight search terms in the snippet window, then stop scanning as soon as we know whether text follows it.
+    for index, word_match in enumerate(chain([word_match], words), match_index):
+        if index > match_index + snippet_padding:
+            parts.append('...')
+            return ''.join(parts)
+        word = word_match.group(0)
+        parts.append(tag_stripped_body[start_position:word_match.start(0)])
+        if stem(word) in stemmed_search_terms:
+            parts += ['<strong>', word, '</strong>']
+        else:
+            parts.append(word)
+        start_position = word_match.end(0)
+    parts.append(tag_stripped_body[start_position:])
+    return ''.join(parts)
+
+
+def keyset_filter(rank_column, id_column, after, params):
+    """Return a SQL condition selecting rows ranked after the (rank, id) key, adding its bindings to params."""
+    if not after:
+        return 'TRUE'
+    params.update({'after_rank': after[0], 'after_id': after[1]})
+    # ts_rank is single precision; compare against the bound rank at the same precision or ties slip past the key.
+    after_rank = 'CAST(:after_rank AS REAL)'
+    return f'({rank_column} < {after_rank} OR ({rank_column} = {after_rank} AND {id_column} > :after_id))'
 
 
 def _localize_datetime(dt):
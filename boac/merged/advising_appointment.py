@@ -30,6 +30,7 @@ from boac.externals import data_loch
 from boac.lib.berkeley import BERKELEY_DEPT_CODE_TO_NAME
 from boac.lib.sis_advising import get_sis_advising_attachments, get_sis_advising_topics, resolve_sis_created_at, resolve_sis_updated_at
 from boac.lib.util import get_benchmarker, join_if_present, search_result_text_snippet, TEXT_SEARCH_PATTERN
+from boac.merged.advising_search import search_page
 from boac.merged.calnet import get_calnet_users_for_csids, get_uid_for_csid
 from boac.models.appointment import Appointment, appointment_event_to_json
 from boac.models.appointment_read import AppointmentRead
@@ -104,6 +105,33 @@ def search_advising_appointments(
     offset=0,
     limit=20,
 ):
+    appointments_feed, next_cursor = search_advising_appointments_page(
+        search_phrase=search_phrase,
+        advisor_csid=advisor_csid,
+        advisor_uid=advisor_uid,
+        student_csid=student_csid,
+        topic=topic,
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        offset=offset,
+        limit=limit,
+    )
+    return appointments_feed
+
+
+def search_advising_appointments_page(
+    search_phrase,
+    advisor_csid=None,
+    advisor_uid=None,
+    student_csid=None,
+    topic=None,
+    datetime_from=None,
+    datetime_to=None,
+    offset=0,
+    limit=20,
+    cursor=None,
+):
+    """Page through BOA appointments, then legacy appointments from the loch, fetching no more than the page needs."""
     benchmark = get_benchmarker('search_advising_appointments')
     benchmark('begin')
 
@@ -115,42 +143,45 @@ def search_advising_appointments(
 
     advisor_uid = get_uid_for_csid(app, advisor_csid) if (not advisor_uid and advisor_csid) else advisor_uid
 
-    benchmark('begin local appointments query')
-    appointments_feed = Appointment.search(
-        search_phrase=search_phrase,
-        advisor_uid=advisor_uid,
-        student_csid=student_csid,
-        topic=topic,
-        datetime_from=datetime_from,
-        datetime_to=datetime_to,
-        limit=limit,
-        offset=offset,
-    )
-    benchmark('end local appointments query')
+    def _search_local_appointments(after, fetch_limit):
+        return Appointment.search_rows(
+            search_phrase=search_phrase,
+            advisor_uid=advisor_uid,
+            student_csid=student_csid,
+            topic=topic,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            after=after,
+            limit=fetch_limit,
+        )
 
-    local_appointments_count = len(appointments_feed)
-    if local_appointments_count == limit:
-        return appointments_feed
+    def _search_loch_appointments(after, fetch_limit):
+        return data_loch.search_advising_appointments(
+            search_phrase=search_phrase,
+            advisor_uid=advisor_uid,
+            advisor_csid=advisor_csid,
+            student_csid=student_csid,
+            topic=topic,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            after=after,
+            limit=fetch_limit,
+        )
 
-    benchmark('begin loch appointments query')
-    loch_results = data_loch.search_advising_appointments(
-        search_phrase=search_phrase,
-        advisor_uid=advisor_uid,
-        advisor_csid=advisor_csid,
-        student_csid=student_csid,
-        topic=topic,
-        datetime_from=datetime_from,
-        datetime_to=datetime_to,
-        offset=max(0, offset - local_appointments_count),
-        limit=(limit - local_appointments_count),
+    benchmark('begin appointments queries')
+    page, next_cursor = search_page(
+        sources=[('local', _search_local_appointments), ('loch', _search_loch_appointments)],
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
     )
-    benchmark('end loch appointments query')
+    benchmark('end appointments queries')
 
-    benchmark('begin loch appointments parsing')
-    appointments_feed += _get_loch_appointments_search_results(loch_results, search_terms)
-    benchmark('end loch appointments parsing')
-
-    return appointments_feed
+    benchmark('begin appointments parsing')
+    appointments_feed = Appointment.search_results_to_api_json([row for source, row in page if source == 'local'], search_terms)
+    appointments_feed += _get_loch_appointments_search_results([row for source, row in page if source == 'loch'], search_terms)
+    benchmark('end appointments parsing')
+    return appointments_feed, next_cursor
 
 
 def appointment_to_compatible_json(appointment, topics=(), attachments=None, event=None):
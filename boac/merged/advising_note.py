@@ -51,6 +51,7 @@ from boac.lib.util import (
     TEXT_SEARCH_PATTERN,
     utc_now,
 )
+from boac.merged.advising_search import search_page
 from boac.merged.calnet import get_calnet_users_for_csids, get_uid_for_csid
 from boac.models.note import Note
 from boac.models.note_attachment import NoteAttachment
@@ -201,6 +202,33 @@ def search_advising_notes(
     offset=0,
     limit=20,
 ):
+    notes_feed, next_cursor = search_advising_notes_page(
+        search_phrase=search_phrase,
+        author_csid=author_csid,
+        author_uid=author_uid,
+        student_csid=student_csid,
+        topic=topic,
+        datetime_from=datetime_from,
+        datetime_to=datetime_to,
+        offset=offset,
+        limit=limit,
+    )
+    return notes_feed
+
+
+def search_advising_notes_page(
+    search_phrase,
+    author_csid=None,
+    author_uid=None,
+    student_csid=None,
+    topic=None,
+    datetime_from=None,
+    datetime_to=None,
+    offset=0,
+    limit=20,
+    cursor=None,
+):
+    """Page through BOA notes, then legacy notes from the loch, each by rank, fetching and snippeting no more than the page."""
     benchmark = get_benchmarker('search_advising_notes')
     benchmark('begin')
 
@@ -212,77 +240,83 @@ def search_advising_notes(
 
     author_uid = get_uid_for_csid(app, author_csid) if (not author_uid and author_csid) else author_uid
 
-    # TODO We're currently retrieving all results for the sake of subsequent offset calculations. As the number of notes in
-    # BOA grows (and possibly requires us to use some kind of staging table for search indexing), we'll need to revisit.
-    benchmark('begin local notes query')
-    local_results = Note.search(
-        search_phrase=search_phrase,
-        author_uid=author_uid,
-        student_csid=student_csid,
-        topic=topic,
-        datetime_from=datetime_from,
-        datetime_to=datetime_to,
-    )
-    benchmark('end local notes query')
-
-    benchmark('begin local notes parsing')
-    # Our offset calculations are unforuntately fussy because note parsing might reveal notes associated with students no
-    # longer in BOA, which we won't include in the feed; so we don't actually know the length of our result set until parsing
-    # is complete.
-    cutoff = min(len(local_results), offset + limit)
-    notes_feed = _get_local_notes_search_results(local_results, cutoff, search_terms)
-    local_notes_count = len(notes_feed)
-    notes_feed = notes_feed[offset:]
-
-    benchmark('end local notes parsing')
+    def _search_local_notes(after, fetch_limit):
+        return _search_local_notes_of_current_students(
+            after=after,
+            limit=fetch_limit,
+            search_phrase=search_phrase,
+            author_uid=author_uid,
+            student_csid=student_csid,
+            topic=topic,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+        )
 
-    if len(notes_feed) == limit:
-        return notes_feed
+    def _search_loch_notes(after, fetch_limit):
+        return data_loch.search_advising_notes(
+            search_phrase=search_phrase,
+            author_uid=author_uid,
+            author_csid=author_csid,
+            student_csid=student_csid,
+            topic=topic,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            after=after,
+            limit=fetch_limit,
+        )
 
-    benchmark('begin loch notes query')
-    loch_results = data_loch.search_advising_notes(
-        search_phrase=search_phrase,
-        author_uid=author_uid,
-        author_csid=author_csid,
-        student_csid=student_csid,
-        topic=topic,
-        datetime_from=datetime_from,
-        datetime_to=datetime_to,
-        offset=max(0, offset - local_notes_count),
-        limit=(limit - len(notes_feed)),
+    benchmark('begin notes queries')
+    page, next_cursor = search_page(
+        sources=[('local', _search_local_notes), ('loch', _search_loch_notes)],
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
     )
-    benchmark('end loch notes query')
+    benchmark('end notes queries')
 
-    benchmark('begin loch notes parsing')
-    notes_feed += _get_loch_notes_search_results(loch_results, search_terms)
-    benchmark('end loch notes parsing')
+    benchmark('begin notes parsing')
+    notes_feed = _get_local_notes_search_results([row for source, row in page if source == 'local'], search_terms)
+    notes_feed += _get_loch_notes_search_results([row for source, row in page if source == 'loch'], search_terms)
+    benchmark('end notes parsing')
+    return notes_feed, next_cursor
 
-    return notes_feed
+
+def _search_local_notes_of_current_students(after, limit, **kwargs):
+    # Notes of students no longer in BOA are left out of the feed, so we may need more than one batch to fill a page.
+    results = []
+    while len(results) < limit:
+        rows = Note.search(after=after, limit=limit, **kwargs)
+        if not rows:
+            break
+        student_rows = data_loch.get_basic_student_data(list({row['sid'] for row in rows}))
+        students_by_sid = {r.get('sid'): r for r in student_rows}
+        for row in rows:
+            student_row = students_by_sid.get(row['sid'])
+            if student_row:
+                results.append({**row, 'student': student_row})
+        if len(rows) < limit:
+            break
+        after = [rows[-1]['rank'], rows[-1]['id']]
+    return results[0:limit]
 
 
-def _get_local_notes_search_results(local_results, cutoff, search_terms):
+def _get_local_notes_search_results(local_results, search_terms):
     results = []
-    student_rows = data_loch.get_basic_student_data([row.get('sid') for row in local_results])
-    students_by_sid = {r.get('sid'): r for r in student_rows}
     for row in local_results:
         note = {camelize(key): row[key] for key in row.keys()}
-        sid = note.get('sid')
-        student_row = students_by_sid.get(sid, {})
-        if student_row:
-            text = join_if_present(' - ', [note.get('subject'), note.get('body')])
-            results.append({
-                'id': note.get('id'),
-                'studentSid': sid,
-                'studentUid': student_row.get('uid'),
-                'studentName': join_if_present(' ', [student_row.get('first_name'), student_row.get('last_name')]),
-                'advisorUid': note.get('authorUid'),
-                'advisorName': note.get('authorName'),
-                'noteSnippet': search_result_text_snippet(text, search_terms, TEXT_SEARCH_PATTERN),
-                'createdAt': _isoformat(note, 'createdAt'),
-                'updatedAt': _isoformat(note, 'updatedAt'),
-            })
-        if len(results) == cutoff:
-            break
+        student_row = row['student']
+        text = join_if_present(' - ', [note.get('subject'), note.get('body')])
+        results.append({
+            'id': note.get('id'),
+            'studentSid': note.get('sid'),
+            'studentUid': student_row.get('uid'),
+            'studentName': join_if_present(' ', [student_row.get('first_name'), student_row.get('last_name')]),
+            'advisorUid': note.get('authorUid'),
+            'advisorName': note.get('authorName'),
+            'noteSnippet': search_result_text_snippet(text, search_terms, TEXT_SEARCH_PATTERN),
+            'createdAt': _isoformat(note, 'createdAt'),
+            'updatedAt': _isoformat(note, 'updatedAt'),
+        })
     return results
 
 
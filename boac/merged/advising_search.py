@@ -0,0 +1,71 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import base64
+
+from boac.api.errors import BadRequestError
+import simplejson as json
+
+
+def search_page(sources, limit, offset=0, cursor=None):
+    """Page through ranked search results from several sources, in order of the sources.
+
+    Sources are (name, fetch) pairs. fetch(after, limit) returns up to limit rows ordered by rank descending, then id,
+    starting after the (rank, id) key given, if any; each row must have 'rank' and 'id' values. A source is queried only
+    if those before it cannot fill the page, and for no more rows than the page needs, so deep pages do not fetch
+    everything before them. A cursor picks up where the previous page left off.
+
+    Returns the page as (source name, row) pairs, and a cursor for the next page or None if there is none.
+    """
+    positions = _decode_cursor(cursor, [name for name, fetch in sources])
+    # One row beyond the page tells us whether there is a next page.
+    fetch_count = offset + limit + 1
+    results = []
+    for name, fetch in sources:
+        if len(results) == fetch_count:
+            break
+        rows = fetch(positions.get(name), fetch_count - len(results)) or []
+        results += [(name, row) for row in rows[0:fetch_count - len(results)]]
+    for name, row in results[0:offset + limit]:
+        positions[name] = [row['rank'], row['id']]
+    next_cursor = _encode_cursor(positions) if len(results) > offset + limit else None
+    return results[offset:offset + limit], next_cursor
+
+
+def _decode_cursor(cursor, names):
+    if not cursor:
+        return {}
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        positions = None
+    if not isinstance(positions, dict) or not set(positions.keys()) <= set(names) \
+            or not all(isinstance(p, list) and len(p) == 2 for p in positions.values()):
+        raise BadRequestError(f'Invalid pagination cursor: {cursor}')
+    return positions
+
+
+def _encode_cursor(positions):
+    return base64.urlsafe_b64encode(json.dumps(positions, sort_keys=True).encode()).decode()
@@ -0,0 +1,109 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from itertools import islice
+
+from boac.externals import data_loch
+from boac.lib.prefix_index import LazyIndex, PrefixIndex
+from boac.merged import calnet
+from boac.models.authorized_user import AuthorizedUser
+from flask import current_app as app
+
+"""Legacy note author and BOA user typeahead, from a per-process directory of loch and CalNet data.
+
+BOA tables (authorized_users, advisor_author_index) are cheap to query and change as users and notes are created, so
+they are always read live; only the loch and CalNet lookups are answered from memory.
+"""
+
+
+class AdvisorDirectory:
+
+    def __init__(self, note_authors, calnet_users):
+        self.note_authors = LochPeople(note_authors)
+        self.calnet_users = calnet_users
+
+    def __len__(self):
+        return len(self.note_authors) + len(self.calnet_users)
+
+
+class LochPeople:
+    """Advisors in the loch with the words of their names, uppercased, as in the loch's *_names tables."""
+
+    def __init__(self, rows):
+        self.people = {}
+        names = []
+        for row in rows:
+            self.people.setdefault(row['uid'], set()).add((row['first_name'], row['last_name'], row['sid'], row['uid']))
+            names.append((row['name'], row['uid']))
+        self.names = PrefixIndex(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, prefixes, limit=None):
+        uids = None
+        for prefix in prefixes:
+            matching_uids = set(self.names.match(prefix))
+            uids = matching_uids if uids is None else uids & matching_uids
+        people = set().union(*(self.people[uid] for uid in uids or ()))
+        people = sorted(people, key=lambda p: (p[0].casefold(), p[1].casefold(), p))
+        return [
+            {'first_name': first_name, 'last_name': last_name, 'sid': sid, 'uid': uid}
+            for first_name, last_name, sid, uid in _take(people, limit)
+        ]
+
+
+def _load():
+    note_authors = data_loch.get_advising_note_authors_for_index()
+    if note_authors is None:
+        return None
+    uids = [user.uid for user in AuthorizedUser.get_all_active_users(include_deleted=True)]
+    # CalNet profiles are read from the cache that the refresh job keeps current, or from LDAP if missing there.
+    calnet_users = calnet.get_calnet_users_for_uids(app, uids)
+    return AdvisorDirectory(note_authors, calnet_users)
+
+
+advisor_directory = LazyIndex('advisor directory', _load)
+
+
+def match_advising_note_authors_by_name(prefixes, limit=None):
+    directory = advisor_directory.get()
+    authors = directory.note_authors.match(prefixes, limit=int(limit) if limit else None) if directory and prefixes else None
+    # Authors new to the loch since the directory was built are found in SQL.
+    return authors or data_loch.match_advising_note_authors_by_name(prefixes, limit=limit)
+
+
+def calnet_users_for_uids(uids):
+    """Return CalNet profiles by UID, from the directory or, for users new since it was built, from CalNet."""
+    directory = advisor_directory.get()
+    calnet_users = {uid: directory.calnet_users[uid] for uid in uids if uid in directory.calnet_users} if directory else {}
+    missing_uids = [uid for uid in uids if uid not in calnet_users]
+    if missing_uids:
+        calnet_users.update(calnet.get_calnet_users_for_uids(app, missing_uids))
+    return calnet_users
+
+
+def _take(iterable, limit):
+    return list(islice(iterable, limit))
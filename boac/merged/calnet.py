@@ -31,29 +31,20 @@ from boac.models.json_cache import fetch_bulk, insert_row, stow
 
 @stow('calnet_user_for_uid_{uid}')
 def get_calnet_user_for_uid(app, uid, force_feed=True, skip_expired_users=False):
-    if skip_expired_users:
-        persons = calnet.client(app).search_uids([uid])
-    else:
-        for search_expired in (False, True):
-            persons = calnet.client(app).search_uids([uid], search_expired)
-            if persons:
-                break
+    persons = calnet.client(app).search_uids([uid], include_expired=not skip_expired_users)
     if not persons and not force_feed:
         return None
     return {
-        **_calnet_user_api_feed(persons[0] if len(persons) else None),
+        **_calnet_user_api_feed(_active_person_first(persons)),
         **{'uid': uid},
     }
 
 
 @stow('calnet_user_for_csid_{csid}')
 def get_calnet_user_for_csid(app, csid):
-    for search_expired in (False, True):
-        persons = calnet.client(app).search_csids([csid], search_expired)
-        if persons:
-            break
+    persons = calnet.client(app).search_csids([csid], include_expired=True)
     return {
-        **_calnet_user_api_feed(persons[0] if len(persons) else None),
+        **_calnet_user_api_feed(_active_person_first(persons)),
         **{'csid': csid},
     }
 
@@ -101,6 +92,11 @@ def _get_calnet_users(app, id_type, ids):
     return users_by_id
 
 
+def _active_person_first(persons):
+    # A single search covers active and expired people; prefer the active entry.
+    return next((p for p in persons if not p['expired']), persons[0] if persons else None)
+
+
 def _calnet_user_api_feed(person):
     def _get(key):
         return _get_attribute(person, key)
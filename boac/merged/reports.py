@@ -23,7 +23,6 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
-import json
 
 from boac import db
 from boac.externals import data_loch
@@ -45,10 +44,9 @@ def low_assignment_scores(term_id=None):
     primary_sections_with_scored_assignments = set()
     primary_sections_with_plottable_assignments = set()
 
-    enrollments_for_term = data_loch.get_enrollments_for_term(term_id)
-    enrollments_by_sid = {row['sid']: json.loads(row['enrollment_term']) for row in enrollments_for_term}
-    itr = iter(enrollments_by_sid.items())
-    for (sid, term) in itr:
+    for row in data_loch.stream_enrollments_for_term(term_id):
+        sid = row['sid']
+        term = data_loch.parse_json(row['enrollment_term'])
         examined_sids.add(sid)
         for enr in term['enrollments']:
             first_section = enr['sections'][0]
@@ -26,7 +26,7 @@ ENHANCEMENTS, OR MODIFICATIONS.
 from boac.externals import data_loch
 from boac.lib.berkeley import previous_term_id, sis_term_id_for_name
 from boac.models.json_cache import stow
-from flask import current_app as app
+from flask import current_app as app, g, has_request_context
 
 
 @stow('current_term_index')
@@ -34,11 +34,95 @@ def get_current_term_index():
     return data_loch.get_current_term_index()
 
 
+class TermContext:
+    """Current, future and covered terms, each resolved on first use and then read from memory."""
+
+    def __init__(self):
+        self._resolved = {}
+
+    @property
+    def all_term_ids(self):
+        return self._resolve('all_term_ids', self._all_term_ids)
+
+    @property
+    def current_term_id(self):
+        return self._resolve('current_term_id', lambda: sis_term_id_for_name(self.current_term_name))
+
+    @property
+    def current_term_name(self):
+        return self._resolve('current_term_name', _current_term_name)
+
+    @property
+    def future_term_id(self):
+        return self._resolve('future_term_id', lambda: sis_term_id_for_name(self.future_term_name))
+
+    @property
+    def future_term_name(self):
+        return self._resolve('future_term_name', _future_term_name)
+
+    def _all_term_ids(self):
+        earliest_term_id = sis_term_id_for_name(app.config['CANVAS_EARLIEST_TERM'])
+        term_id = self.current_term_id
+        ids = []
+        while int(term_id) >= int(earliest_term_id):
+            ids.append(term_id)
+            term_id = previous_term_id(term_id)
+        return ids
+
+    def _resolve(self, name, resolver):
+        if name not in self._resolved:
+            self._resolved[name] = resolver()
+        return self._resolved[name]
+
+
+def term_context():
+    """Return term metadata, resolved once per request or background job and kept on flask.g.
+
+    Outside a request, term metadata is kept only if a job has called start_term_context().
+    """
+    context = g.get('term_context')
+    if context is None:
+        context = TermContext()
+        if has_request_context():
+            g.term_context = context
+    return context
+
+
+def start_term_context():
+    g.term_context = TermContext()
+
+
+def refresh_term_context():
+    if 'term_context' in g:
+        g.term_context = TermContext()
+
+
+def end_term_context():
+    g.pop('term_context', None)
+
+
 def current_term_id(use_cache=True):
-    return sis_term_id_for_name(current_term_name(use_cache))
+    if use_cache:
+        return term_context().current_term_id
+    return sis_term_id_for_name(_current_term_name(use_cache=False))
 
 
 def current_term_name(use_cache=True):
+    if use_cache:
+        return term_context().current_term_name
+    return _current_term_name(use_cache=False)
+
+
+def future_term_id():
+    return term_context().future_term_id
+
+
+def all_term_ids():
+    """Return SIS IDs of each term covered by BOAC, from current to oldest."""
+    return list(term_context().all_term_ids)
+
+
+def _current_term_name(use_cache=True):
     term_name = app.config['CANVAS_CURRENT_ENROLLMENT_TERM']
     if term_name == 'auto':
         index = get_current_term_index() if use_cache else data_loch.get_current_term_index()
@@ -46,20 +130,9 @@ def current_term_name(use_cache=True):
     return term_name
 
 
-def future_term_id():
+def _future_term_name():
     term_name = app.config['CANVAS_FUTURE_ENROLLMENT_TERM']
     if term_name == 'auto':
         index = get_current_term_index()
-        return index and sis_term_id_for_name(index['future_term_name'])
-    return sis_term_id_for_name(term_name)
-
-
-def all_term_ids():
-    """Return SIS IDs of each term covered by BOAC, from current to oldest."""
-    earliest_term_id = sis_term_id_for_name(app.config['CANVAS_EARLIEST_TERM'])
-    term_id = current_term_id()
-    ids = []
-    while int(term_id) >= int(earliest_term_id):
-        ids.append(term_id)
-        term_id = previous_term_id(term_id)
-    return ids
+        return index and index['future_term_name']
+    return term_name
@@ -23,19 +23,26 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+import base64
+from datetime import datetime
+import hashlib
 from itertools import groupby
-import json
 import operator
 import re
 
+from boac.api.errors import BadRequestError, InternalServerError
 from boac.externals import data_loch, s3
 from boac.lib import analytics
 from boac.lib.berkeley import dept_codes_where_advising, term_name_for_sis_id
-from boac.lib.util import get_benchmarker
+from boac.lib.util import get_benchmarker, localize_datetime, utc_now
 from boac.merged.sis_terms import current_term_id, future_term_id
+from boac.merged.student_name_index import match_sids_by_name
+from boac.models import json_cache
 from boac.models.manually_added_advisee import ManuallyAddedAdvisee
+from boac.models.student_summary_profile import StudentSummaryProfile
 from flask import current_app as app
 from flask_login import current_user
+import simplejson as json
 
 
 """Provide merged student data from external sources."""
@@ -60,15 +67,22 @@ def get_distilled_student_profiles(sids):
                 'underrepresented',
             ]
         }
-        distilled['academicCareerStatus'] = profile['sisProfile'].get('academicCareerStatus')
-        distilled['termsInAttendance'] = profile['sisProfile'].get('termsInAttendance')
+        # Stored summary profiles carry these SIS fields at top level.
+        sis_profile = profile.get('sisProfile', profile)
+        distilled['academicCareerStatus'] = sis_profile.get('academicCareerStatus')
+        distilled['termsInAttendance'] = sis_profile.get('termsInAttendance')
         if profile.get('athleticsProfile'):
             distilled['athleticsProfile'] = profile['athleticsProfile']
         if profile.get('coeProfile'):
             distilled['coeProfile'] = profile['coeProfile']
         return distilled
-    profiles = get_full_student_profiles(sids)
-    remaining_sids = list(set(sids) - set([p.get('sid') for p in profiles]))
+    stored_profiles = get_stored_summary_profiles(sids, current_term_id())
+    unstored_sids = [sid for sid in sids if sid not in stored_profiles]
+    profiles = get_full_student_profiles(unstored_sids)
+    if stored_profiles:
+        profiles_by_sid = {**stored_profiles, **{p['sid']: p for p in profiles}}
+        profiles = [profiles_by_sid[sid] for sid in sids if sid in profiles_by_sid]
+    remaining_sids = list(set(unstored_sids) - set([p.get('sid') for p in profiles]))
     if remaining_sids:
         historical_profiles = get_historical_student_profiles(remaining_sids)
         profiles += historical_profiles
@@ -80,40 +94,11 @@ def get_full_student_profiles(sids):
     benchmark('begin')
     if not sids:
         return []
-    benchmark('begin SIS profile query')
-    profile_results = data_loch.get_student_profiles(sids)
-    benchmark('end SIS profile query')
-    if not profile_results:
-        return []
-    profiles_by_sid = _get_profiles_by_sid(profile_results)
-    profiles = []
-    for sid in sids:
-        profile = profiles_by_sid.get(sid)
-        if profile:
-            profiles.append(profile)
+    profiles = _get_full_student_profiles(sids, get_student_query_scope(), benchmark)
 
     benchmark('begin photo merge')
     _merge_photo_urls(profiles)
     benchmark('end photo merge')
-
-    scope = get_student_query_scope()
-
-    benchmark('begin ASC profile merge')
-    athletics_profiles = data_loch.get_athletics_profiles(sids)
-    if athletics_profiles:
-        for athletics_profile in athletics_profiles:
-            sid = athletics_profile['sid']
-            _merge_asc_student_profile_data(profiles_by_sid.get(sid), athletics_profile, scope)
-    benchmark('end ASC profile merge')
-
-    if 'COENG' in scope or 'ADMIN' in scope:
-        benchmark('begin COE profile merge')
-        coe_profiles = data_loch.get_coe_profiles(sids)
-        if coe_profiles:
-            for coe_profile in coe_profiles:
-                sid = coe_profile['sid']
-                _merge_coe_student_profile_data(profiles_by_sid.get(sid), coe_profile)
-        benchmark('end COE profile merge')
     return profiles
 
 
@@ -140,16 +125,21 @@ def get_course_student_profiles(term_id, section_id, offset=None, limit=None, fe
         if featured_enrollment_rows:
             sids = [str(featured_enrollment_rows[0]['sid'])] + sids
 
+    # Dispatch independent queries concurrently; full profiles depend on the current user and stay in this thread.
+    benchmark('begin concurrent queries')
+    enrollments_future = data_loch.submit_rds(data_loch.get_enrollments_for_term, term_id, sids)
+    academic_standing_future = data_loch.submit_rds(get_academic_standing_by_sid, sids, as_dicts=True)
+    term_gpas_future = data_loch.submit_rds(get_term_gpas_by_sid, sids, as_dicts=True)
+    mean_gpas_future = data_loch.submit_rds(data_loch.get_sis_section_mean_gpas, term_id, section_id)
+
     # TODO It's probably more efficient to store class profiles in the loch, rather than distilling them
     # on the fly from full profiles.
     students = get_full_student_profiles(sids)
 
-    benchmark('begin enrollments query')
-    enrollments_for_term = data_loch.get_enrollments_for_term(term_id, sids)
-    benchmark('end enrollments query')
-    enrollments_by_sid = {row['sid']: json.loads(row['enrollment_term']) for row in enrollments_for_term}
-    academic_standing = get_academic_standing_by_sid(sids, as_dicts=True)
-    term_gpas = get_term_gpas_by_sid(sids, as_dicts=True)
+    enrollments_by_sid = {row['sid']: data_loch.parse_json(row['enrollment_term']) for row in enrollments_future.result()}
+    academic_standing = academic_standing_future.result()
+    term_gpas = term_gpas_future.result()
+    benchmark('end concurrent queries')
     all_canvas_sites = {}
     benchmark('begin profile transformation')
     for student in students:
@@ -191,8 +181,7 @@ def get_course_student_profiles(term_id, section_id, offset=None, limit=None, fe
     benchmark('end profile transformation')
     mean_metrics = analytics.mean_metrics_across_sites(all_canvas_sites.values(), 'courseMean')
     mean_metrics['gpa'] = {}
-    mean_gpas = data_loch.get_sis_section_mean_gpas(term_id, section_id)
-    for row in mean_gpas:
+    for row in mean_gpas_future.result():
         mean_metrics['gpa'][str(row['gpa_term_id'])] = row['avg_gpa']
     benchmark('end')
     return {
@@ -205,36 +194,100 @@ def get_course_student_profiles(term_id, section_id, offset=None, limit=None, fe
 def get_summary_student_profiles(sids, include_historical=False, term_id=None):
     if not sids:
         return []
-    benchmark = get_benchmarker('get_summary_student_profiles')
-    benchmark('begin')
-    # TODO It's probably more efficient to store summary profiles in the loch, rather than distilling them
-    # on the fly from full profiles.
-    profiles = get_full_student_profiles(sids)
-    # TODO Many views require no term enrollment information other than a units count. This datum too should be
-    # stored in the loch without BOAC having to crunch it.
     if not term_id:
         term_id = current_term_id()
-    benchmark('begin enrollments query')
-    enrollments_for_term = data_loch.get_enrollments_for_term(term_id, sids)
-    benchmark('end enrollments query')
-    enrollments_by_sid = {row['sid']: json.loads(row['enrollment_term']) for row in enrollments_for_term}
-    benchmark('begin academic standing query')
-    academic_standing = get_academic_standing_by_sid(sids)
-    benchmark('end academic standing query')
-    benchmark('begin term GPA query')
-    term_gpas = get_term_gpas_by_sid(sids)
-    benchmark('end term GPA query')
+    stored_profiles = get_stored_summary_profiles(sids, term_id)
+    if not stored_profiles:
+        return _summarize_student_profiles(sids, include_historical, term_id)
+    unstored_sids = [sid for sid in sids if sid not in stored_profiles]
+    summarized_profiles = _summarize_student_profiles(unstored_sids, include_historical, term_id) if unstored_sids else []
+    profiles_by_sid = {**stored_profiles, **{p['sid']: p for p in summarized_profiles}}
+    return [profiles_by_sid[sid] for sid in sids if sid in profiles_by_sid]
+
+
+def get_stored_summary_profiles(sids, term_id):
+    """Return summary profiles stored by the cache refresh job, adjusted to what the current user may see."""
+    if not app.config['STUDENT_SUMMARY_PROFILES_ENABLED'] or not sids:
+        return {}
+    profiles_by_sid = StudentSummaryProfile.get_profiles_by_sid(sids, term_id)
+    if profiles_by_sid:
+        scope = get_student_query_scope()
+        can_access_canvas_data = current_user.can_access_canvas_data
+        for profile in profiles_by_sid.values():
+            _scope_summary_profile(profile, scope, can_access_canvas_data)
+        _merge_photo_urls(profiles_by_sid.values())
+    return profiles_by_sid
+
 
+def refresh_summary_profiles(term_id, batch_size=1000):
+    """Summarize and store the profiles of all current students for the given term, unrestricted by scope.
+
+    If any loch read fails, the refresh stops before storing that batch or deleting stale profiles, so that stored
+    profiles are never replaced by summaries missing part of their data.
+    """
+    refreshed_at = datetime.now()
+    sid_rows = data_loch.get_student_profile_sids()
+    if sid_rows is None:
+        raise InternalServerError('Failed to read student SIDs for summary profiles')
+    sids = [row['sid'] for row in sid_rows]
+    for i in range(0, len(sids), batch_size):
+        batch_sids = sids[i:i + batch_size]
+        profile_rows = data_loch.get_student_profiles_with_advising_data(batch_sids, include_coe=True)
+        enrollment_rows = data_loch.get_enrollments_for_term(term_id, batch_sids)
+        academic_standing_rows = data_loch.get_academic_standing(batch_sids)
+        term_gpa_rows = data_loch.get_term_gpas(batch_sids)
+        if any(rows is None for rows in [profile_rows, enrollment_rows, academic_standing_rows, term_gpa_rows]):
+            raise InternalServerError(f'Failed to read loch data for summary profiles of SIDs {batch_sids[0]} to {batch_sids[-1]}')
+        profiles = _merge_full_student_profiles(batch_sids, profile_rows, ['ADMIN'])
+        enrollments_by_sid = {row['sid']: data_loch.parse_json(row['enrollment_term']) for row in enrollment_rows}
+        academic_standing = _academic_standing_by_sid(academic_standing_rows)
+        term_gpas = _term_gpas_by_sid(term_gpa_rows)
+        for profile in profiles:
+            summarize_profile(
+                profile,
+                enrollments=enrollments_by_sid,
+                academic_standing=academic_standing,
+                term_gpas=term_gpas,
+                can_access_canvas_data=True,
+            )
+            # Keep stored profiles uniform even where a whole batch lacks standing or GPA data.
+            profile.setdefault('academicStanding', None)
+            profile.setdefault('termGpa', None)
+        StudentSummaryProfile.upsert(term_id, profiles, refreshed_at)
+    StudentSummaryProfile.delete_stale(term_id, refreshed_at)
+    app.logger.info(f'Stored summary profiles of {len(sids)} students for term {term_id}')
+    return len(sids)
+
+
+def _summarize_student_profiles(sids, include_historical, term_id):
+    benchmark = get_benchmarker('get_summary_student_profiles')
+    benchmark('begin')
+    # Dispatch independent queries concurrently; full profiles depend on the current user and stay in this thread.
+    benchmark('begin concurrent queries')
+    enrollments_future = data_loch.submit_rds(data_loch.get_enrollments_for_term, term_id, sids)
+    academic_standing_future = data_loch.submit_rds(get_academic_standing_by_sid, sids)
+    term_gpas_future = data_loch.submit_rds(get_term_gpas_by_sid, sids)
+
+    # Summaries are distilled on the fly here only when they are not stored (see refresh_summary_profiles): for
+    # historical students, for students or terms not covered by the last refresh, or if STUDENT_SUMMARY_PROFILES_ENABLED
+    # is off.
+    profiles = get_full_student_profiles(sids)
     remaining_sids = list(set(sids) - set([p.get('sid') for p in profiles]))
+    historical_enrollments_future = None
     if len(remaining_sids) and include_historical:
         benchmark('begin historical profile supplement')
-        historical_profiles = get_historical_student_profiles(remaining_sids)
-        profiles += historical_profiles
-        historical_enrollments_for_term = data_loch.get_historical_enrollments_for_term(term_id, remaining_sids)
-        for row in historical_enrollments_for_term:
-            enrollments_by_sid[row['sid']] = json.loads(row['enrollment_term'])
+        historical_enrollments_future = data_loch.submit_rds(data_loch.get_historical_enrollments_for_term, term_id, remaining_sids)
+        profiles += get_historical_student_profiles(remaining_sids)
         benchmark('end historical profile supplement')
 
+    enrollments_by_sid = {row['sid']: data_loch.parse_json(row['enrollment_term']) for row in enrollments_future.result()}
+    if historical_enrollments_future:
+        for row in historical_enrollments_future.result():
+            enrollments_by_sid[row['sid']] = data_loch.parse_json(row['enrollment_term'])
+    academic_standing = academic_standing_future.result()
+    term_gpas = term_gpas_future.result()
+    benchmark('end concurrent queries')
+
     benchmark('begin profile transformation')
     for profile in profiles:
         summarize_profile(profile, enrollments=enrollments_by_sid, academic_standing=academic_standing, term_gpas=term_gpas)
@@ -243,7 +296,7 @@ def get_summary_student_profiles(sids, include_historical=False, term_id=None):
     return profiles
 
 
-def summarize_profile(profile, enrollments=None, academic_standing=None, term_gpas=None):
+def summarize_profile(profile, enrollments=None, academic_standing=None, term_gpas=None, can_access_canvas_data=None):
     # Strip SIS details to lighten the API load.
     sis_profile = profile.pop('sisProfile', None)
     if sis_profile:
@@ -267,7 +320,9 @@ def summarize_profile(profile, enrollments=None, academic_standing=None, term_gp
         # Add the singleton term.
         term = enrollments.get(profile['sid'])
         if term:
-            if not current_user.can_access_canvas_data:
+            if can_access_canvas_data is None:
+                can_access_canvas_data = current_user.can_access_canvas_data
+            if not can_access_canvas_data:
                 _suppress_canvas_sites(term)
             profile['term'] = term
             if term['termId'] == current_term_id() and len(term['enrollments']) > 0:
@@ -283,7 +338,10 @@ def _academic_standing_to_feed(standing):
 
 
 def get_academic_standing_by_sid(sids, as_dicts=False):
-    results = data_loch.get_academic_standing(sids)
+    return _academic_standing_by_sid(data_loch.get_academic_standing(sids), as_dicts=as_dicts)
+
+
+def _academic_standing_by_sid(results, as_dicts=False):
     academic_standing_feed = {}
     for sid, rows in groupby(results, key=operator.itemgetter('sid')):
         if as_dicts:
@@ -323,7 +381,10 @@ def get_student_and_terms_by_uid(uid):
 
 
 def get_term_gpas_by_sid(sids, as_dicts=False):
-    results = data_loch.get_term_gpas(sids)
+    return _term_gpas_by_sid(data_loch.get_term_gpas(sids), as_dicts=as_dicts)
+
+
+def _term_gpas_by_sid(results, as_dicts=False):
     term_gpa_dict = {}
     for sid, rows in groupby(results, key=operator.itemgetter('sid')):
         if as_dicts:
@@ -344,6 +405,7 @@ def query_students(
     coe_underrepresented=None,
     colleges=None,
     curated_group_ids=None,
+    cursor=None,
     entering_terms=None,
     ethnicities=None,
     expected_grad_terms=None,
@@ -352,6 +414,7 @@ def query_students(
     group_codes=None,
     in_intensive_cohort=None,
     include_profiles=False,
+    include_sids=True,
     intended_majors=None,
     is_active_asc=None,
     is_active_coe=None,
@@ -366,12 +429,15 @@ def query_students(
     order_by=None,
     sids=(),
     sids_only=False,
+    total_count=None,
     transfer=None,
     underrepresented=None,
     unit_ranges=None,
     visa_types=None,
 ):
-
+    # With include_sids=False, only the count and a page of students are fetched, not the full list of matching SIDs.
+    # A cursor (empty for the first page) selects keyset pagination: the page starts after the ordering key encoded in
+    # the cursor, and implies include_sids=False. Pass total_count when it is already known.
     criteria = {
         'advisor_plan_mappings': advisor_plan_mappings,
         'coe_advisor_ldap_uids': coe_advisor_ldap_uids,
@@ -433,61 +499,80 @@ def query_students(
             'sids': [],
             'students': [],
             'totalStudentCount': 0,
-        }    # First, get total_count of matching students
-    sids_result = data_loch.safe_execute_rds(f'SELECT DISTINCT(sas.sid) {query_tables} {query_filter}', **query_bindings)
-    if sids_result is None:
-        return None
-    # Upstream logic may require the full list of SIDs even if we're only returning full results for a particular
-    # paged slice.
-    summary = {
-        'sids': [row['sid'] for row in sids_result],
-        'totalStudentCount': len(sids_result),
-    }
-    if not sids_only:
-        o, o_secondary, o_tertiary, o_direction, supplemental_query_tables = data_loch.get_students_ordering(
-            current_term_id=current_term_id(),
-            order_by=order_by,
-            group_codes=group_codes,
-            majors=majors,
-            scope=scope,
+        }
+    if sids_only:
+        return _query_sids(query_tables, query_filter, query_bindings)
+    query_tables, sql, ordering = _ordered_students_query(
+        query_tables,
+        query_filter,
+        group_codes=group_codes,
+        majors=majors,
+        order_by=order_by,
+        scope=scope,
+    )
+    if cursor is not None:
+        summary = {
+            'totalStudentCount': _count_students(query_tables, query_filter, query_bindings) if total_count is None else total_count,
+        }
+        students_result, summary['nextCursor'] = _query_students_after_cursor(
+            query_tables,
+            query_filter,
+            query_bindings,
+            ordering=ordering,
+            cursor=cursor,
+            limit=limit,
         )
-        if supplemental_query_tables:
-            query_tables += supplemental_query_tables
-        if 'group_name' in o or 'entering_term' in o or 'term_gpa' in o or 'terms_in_attendance' in o:
-            o_null_order = 'NULLS LAST'
+    elif app.config['COHORT_QUERY_CACHE_ENABLED'] and not curated_group_ids and not sids:
+        # Cohort results depend on Data Loch data alone, unless curated group membership or a list of SIDs is given.
+        # Every page and sort order of a cohort is then served from its cached, ordered list of SIDs.
+        ordered_sids = _get_ordered_sids(sql, query_bindings)
+        if ordered_sids is None:
+            return None
+        summary = {'totalStudentCount': len(ordered_sids)}
+        if include_sids:
+            summary['sids'] = ordered_sids
+        end = offset + limit if limit and limit < 100 else None  # Sanity check large limits
+        students_result = [{'sid': sid} for sid in ordered_sids[offset:end]]
+    else:
+        if include_sids:
+            summary = _query_sids(query_tables, query_filter, query_bindings)
+            if summary is None:
+                return None
         else:
-            o_null_order = 'NULLS FIRST'
-        sql = f"""SELECT
-            sas.sid, MIN({o}), MIN({o_secondary}), MIN({o_tertiary})
-            {query_tables}
-            {query_filter}
-            GROUP BY sas.sid
-            ORDER BY MIN({o}) {o_direction} {o_null_order}, MIN({o_secondary}) NULLS FIRST, MIN({o_tertiary}) NULLS FIRST"""
-        if o_tertiary != 'sas.sid':
-            sql += ', sas.sid'
+            summary = {
+                'totalStudentCount': _count_students(query_tables, query_filter, query_bindings) if total_count is None else total_count,
+            }
         sql += ' OFFSET :offset'
         query_bindings['offset'] = offset
         if limit and limit < 100:  # Sanity check large limits
             query_bindings['limit'] = limit
             sql += ' LIMIT :limit'
         students_result = data_loch.safe_execute_rds(sql, **query_bindings)
-        if include_profiles:
-            summary['students'] = get_summary_student_profiles([row['sid'] for row in students_result])
-        else:
-            summary['students'] = get_distilled_student_profiles([row['sid'] for row in students_result])
+    if include_profiles:
+        summary['students'] = get_summary_student_profiles([row['sid'] for row in students_result])
+    else:
+        summary['students'] = get_distilled_student_profiles([row['sid'] for row in students_result])
     return summary
 
 
+def clear_cohort_query_cache():
+    json_cache.clear('cohort_query_%')
+
+
 def search_for_students(
     search_phrase=None,
     order_by=None,
     offset=0,
     limit=None,
+    cursor=None,
 ):
     benchmark = get_benchmarker('search_for_students')
     benchmark('begin')
 
-    query_tables, query_filter, query_bindings = data_loch.get_students_query(search_phrase=search_phrase)
+    query_tables, query_filter, query_bindings = data_loch.get_students_query(
+        name_match_sids=search_phrase and match_sids_by_name(search_phrase),
+        search_phrase=search_phrase,
+    )
     if not query_tables:
         return {
             'students': [],
@@ -500,35 +585,53 @@ def search_for_students(
     if supplemental_query_tables:
         query_tables += supplemental_query_tables
     benchmark('begin SID query')
-    result = data_loch.safe_execute_rds(f'SELECT DISTINCT(sas.sid) {query_tables} {query_filter}', **query_bindings)
+    if cursor is None:
+        result = data_loch.safe_execute_rds(f'SELECT DISTINCT(sas.sid) {query_tables} {query_filter}', **query_bindings)
+        total_student_count = len(result)
+    else:
+        total_student_count = _count_students(query_tables, query_filter, query_bindings)
     benchmark('end SID query')
-    total_student_count = len(result)
 
     # In the special case of a numeric search phrase that returned no matches, fall back to historical student search.
     if total_student_count == 0 and search_phrase and re.match(r'^\d+$', search_phrase):
         return search_for_student_historical(search_phrase)
 
-    sql = f"""SELECT
-        sas.sid
-        {query_tables}
-        {query_filter}
-        GROUP BY sas.sid
-        ORDER BY MIN({o}) {o_direction} NULLS FIRST, MIN({o_secondary}) NULLS FIRST, MIN({o_tertiary}) NULLS FIRST"""
-    if o_tertiary != 'sas.sid':
-        sql += ', sas.sid'
-    sql += f' OFFSET {offset}'
-    if limit and limit < 100:  # Sanity check large limits
-        sql += ' LIMIT :limit'
-        query_bindings['limit'] = limit
-    benchmark('begin student query')
-    result = data_loch.safe_execute_rds(sql, **query_bindings)
+    next_cursor = None
+    if cursor is None:
+        sql = f"""SELECT
+            sas.sid
+            {query_tables}
+            {query_filter}
+            GROUP BY sas.sid
+            ORDER BY MIN({o}) {o_direction} NULLS FIRST, MIN({o_secondary}) NULLS FIRST, MIN({o_tertiary}) NULLS FIRST"""
+        if o_tertiary != 'sas.sid':
+            sql += ', sas.sid'
+        sql += f' OFFSET {offset}'
+        if limit and limit < 100:  # Sanity check large limits
+            sql += ' LIMIT :limit'
+            query_bindings['limit'] = limit
+        benchmark('begin student query')
+        result = data_loch.safe_execute_rds(sql, **query_bindings)
+    else:
+        benchmark('begin student query')
+        result, next_cursor = _query_students_after_cursor(
+            query_tables,
+            query_filter,
+            query_bindings,
+            ordering=(o, o_secondary, o_tertiary, o_direction, 'NULLS FIRST'),
+            cursor=cursor,
+            limit=limit,
+        )
     benchmark('begin profile collection')
     students = get_summary_student_profiles([row['sid'] for row in result])
     benchmark('end')
-    return {
+    feed = {
         'students': students,
         'totalStudentCount': total_student_count,
     }
+    if cursor is not None:
+        feed['nextCursor'] = next_cursor
+    return feed
 
 
 def search_for_student_historical(sid):
@@ -627,7 +730,7 @@ def _get_active_plan_descriptions(profile):
 
 def _historicize_profile(row):
     return {
-        **json.loads(row['profile']),
+        **data_loch.parse_json(row['profile']),
         **{
             'fullProfilePending': True,
         },
@@ -647,6 +750,17 @@ def _merge_photo_urls(profiles):
         profile['photoUrl'] = photo_urls.get(_photo_key(profile))
 
 
+def _scope_summary_profile(profile, scope, can_access_canvas_data):
+    # Stored summary profiles are built with unrestricted scope; strip what the current user may not see.
+    athletics_profile = profile.get('athleticsProfile')
+    if athletics_profile and not ('UWASC' in scope or 'ADMIN' in scope):
+        profile['athleticsProfile'] = {'athletics': athletics_profile.get('athletics')}
+    if not ('COENG' in scope or 'ADMIN' in scope):
+        profile.pop('coeProfile', None)
+    if profile.get('term') and not can_access_canvas_data:
+        _suppress_canvas_sites(profile['term'])
+
+
 def _suppress_canvas_sites(enrollment_term):
     for enrollment in enrollment_term['enrollments']:
         enrollment['canvasSites'] = []
@@ -688,7 +802,7 @@ def _construct_historical_student_profile(profile_rows):
     if not profile_rows or not profile_rows[0]:
         return
 
-    profile = json.loads(profile_rows[0]['profile'])
+    profile = data_loch.parse_json(profile_rows[0]['profile'])
     # As above, no photo information is expected but we still need a placeholder element in the feed.
     _merge_photo_urls([profile])
     enrollment_results = data_loch.get_historical_enrollments_for_sid(profile['sid'], latest_term_id=future_term_id())
@@ -697,11 +811,190 @@ def _construct_historical_student_profile(profile_rows):
     return profile
 
 
+def _get_full_student_profiles(sids, scope, benchmark):
+    include_coe = 'COENG' in scope or 'ADMIN' in scope
+    benchmark('begin combined profile query')
+    profile_results = data_loch.get_student_profiles_with_advising_data(sids, include_coe=include_coe)
+    benchmark('end combined profile query')
+    if profile_results is None:
+        app.logger.warning('Combined profile query failed; falling back to sequential profile queries')
+        return _get_full_student_profiles_sequentially(sids, scope, benchmark)
+    return _merge_full_student_profiles(sids, profile_results, scope)
+
+
+def _merge_full_student_profiles(sids, profile_results, scope):
+    profiles_by_sid = _get_profiles_by_sid(profile_results)
+    for row in profile_results:
+        profile = profiles_by_sid[row['sid']]
+        if row['asc_profile']:
+            _merge_asc_student_profile_data(profile, {'profile': row['asc_profile']}, scope)
+        if row['coe_profile']:
+            _merge_coe_student_profile_data(profile, {'profile': row['coe_profile']})
+    return [profiles_by_sid[sid] for sid in sids if sid in profiles_by_sid]
+
+
+def _get_full_student_profiles_sequentially(sids, scope, benchmark):
+    benchmark('begin SIS profile query')
+    profile_results = data_loch.get_student_profiles(sids)
+    benchmark('end SIS profile query')
+    if not profile_results:
+        return []
+    profiles_by_sid = _get_profiles_by_sid(profile_results)
+    profiles = []
+    for sid in sids:
+        profile = profiles_by_sid.get(sid)
+        if profile:
+            profiles.append(profile)
+
+    benchmark('begin ASC profile merge')
+    athletics_profiles = data_loch.get_athletics_profiles(sids)
+    if athletics_profiles:
+        for athletics_profile in athletics_profiles:
+            sid = athletics_profile['sid']
+            _merge_asc_student_profile_data(profiles_by_sid.get(sid), athletics_profile, scope)
+    benchmark('end ASC profile merge')
+
+    if 'COENG' in scope or 'ADMIN' in scope:
+        benchmark('begin COE profile merge')
+        coe_profiles = data_loch.get_coe_profiles(sids)
+        if coe_profiles:
+            for coe_profile in coe_profiles:
+                sid = coe_profile['sid']
+                _merge_coe_student_profile_data(profiles_by_sid.get(sid), coe_profile)
+        benchmark('end COE profile merge')
+    return profiles
+
+
+def _get_ordered_sids(sql, query_bindings):
+    # The generated SQL and its bindings capture filter criteria, the user's scope, the current term and sort order.
+    query_hash = hashlib.sha256(json.dumps([sql, query_bindings], default=str, sort_keys=True).encode()).hexdigest()
+    # The loch reloads nightly. Keying on the date bounds staleness to a day, should a refresh job fail to clear the cache.
+    key = f'cohort_query_{_loch_data_version()}_{query_hash}'
+    ordered_sids = json_cache.fetch(key)
+    if ordered_sids is None:
+        ordered_sids = _query_ordered_sids(sql, query_bindings)
+        if ordered_sids is not None:
+            json_cache.stage_row(key, ordered_sids)
+    return ordered_sids
+
+
+def _loch_data_version():
+    return localize_datetime(utc_now()).strftime('%Y%m%d')
+
+
+def _query_ordered_sids(sql, query_bindings):
+    result = data_loch.safe_execute_rds(sql, **query_bindings)
+    return None if result is None else [row['sid'] for row in result]
+
+
+def _ordered_students_query(query_tables, query_filter, group_codes, majors, order_by, scope):
+    o, o_secondary, o_tertiary, o_direction, supplemental_query_tables = data_loch.get_students_ordering(
+        current_term_id=current_term_id(),
+        order_by=order_by,
+        group_codes=group_codes,
+        majors=majors,
+        scope=scope,
+    )
+    if supplemental_query_tables:
+        query_tables += supplemental_query_tables
+    if 'group_name' in o or 'entering_term' in o or 'term_gpa' in o or 'terms_in_attendance' in o:
+        o_null_order = 'NULLS LAST'
+    else:
+        o_null_order = 'NULLS FIRST'
+    sql = f"""SELECT
+        sas.sid, MIN({o}), MIN({o_secondary}), MIN({o_tertiary})
+        {query_tables}
+        {query_filter}
+        GROUP BY sas.sid
+        ORDER BY MIN({o}) {o_direction} {o_null_order}, MIN({o_secondary}) NULLS FIRST, MIN({o_tertiary}) NULLS FIRST"""
+    if o_tertiary != 'sas.sid':
+        sql += ', sas.sid'
+    return query_tables, sql, (o, o_secondary, o_tertiary, o_direction, o_null_order)
+
+
+def _query_sids(query_tables, query_filter, query_bindings):
+    sids_result = data_loch.safe_execute_rds(f'SELECT DISTINCT(sas.sid) {query_tables} {query_filter}', **query_bindings)
+    if sids_result is None:
+        return None
+    # Upstream logic may require the full list of SIDs even if we're only returning full results for a particular
+    # paged slice.
+    return {
+        'sids': [row['sid'] for row in sids_result],
+        'totalStudentCount': len(sids_result),
+    }
+
+
+def _count_students(query_tables, query_filter, query_bindings):
+    result = data_loch.safe_execute_rds(f'SELECT COUNT(DISTINCT sas.sid) AS count {query_tables} {query_filter}', **query_bindings)
+    return result[0]['count'] if result else 0
+
+
+def _query_students_after_cursor(query_tables, query_filter, query_bindings, ordering, cursor, limit):
+    # Keyset pagination over the (o, o_secondary, o_tertiary, sid) ordering tuple. Rather than skipping OFFSET rows,
+    # the query resumes strictly after the last row of the previous page.
+    o, o_secondary, o_tertiary, o_direction, o_null_order = ordering
+    keys = [
+        ('k1', o_direction, o_null_order == 'NULLS FIRST'),
+        ('k2', 'asc', True),
+        ('k3', 'asc', True),
+        ('sid', 'asc', True),
+    ]
+    bindings = dict(query_bindings)
+    cursor_values = _decode_cursor(cursor)
+    after_cursor = _keyset_predicate(keys, cursor_values, bindings) if cursor_values else 'TRUE'
+    sql = f"""SELECT sid, k1, k2, k3 FROM (
+            SELECT sas.sid, MIN({o}) AS k1, MIN({o_secondary}) AS k2, MIN({o_tertiary}) AS k3
+            {query_tables}
+            {query_filter}
+            GROUP BY sas.sid
+        ) AS page
+        WHERE {after_cursor}
+        ORDER BY k1 {o_direction} {o_null_order}, k2 NULLS FIRST, k3 NULLS FIRST, sid
+        LIMIT :limit"""
+    bindings['limit'] = limit if limit and limit < 100 else 100  # Sanity check large limits
+    rows = data_loch.safe_execute_rds(sql, **bindings)
+    next_cursor = _encode_cursor([rows[-1][key] for key, _, _ in keys]) if len(rows) == bindings['limit'] else None
+    return rows, next_cursor
+
+
+def _keyset_predicate(keys, values, bindings):
+    clauses = []
+    for i, (key, direction, nulls_first) in enumerate(keys):
+        param = f'cursor_{i}'
+        bindings[param] = values[i]
+        if values[i] is None:
+            # Only non-null values follow a null when nulls come first; nothing follows a null when nulls come last.
+            follows = f'{key} IS NOT NULL' if nulls_first else None
+        else:
+            operator_ = '>' if direction == 'asc' else '<'
+            follows = f'{key} {operator_} :{param}' if nulls_first else f'({key} {operator_} :{param} OR {key} IS NULL)'
+        if follows:
+            ties = [f'{k} IS NOT DISTINCT FROM :cursor_{j}' for j, (k, _, _) in enumerate(keys[:i])]
+            clauses.append(' AND '.join(ties + [follows]))
+    return '(' + ' OR '.join(f'({clause})' for clause in clauses) + ')'
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()), use_decimal=True)
+    except (TypeError, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != 4:
+        raise BadRequestError(f'Invalid pagination cursor: {cursor}')
+    return values
+
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, use_decimal=True).encode()).decode()
+
+
 def _get_profiles_by_sid(profiles):
     profiles_by_sid = {}
     for row in profiles:
         profiles_by_sid[row['sid']] = {
-            **json.loads(row['profile']),
+            **data_loch.parse_json(row['profile']),
             **{
                 'gender': row['gender'],
                 'underrepresented': row['minority'],
@@ -712,7 +1005,7 @@ def _get_profiles_by_sid(profiles):
 
 def _merge_asc_student_profile_data(profile, asc_profile, scope):
     if profile:
-        asc_profile = json.loads(asc_profile['profile'])
+        asc_profile = data_loch.parse_json(asc_profile['profile'])
         if 'UWASC' in scope or 'ADMIN' in scope:
             profile['athleticsProfile'] = asc_profile
         else:
@@ -722,7 +1015,7 @@ def _merge_asc_student_profile_data(profile, asc_profile, scope):
 
 def _merge_coe_student_profile_data(profile, coe_profile):
     if profile:
-        profile['coeProfile'] = json.loads(coe_profile['profile'])
+        profile['coeProfile'] = data_loch.parse_json(coe_profile['profile'])
         if 'minority' in profile['coeProfile']:
             profile['coeProfile']['underrepresented'] = profile['coeProfile']['minority']
         if profile['coeProfile'].get('status') in ['D', 'P', 'U', 'W', 'X', 'Z']:
@@ -734,9 +1027,10 @@ def _merge_coe_student_profile_data(profile, coe_profile):
 def _merge_enrollment_terms(profile, enrollment_results, academic_standing=None):
     profile['hasCurrentTermEnrollments'] = False
     filtered_enrollment_terms = []
+    current_term_id_ = current_term_id()
     for row in enrollment_results:
-        term = json.loads(row['enrollment_term'])
-        if term['termId'] == current_term_id():
+        term = data_loch.parse_json(row['enrollment_term'])
+        if term['termId'] == current_term_id_:
             profile['hasCurrentTermEnrollments'] = len(term['enrollments']) > 0
         else:
             # Omit dropped sections for non-current terms.
@@ -750,7 +1044,7 @@ def _merge_enrollment_terms(profile, enrollment_results, academic_standing=None)
             # Omit zombie waitlisted enrollments for past terms.
             # TODO Even for current terms, it may be a mistake when SIS data sources show both active and waitlisted
             #  section enrollments for a single class, but that needs confirmation.
-            if enrollments and term['termId'] < current_term_id():
+            if enrollments and term['termId'] < current_term_id_:
                 for course in enrollments:
                     sections = course['sections']
                     if sections:
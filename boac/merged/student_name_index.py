@@ -0,0 +1,118 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import re
+
+from boac.externals import data_loch
+from boac.lib.prefix_index import LazyIndex, PrefixIndex
+from flask import current_app as app
+
+"""Student name and SID typeahead, answered from memory when the index is loaded and from the data loch otherwise."""
+
+
+class StudentNameIndex:
+
+    def __init__(self, rows, historical_rows):
+        self.students = {}
+        names = []
+        for row in rows:
+            self.students[row['sid']] = _student(row)
+            names.append((row['name'], row['sid']))
+        self.names = PrefixIndex(names)
+        self.sids = PrefixIndex((sid, sid) for sid in self.students)
+        # Students no longer enrolled match by SID only.
+        self.historical_students = {}
+        for row in historical_rows:
+            self.historical_students.setdefault(row['sid'], []).append(_student(row))
+        self.historical_sids = PrefixIndex((sid, sid) for sid in self.historical_students)
+
+    def __len__(self):
+        return len(self.names) + len(self.historical_sids)
+
+    def match_names(self, prefixes):
+        return _intersection(set(self.names.match(prefix)) for prefix in prefixes)
+
+    def match_students(self, prefixes, limit=None):
+        sids = _intersection(set(self.names.match(p)) | set(self.sids.match(p)) for p in prefixes)
+        students = {self.students[sid] for sid in sids}
+        sid_prefixes = [p for p in prefixes if not p.isalpha()]
+        if sid_prefixes:
+            for sid in _intersection(set(self.historical_sids.match(p)) for p in sid_prefixes):
+                students.update(self.historical_students[sid])
+        # The first sort key makes the order match SQL ORDER BY first_name, last_name under case-insensitive collation.
+        students = sorted(students, key=lambda s: (s[0].casefold(), s[1].casefold(), s))
+        return [
+            {'first_name': first_name, 'last_name': last_name, 'sid': sid, 'uid': uid}
+            for first_name, last_name, sid, uid in students[0:limit]
+        ]
+
+
+def _load():
+    rows = data_loch.get_student_names_for_index()
+    historical_rows = data_loch.get_historical_student_names_for_index()
+    if rows is None or historical_rows is None:
+        return None
+    return StudentNameIndex(rows, historical_rows)
+
+
+student_name_index = LazyIndex('student name', _load)
+
+
+def match_students_by_name_or_sid(prefixes, limit=None):
+    prefixes = list(prefixes)
+    index = student_name_index.get()
+    students = index.match_students(prefixes, limit=int(limit) if limit else None) if index and prefixes else None
+    # Students new to the loch since the index was built are found in SQL.
+    return students or data_loch.match_students_by_name_or_sid(prefixes, limit=limit)
+
+
+def match_sids_by_name(search_phrase):
+    """Return SIDs of current students with names matching each word of a search phrase, or None to search in SQL.
+
+    Matches are as of the last index build: a student new to the loch since then is found only if no indexed student
+    matches. Phrases matching more than TYPEAHEAD_INDEX_MAX_NAME_MATCHES students are searched in SQL, where a join
+    beats binding a long list of SIDs.
+    """
+    index = student_name_index.get()
+    if not index:
+        return None
+    prefixes = [''.join(re.split(r'\W', word)) for word in search_phrase.upper().split()]
+    sids = index.match_names(prefixes)
+    if not sids or len(sids) > app.config['TYPEAHEAD_INDEX_MAX_NAME_MATCHES']:
+        return None
+    return sids
+
+
+def _intersection(sets):
+    result = None
+    for s in sets:
+        result = s if result is None else result & s
+        if not result:
+            break
+    return result or set()
+
+
+def _student(row):
+    return row['first_name'], row['last_name'], row['sid'], row['uid']
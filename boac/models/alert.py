@@ -54,6 +54,7 @@ class Alert(Base):
     sid = db.Column(db.String(80), nullable=False)
     alert_type = db.Column(db.String(80), nullable=False)
     key = db.Column(db.String(255), nullable=False)
+    term_id = db.Column(db.String(4))
     message = db.Column(db.Text, nullable=False)
     active = db.Column(db.Boolean, nullable=False)
     views = db.relationship(
@@ -86,11 +87,14 @@ class Alert(Base):
         alert = cls(sid, alert_type, key, message, active)
         db.session.add(alert)
         std_commit()
+        if active:
+            cls.refresh_alert_counts(sids=[sid])
 
     def __init__(self, sid, alert_type, key, message=None, active=True):
         self.sid = sid
         self.alert_type = alert_type
         self.key = key
+        self.term_id = _term_id_for_key(key)
         self.message = message
         self.active = active
 
@@ -99,6 +103,7 @@ class Alert(Base):
                     sid={self.sid},
                     alert_type={self.alert_type},
                     key={self.key},
+                    term_id={self.term_id},
                     message={self.message},
                     active={self.active},
                     updated={self.updated_at},
@@ -115,37 +120,36 @@ class Alert(Base):
             else:
                 db.session.add(AlertView(viewer_id=viewer_id, alert_id=alert_id, dismissed_at=datetime.now()))
             std_commit()
+            cls.refresh_alert_counts(sids=[alert.sid])
         else:
             raise BadRequestError(f'No alert found for id {alert_id}')
 
     @classmethod
     def current_alert_counts_for_viewer(cls, viewer_id):
         query = """
-            SELECT alerts.sid, count(*) as alert_count
-            FROM alerts LEFT JOIN alert_views
-                ON alert_views.alert_id = alerts.id
-                AND alert_views.viewer_id = :viewer_id
-            WHERE alerts.active = true
-                AND alerts.key LIKE :key
-                AND alert_views.dismissed_at IS NULL
-            GROUP BY alerts.sid
+            SELECT alert_counts.sid, alert_counts.alert_count - COALESCE(alert_view_counts.dismissed_count, 0) AS alert_count
+            FROM alert_counts LEFT JOIN alert_view_counts
+                ON alert_view_counts.viewer_id = :viewer_id
+                AND alert_view_counts.term_id = alert_counts.term_id
+                AND alert_view_counts.sid = alert_counts.sid
+            WHERE alert_counts.term_id = :term_id
+                AND alert_counts.alert_count > COALESCE(alert_view_counts.dismissed_count, 0)
         """
-        params = {'viewer_id': viewer_id, 'key': current_term_id() + '_%'}
+        params = {'viewer_id': viewer_id, 'term_id': current_term_id()}
         return cls.alert_counts_by_query(query, params)
 
     @classmethod
     def current_alert_counts_for_sids(cls, viewer_id, sids, count_only=False, offset=None, limit=None):
         query = """
-            SELECT alerts.sid, count(*) as alert_count
-            FROM alerts LEFT JOIN alert_views
-                ON alert_views.alert_id = alerts.id
-                AND alert_views.viewer_id = :viewer_id
-            WHERE alerts.active = true
-                AND alerts.key LIKE :key
-                AND alerts.sid = ANY(:sids)
-                AND alert_views.dismissed_at IS NULL
-            GROUP BY alerts.sid
-            ORDER BY alert_count DESC, alerts.sid
+            SELECT alert_counts.sid, alert_counts.alert_count - COALESCE(alert_view_counts.dismissed_count, 0) AS alert_count
+            FROM alert_counts LEFT JOIN alert_view_counts
+                ON alert_view_counts.viewer_id = :viewer_id
+                AND alert_view_counts.term_id = alert_counts.term_id
+                AND alert_view_counts.sid = alert_counts.sid
+            WHERE alert_counts.term_id = :term_id
+                AND alert_counts.sid = ANY(:sids)
+                AND alert_counts.alert_count > COALESCE(alert_view_counts.dismissed_count, 0)
+            ORDER BY alert_count DESC, alert_counts.sid
         """
         if offset:
             query += ' OFFSET :offset'
@@ -153,13 +157,76 @@ class Alert(Base):
             query += ' LIMIT :limit'
         params = {
             'viewer_id': viewer_id,
-            'key': current_term_id() + '_%',
+            'term_id': current_term_id(),
             'sids': sids,
             'offset': offset,
             'limit': limit,
         }
         return cls.alert_counts_by_query(query, params, count_only=count_only)
 
+    @classmethod
+    def refresh_alert_counts(cls, sids=None, term_id=None):
+        """Rebuild the rollup of active alerts per student and term, and of those dismissed per viewer.
+
+        Rows are rebuilt for the given SIDs and/or term only; with neither, the whole rollup is rebuilt. Alerts without
+        a term are not counted.
+        """
+        alert_filters = ['alerts.active IS TRUE', 'alerts.term_id IS NOT NULL']
+        count_filters = ['TRUE']
+        if sids is not None:
+            alert_filters.append('alerts.sid = ANY(:sids)')
+            count_filters.append('c.sid = ANY(:sids)')
+        if term_id is not None:
+            alert_filters.append('alerts.term_id = :term_id')
+            count_filters.append('c.term_id = :term_id')
+        params = {'sids': sids, 'term_id': term_id and str(term_id)}
+        alert_filter = ' AND '.join(alert_filters)
+        count_filter = ' AND '.join(count_filters)
+        # Upsert, then delete rows no longer counted, so that concurrent rebuilds of the same rows (e.g., two dismissals
+        # or a dismissal during the term-wide rebuild) cannot both insert a row. Ordering keeps row locks in step.
+        db.session.execute(
+            text(f"""INSERT INTO alert_counts (sid, term_id, alert_count)
+                SELECT alerts.sid, alerts.term_id, count(*)
+                FROM alerts
+                WHERE {alert_filter}
+                GROUP BY 1, 2
+                ORDER BY 2, 1
+                ON CONFLICT (term_id, sid) DO UPDATE SET alert_count = EXCLUDED.alert_count"""),
+            params,
+        )
+        db.session.execute(
+            text(f"""INSERT INTO alert_view_counts (viewer_id, sid, term_id, dismissed_count)
+                SELECT alert_views.viewer_id, alerts.sid, alerts.term_id, count(*)
+                FROM alerts
+                JOIN alert_views ON alert_views.alert_id = alerts.id AND alert_views.dismissed_at IS NOT NULL
+                WHERE {alert_filter}
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 3, 2
+                ON CONFLICT (viewer_id, term_id, sid) DO UPDATE SET dismissed_count = EXCLUDED.dismissed_count"""),
+            params,
+        )
+        db.session.execute(
+            text(f"""DELETE FROM alert_counts c
+                WHERE {count_filter}
+                AND NOT EXISTS (
+                    SELECT 1 FROM alerts
+                    WHERE {alert_filter} AND alerts.sid = c.sid AND alerts.term_id = c.term_id
+                )"""),
+            params,
+        )
+        db.session.execute(
+            text(f"""DELETE FROM alert_view_counts c
+                WHERE {count_filter}
+                AND NOT EXISTS (
+                    SELECT 1 FROM alerts
+                    JOIN alert_views ON alert_views.alert_id = alerts.id AND alert_views.dismissed_at IS NOT NULL
+                    WHERE {alert_filter} AND alerts.sid = c.sid AND alerts.term_id = c.term_id
+                    AND alert_views.viewer_id = c.viewer_id
+                )"""),
+            params,
+        )
+        std_commit()
+
     @classmethod
     def alert_counts_by_query(cls, query, params, count_only=False):
         results = db.session.execute(text(query), params)
@@ -190,11 +257,11 @@ class Alert(Base):
                 ON alert_views.alert_id = alerts.id
                 AND alert_views.viewer_id = :viewer_id
             WHERE alerts.active = true
-                AND alerts.key LIKE :key
+                AND alerts.term_id = :term_id
                 AND alerts.sid = :sid
             ORDER BY alerts.created_at
         """)
-        results = db.session.execute(query, {'viewer_id': viewer_id, 'key': current_term_id() + '_%', 'sid': sid})
+        results = db.session.execute(query, {'viewer_id': viewer_id, 'term_id': current_term_id(), 'sid': sid})
         feed = []
 
         def result_to_dict(result):
@@ -219,10 +286,12 @@ class Alert(Base):
         if preserve_creation_date:
             self.updated_at = self.created_at
         std_commit()
+        self.refresh_alert_counts(sids=[self.sid])
 
     def deactivate(self):
         self.active = False
         std_commit()
+        self.refresh_alert_counts(sids=[self.sid])
 
     @classmethod
     def create_or_activate(cls, sid, alert_type, key, message, preserve_creation_date=False):
@@ -243,11 +312,12 @@ class Alert(Base):
             cls.query.
             filter(cls.sid == sid).
             filter(cls.alert_type.in_(alert_types)).
-            filter(cls.key.startswith(f'{term_id}_%')).
+            filter(cls.term_id == str(term_id)).
             filter(cls.active == True)  # noqa: E712
         )
         results = query.update({cls.active: False}, synchronize_session='fetch')
         std_commit()
+        cls.refresh_alert_counts(sids=[sid], term_id=term_id)
         return results
 
     @classmethod
@@ -272,59 +342,159 @@ class Alert(Base):
     def deactivate_all_for_term(cls, term_id):
         query = (
             cls.query.
-            filter(cls.key.startswith(f'{term_id}_%')).
+            filter(cls.term_id == str(term_id)).
             filter(cls.active == True)  # noqa: E712
         )
         results = query.update({cls.active: False}, synchronize_session='fetch')
         std_commit()
+        cls.refresh_alert_counts(term_id=term_id)
         return results
 
     @classmethod
-    def update_all_for_term(cls, term_id):
+    def update_all_for_term(cls, term_id, deactivate_missing=False):
+        """Create or activate alerts for the term from current loch data.
+
+        Phase one computes every alert that should be active for the term. Phase two stages them in a temporary
+        table and reconciles the alerts table against it in a few set-based statements. If deactivate_missing is
+        set, other active alerts for the term are deactivated in the same pass.
+        """
         app.logger.info('Starting alert update')
-        enrollments_for_term = data_loch.get_enrollments_for_term(str(term_id))
+        # Reconciliation waits until every loch stream has been read to the end. A stream that fails partway raises
+        # here, failing the update; deactivating against a partial read would deactivate the alerts of every student
+        # not yet read.
+        alerts = cls.alerts_for_term(term_id)
+        app.logger.info(f'{len(alerts)} alerts computed for term {term_id}')
+        deactivated, reactivated, created = cls.reconcile_alerts_for_term(term_id, alerts.values(), deactivate_missing)
+        app.logger.info(f'Alert update complete: {deactivated} deactivated, {reactivated} updated, {created} created')
+
+    @classmethod
+    def alerts_for_term(cls, term_id):
+        alerts = {}
+
+        def _add(alert):
+            alerts[(alert['sid'], alert['alert_type'], alert['key'])] = alert
+
         no_activity_alerts_enabled = cls.no_activity_alerts_enabled()
         infrequent_activity_alerts_enabled = cls.infrequent_activity_alerts_enabled()
-        for row in enrollments_for_term:
-            enrollments = json.loads(row['enrollment_term']).get('enrollments', [])
+        for row in data_loch.stream_enrollments_for_term(str(term_id)):
+            enrollments = data_loch.parse_json(row['enrollment_term']).get('enrollments', [])
             for enrollment in enrollments:
-                cls.update_alerts_for_enrollment(
+                for alert in cls.alerts_for_enrollment(
                     sid=row['sid'],
                     term_id=term_id,
                     enrollment=enrollment,
                     no_activity_alerts_enabled=no_activity_alerts_enabled,
                     infrequent_activity_alerts_enabled=infrequent_activity_alerts_enabled,
-                )
-        profiles = data_loch.get_student_profiles()
-        if app.config['ALERT_WITHDRAWAL_ENABLED'] and str(term_id) == current_term_id():
-            for row in profiles:
-                profile_feed = json.loads(row['profile'])
+                ):
+                    _add(alert)
+        withdrawal_alerts_enabled = app.config['ALERT_WITHDRAWAL_ENABLED'] and str(term_id) == current_term_id()
+        sids = []
+        for row in data_loch.stream_student_profiles():
+            sids.append(row['sid'])
+            if withdrawal_alerts_enabled:
+                profile_feed = data_loch.parse_json(row['profile'])
                 if 'withdrawalCancel' in (profile_feed.get('sisProfile') or {}):
-                    cls.update_withdrawal_cancel_alerts(row['sid'], term_id)
+                    _add(_withdrawal_cancel_alert(row['sid'], term_id))
 
-        sids = [p['sid'] for p in profiles]
         for sid, academic_standing in get_academic_standing_by_sid(sids, as_dicts=True).items():
             status = academic_standing.get(str(term_id))
             if status in ('DIS', 'PRO', 'SUB'):
-                cls.update_academic_standing_alerts(sid, status, term_id)
-        app.logger.info('Alert update complete')
+                _add(_academic_standing_alert(sid, status, term_id))
+        return alerts
+
+    @classmethod
+    def reconcile_alerts_for_term(cls, term_id, alerts, deactivate_missing=False):
+        """Update or create the given alerts, optionally deactivating all other alerts for the term.
+
+        The effect matches create_or_activate per alert, preceded by deactivate_all_for_term if deactivate_missing
+        is set: an alert that is active, or was deactivated in the last two hours, is updated in place; otherwise a
+        new alert is created.
+        """
+        now = datetime.now()
+        db.session.execute(
+            """CREATE TEMPORARY TABLE alerts_staged (
+                sid VARCHAR(80) NOT NULL,
+                alert_type VARCHAR(80) NOT NULL,
+                key VARCHAR(255) NOT NULL,
+                message TEXT NOT NULL,
+                preserve_creation_date BOOLEAN NOT NULL
+            ) ON COMMIT DROP""",
+        )
+        alerts = list(alerts)
+        count_per_chunk = 10000
+        for chunk in range(0, len(alerts), count_per_chunk):
+            db.session.execute(
+                """INSERT INTO alerts_staged (sid, alert_type, key, message, preserve_creation_date)
+                    SELECT sid, alert_type, key, message, preserve_creation_date
+                    FROM json_to_recordset(:json_dumps)
+                    AS (sid VARCHAR, alert_type VARCHAR, key VARCHAR, message TEXT, preserve_creation_date BOOLEAN)""",
+                {'json_dumps': json.dumps(alerts[chunk:chunk + count_per_chunk])},
+            )
+        deactivated = 0
+        if deactivate_missing:
+            deactivated = db.session.execute(
+                text("""UPDATE alerts a SET active = FALSE, updated_at = :now
+                    WHERE a.active = TRUE AND a.term_id = :term_id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM alerts_staged s
+                        WHERE s.sid = a.sid AND s.alert_type = a.alert_type AND s.key = a.key
+                    )"""),
+                {'now': now, 'term_id': str(term_id)},
+            ).rowcount
+        results = db.session.execute(
+            text("""WITH latest AS (
+                    SELECT DISTINCT ON (a.sid, a.alert_type, a.key) a.id, a.sid, a.alert_type, a.key, a.active, a.updated_at
+                    FROM alerts a
+                    JOIN alerts_staged s ON s.sid = a.sid AND s.alert_type = a.alert_type AND s.key = a.key
+                    ORDER BY a.sid, a.alert_type, a.key, a.updated_at DESC
+                ),
+                updated AS (
+                    UPDATE alerts a SET
+                        active = TRUE,
+                        message = s.message,
+                        updated_at = CASE
+                            WHEN s.preserve_creation_date THEN a.created_at
+                            WHEN a.active = TRUE AND a.message = s.message AND NOT :deactivate_missing THEN a.updated_at
+                            ELSE :now
+                        END
+                    FROM latest l
+                    JOIN alerts_staged s ON s.sid = l.sid AND s.alert_type = l.alert_type AND s.key = l.key
+                    WHERE a.id = l.id AND (l.active = TRUE OR l.updated_at > :now - INTERVAL '2 hours')
+                    RETURNING a.sid, a.alert_type, a.key
+                ),
+                created AS (
+                    INSERT INTO alerts (sid, alert_type, key, term_id, message, active, created_at, updated_at)
+                    SELECT s.sid, s.alert_type, s.key, :term_id, s.message, TRUE, :now, :now
+                    FROM alerts_staged s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM updated u
+                        WHERE u.sid = s.sid AND u.alert_type = s.alert_type AND u.key = s.key
+                    )
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                )
+                SELECT (SELECT COUNT(*) FROM updated) AS updated_count, (SELECT COUNT(*) FROM created) AS created_count"""),
+            {'deactivate_missing': deactivate_missing, 'now': now, 'term_id': str(term_id)},
+        ).first()
+        db.session.execute('DROP TABLE alerts_staged')
+        std_commit()
+        cls.refresh_alert_counts(term_id=term_id)
+        return deactivated, results['updated_count'], results['created_count']
 
     @classmethod
     def update_academic_standing_alerts(cls, sid, status, term_id):
-        key = f'{term_id}_academic_standing_{status}'
-        status_description = ACADEMIC_STANDING_DESCRIPTIONS.get(status, status)
-        message = f"Student's academic standing is '{status_description}'."
-        cls.create_or_activate(sid=sid, alert_type='academic_standing', key=key, message=message)
+        cls.create_or_activate(**_academic_standing_alert(sid, status, term_id))
 
     @classmethod
-    def update_alerts_for_enrollment(cls, sid, term_id, enrollment, no_activity_alerts_enabled, infrequent_activity_alerts_enabled):
+    def alerts_for_enrollment(cls, sid, term_id, enrollment, no_activity_alerts_enabled, infrequent_activity_alerts_enabled):
+        alerts = []
         for section in enrollment['sections']:
             if section_is_eligible_for_alerts(enrollment=enrollment, section=section):
                 # If the grade is in, what's done is done.
                 if section.get('grade'):
                     continue
                 if section.get('midtermGrade'):
-                    cls.update_midterm_grade_alerts(sid, term_id, section['ccn'], enrollment['displayName'], section['midtermGrade'])
+                    alerts.append(_midterm_grade_alert(sid, term_id, section['ccn'], enrollment['displayName'], section['midtermGrade']))
                 last_activity = None
                 activity_percentile = None
                 for canvas_site in enrollment.get('canvasSites', []):
@@ -342,7 +512,7 @@ class Alert(Base):
                         and last_activity == 0
                         and activity_percentile <= app.config['ALERT_NO_ACTIVITY_PERCENTILE_CUTOFF']
                 ):
-                    cls.update_no_activity_alerts(sid, term_id, enrollment['displayName'])
+                    alerts.append(_no_activity_alert(sid, term_id, enrollment['displayName']))
                 elif (
                     infrequent_activity_alerts_enabled
                     and last_activity > 0
@@ -354,12 +524,8 @@ class Alert(Base):
                             days_since >= app.config['ALERT_INFREQUENT_ACTIVITY_DAYS']
                             and activity_percentile <= app.config['ALERT_INFREQUENT_ACTIVITY_PERCENTILE_CUTOFF']
                     ):
-                        cls.update_infrequent_activity_alerts(
-                            sid,
-                            term_id,
-                            enrollment['displayName'],
-                            days_since,
-                        )
+                        alerts.append(_infrequent_activity_alert(sid, term_id, enrollment['displayName'], days_since))
+        return alerts
 
     @classmethod
     def update_assignment_alerts(cls, sid, term_id, assignment_id, due_at, status, course_site_name):
@@ -371,33 +537,19 @@ class Alert(Base):
 
     @classmethod
     def update_midterm_grade_alerts(cls, sid, term_id, section_id, class_name, grade):
-        key = f'{term_id}_{section_id}'
-        message = f'{class_name} midpoint deficient grade of {grade}.'
-        cls.create_or_activate(sid=sid, alert_type='midterm', key=key, message=message, preserve_creation_date=True)
+        cls.create_or_activate(**_midterm_grade_alert(sid, term_id, section_id, class_name, grade))
 
     @classmethod
     def update_no_activity_alerts(cls, sid, term_id, class_name):
-        key = f'{term_id}_{class_name}'
-        message = f'No activity! Student has never visited the {class_name} bCourses site for {term_name_for_sis_id(term_id)}.'
-        cls.create_or_activate(sid=sid, alert_type='no_activity', key=key, message=message)
+        cls.create_or_activate(**_no_activity_alert(sid, term_id, class_name))
 
     @classmethod
     def update_infrequent_activity_alerts(cls, sid, term_id, class_name, days_since):
-        key = f'{term_id}_{class_name}'
-        message = f'Infrequent activity! Last {class_name} bCourses activity was {days_since} days ago.'
-        # If an active infrequent activity alert already exists and is more recent, skip the update.
-        existing_alert = cls.query.filter_by(sid=sid, alert_type='infrequent_activity', key=key, active=True).first()
-        if existing_alert:
-            match = re.search('(\d+) days ago.$', message)
-            if match and match[1] and int(match[1]) < days_since:
-                return
-        cls.create_or_activate(sid=sid, alert_type='infrequent_activity', key=key, message=message)
+        cls.create_or_activate(**_infrequent_activity_alert(sid, term_id, class_name, days_since))
 
     @classmethod
     def update_withdrawal_cancel_alerts(cls, sid, term_id):
-        key = f'{term_id}_withdrawal'
-        message = f'Student is no longer enrolled in the {term_name_for_sis_id(term_id)} term.'
-        cls.create_or_activate(sid=sid, alert_type='withdrawal', key=key, message=message, preserve_creation_date=True)
+        cls.create_or_activate(**_withdrawal_cancel_alert(sid, term_id))
 
     @classmethod
     def include_alert_counts_for_students(cls, viewer_user_id, group, count_only=False, offset=None, limit=None):
@@ -409,3 +561,68 @@ class Alert(Base):
                 sid = student['sid']
                 student['alertCount'] = counts_per_sid.get(sid) if sid in counts_per_sid else 0
         return alert_counts
+
+
+def _term_id_for_key(key):
+    # Keys of term-specific alerts are prefixed with the term id, e.g. '2178_800900300'.
+    match = re.match(r'^(\d{4})_', key)
+    return match and match.group(1)
+
+
+def _alert(sid, alert_type, key, message, preserve_creation_date=False):
+    return {
+        'sid': sid,
+        'alert_type': alert_type,
+        'key': key,
+        'message': message,
+        'preserve_creation_date': preserve_creation_date,
+    }
+
+
+def _academic_standing_alert(sid, status, term_id):
+    status_description = ACADEMIC_STANDING_DESCRIPTIONS.get(status, status)
+    return _alert(
+        sid=sid,
+        alert_type='academic_standing',
+        key=f'{term_id}_academic_standing_{status}',
+        message=f"Student's academic standing is '{status_description}'.",
+    )
+
+
+def _infrequent_activity_alert(sid, term_id, class_name, days_since):
+    return _alert(
+        sid=sid,
+        alert_type='infrequent_activity',
+        key=f'{term_id}_{class_name}',
+        message=f'Infrequent activity! Last {class_name} bCourses activity was {days_since} days ago.',
+    )
+
+
+def _midterm_grade_alert(sid, term_id, section_id, class_name, grade):
+    # Midpoint deficient grade and withdrawal alerts don't include a time-shifted message, so keep their creation date.
+    return _alert(
+        sid=sid,
+        alert_type='midterm',
+        key=f'{term_id}_{section_id}',
+        message=f'{class_name} midpoint deficient grade of {grade}.',
+        preserve_creation_date=True,
+    )
+
+
+def _no_activity_alert(sid, term_id, class_name):
+    return _alert(
+        sid=sid,
+        alert_type='no_activity',
+        key=f'{term_id}_{class_name}',
+        message=f'No activity! Student has never visited the {class_name} bCourses site for {term_name_for_sis_id(term_id)}.',
+    )
+
+
+def _withdrawal_cancel_alert(sid, term_id):
+    return _alert(
+        sid=sid,
+        alert_type='withdrawal',
+        key=f'{term_id}_withdrawal',
+        message=f'Student is no longer enrolled in the {term_name_for_sis_id(term_id)} term.',
+        preserve_creation_date=True,
+    )
@@ -24,14 +24,14 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 from datetime import datetime
-import json
 import re
 
 from boac import db, std_commit
 from boac.externals import data_loch
+from boac.lib import search_index
 from boac.lib.berkeley import BERKELEY_DEPT_CODE_TO_NAME
 from boac.lib.util import (
-    camelize, localize_datetime, localized_timestamp_to_utc,
+    camelize, keyset_filter, localize_datetime, localized_timestamp_to_utc,
     search_result_text_snippet, TEXT_SEARCH_PATTERN, titleize, utc_now, vacuum_whitespace,
 )
 from boac.merged import calnet
@@ -331,6 +331,33 @@ class Appointment(Base):
         limit=20,
         offset=0,
     ):
+        rows = cls.search_rows(
+            search_phrase,
+            advisor_uid=advisor_uid,
+            student_csid=student_csid,
+            topic=topic,
+            datetime_from=datetime_from,
+            datetime_to=datetime_to,
+            limit=limit,
+            offset=offset,
+        )
+        search_terms = [t.group(0) for t in list(re.finditer(TEXT_SEARCH_PATTERN, search_phrase)) if t] if search_phrase else []
+        return cls.search_results_to_api_json(rows, search_terms)
+
+    @classmethod
+    def search_rows(
+        cls,
+        search_phrase,
+        advisor_uid=None,
+        student_csid=None,
+        topic=None,
+        datetime_from=None,
+        datetime_to=None,
+        after=None,
+        limit=20,
+        offset=0,
+    ):
+        """Return matching appointments, with their rank, ordered by rank and id. Pass the (rank, id) of a previous result as after."""
         if search_phrase:
             search_terms = [t.group(0) for t in list(re.finditer(TEXT_SEARCH_PATTERN, search_phrase)) if t]
             search_phrase = ' & '.join(search_terms)
@@ -341,7 +368,6 @@ class Appointment(Base):
                 'search_phrase': search_phrase,
             }
         else:
-            search_terms = []
             fts_selector = 'SELECT id, 0 AS rank FROM appointments WHERE deleted_at IS NULL'
             params = {}
         if advisor_uid:
@@ -369,20 +395,26 @@ class Appointment(Base):
         else:
             topic_join = ''
 
+        after_filter = keyset_filter('fts.rank', 'appointments.id', after, params)
         query = text(f"""
-            SELECT appointments.* FROM ({fts_selector}) AS fts
+            SELECT appointments.*, fts.rank FROM ({fts_selector}) AS fts
             JOIN appointments
                 ON fts.id = appointments.id
                 {advisor_filter}
                 {student_filter}
                 {date_filter}
             {topic_join}
+            WHERE {after_filter}
             ORDER BY fts.rank DESC, appointments.id
-            LIMIT {limit} OFFSET {offset}
+            LIMIT {int(limit)} OFFSET {int(offset)}
         """).bindparams(**params)
         result = db.session.execute(query)
         keys = result.keys()
-        return [_to_json(search_terms, dict(zip(keys, row))) for row in result.fetchall()]
+        return [dict(zip(keys, row)) for row in result.fetchall()]
+
+    @classmethod
+    def search_results_to_api_json(cls, search_results, search_terms):
+        return [_to_json(search_terms, search_result) for search_result in search_results]
 
     def update(
         self,
@@ -407,9 +439,8 @@ class Appointment(Base):
 
     @classmethod
     def refresh_search_index(cls):
-        db.session.execute(text('REFRESH MATERIALIZED VIEW appointments_fts_index'))
-        db.session.execute(text('REFRESH MATERIALIZED VIEW advisor_author_index'))
         std_commit()
+        search_index.request_refresh(search_index.APPOINTMENT_SEARCH_INDEXES)
 
     @classmethod
     def delete(cls, appointment_id):
@@ -518,7 +549,7 @@ def _student_to_json(sid):
     profiles = data_loch.get_historical_student_profiles_for_sids([sid])
     if profiles and profiles[0]:
         return {
-            'student': json.loads(profiles[0].get('profile')),
+            'student': data_loch.parse_json(profiles[0].get('profile')),
         }
 
 
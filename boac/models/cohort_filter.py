@@ -23,6 +23,7 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from collections import OrderedDict
 import json
 
 from boac import db, std_commit
@@ -144,11 +145,7 @@ class CohortFilter(Base):
     def track_membership_changes(self):
         # Track membership changes only if the cohort has been saved and has an id.
         if self.id:
-            old_sids = set(self._transient_sids)
-            new_sids = set(self.sids)
-            removed_sids = old_sids - new_sids
-            added_sids = new_sids - old_sids
-            CohortFilterEvent.create_bulk(self.id, added_sids, removed_sids)
+            CohortFilterEvent.track_membership_changes(self.id, self._transient_sids)
         self._transient_sids = []
 
     @classmethod
@@ -217,25 +214,101 @@ class CohortFilter(Base):
             SET alert_count = updated_cohort_counts.alert_count
             FROM
             (
-                SELECT cohort_filters.id AS cohort_filter_id, count(*) AS alert_count
-                FROM alerts
+                SELECT cohort_filters.id AS cohort_filter_id,
+                    sum(alert_counts.alert_count - COALESCE(alert_view_counts.dismissed_count, 0)) AS alert_count
+                FROM alert_counts
                 JOIN cohort_filters
-                    ON alerts.sid = ANY(cohort_filters.sids)
-                    AND alerts.key LIKE :key
-                    AND alerts.active IS TRUE
+                    ON alert_counts.sid = ANY(cohort_filters.sids)
+                    AND alert_counts.term_id = :term_id
                     AND cohort_filters.owner_id = :owner_id
-                LEFT JOIN alert_views
-                    ON alert_views.alert_id = alerts.id
-                    AND alert_views.viewer_id = :owner_id
-                WHERE alert_views.dismissed_at IS NULL
+                LEFT JOIN alert_view_counts
+                    ON alert_view_counts.viewer_id = :owner_id
+                    AND alert_view_counts.term_id = alert_counts.term_id
+                    AND alert_view_counts.sid = alert_counts.sid
                 GROUP BY cohort_filters.id
             ) updated_cohort_counts
             WHERE cohort_filters.id = updated_cohort_counts.cohort_filter_id
         """)
-        result = db.session.execute(query, {'owner_id': owner_id, 'key': current_term_id() + '_%'})
+        result = db.session.execute(query, {'owner_id': owner_id, 'term_id': current_term_id()})
         std_commit()
         return result
 
+    @classmethod
+    def refresh_all_counts(cls, progress=None):
+        """Recompute sids, student counts and alert counts of all saved cohorts.
+
+        Cohorts sharing the same normalized criteria (and, where criteria depend on the owner, the same owner) are
+        evaluated with a single students query. Results and membership events are then written in batched statements.
+        """
+        recounts = OrderedDict()
+        for cohort in cls.query.order_by(cls.id).all():
+            if progress and cohort.id in progress.done:
+                continue
+            criteria = cohort.to_base_json()['criteria']
+            recounts.setdefault(_recount_key(cohort, criteria), (criteria, []))[1].append(cohort)
+        app.logger.info(f'Recounting {sum(len(c) for _, c in recounts.values())} cohorts with {len(recounts)} distinct criteria')
+
+        batch = []
+        for criteria, cohorts in recounts.values():
+            results = _recount_sids(cohorts[0], criteria)
+            batch += [(cohort, results) for cohort in cohorts]
+            if len(batch) >= app.config['REFRESH_JOB_CHECKPOINT_BATCH_SIZE']:
+                cls._write_recounts(batch, progress)
+                batch = []
+        if batch:
+            cls._write_recounts(batch, progress)
+
+    @classmethod
+    def _write_recounts(cls, batch, progress):
+        rows = [
+            {
+                'id': cohort.id,
+                'sids': results and results['sids'],
+                'student_count': results and results['totalStudentCount'],
+            } for cohort, results in batch
+        ]
+        CohortFilterEvent.track_recounted_membership_changes(rows)
+        db.session.execute(
+            text("""
+                UPDATE cohort_filters
+                SET sids = CASE WHEN r.sids IS NULL THEN NULL ELSE ARRAY(SELECT json_array_elements_text(r.sids)) END,
+                    student_count = r.student_count,
+                    alert_count = NULL
+                FROM json_to_recordset(:rows) AS r(id INTEGER, sids JSON, student_count INTEGER)
+                WHERE cohort_filters.id = r.id
+            """),
+            {'rows': json.dumps(rows)},
+        )
+        cohort_ids = [row['id'] for row in rows]
+        cls.refresh_alert_counts(cohort_ids)
+        for cohort, results in batch:
+            db.session.expire(cohort)
+        if progress:
+            for cohort_id in cohort_ids:
+                progress.mark_done(cohort_id)
+
+    @classmethod
+    def refresh_alert_counts(cls, cohort_ids):
+        # Count, per cohort, the current term's active alerts that the cohort's owner has not dismissed.
+        query = text("""
+            UPDATE cohort_filters
+            SET alert_count = (
+                SELECT COALESCE(sum(alert_counts.alert_count - COALESCE(alert_view_counts.dismissed_count, 0)), 0)
+                FROM alert_counts
+                LEFT JOIN alert_view_counts
+                    ON alert_view_counts.viewer_id = cohort_filters.owner_id
+                    AND alert_view_counts.term_id = alert_counts.term_id
+                    AND alert_view_counts.sid = alert_counts.sid
+                WHERE alert_counts.term_id = :term_id
+                    AND alert_counts.sid = ANY(cohort_filters.sids)
+            )
+            WHERE cohort_filters.id = ANY(:cohort_ids)
+                AND cohort_filters.domain = 'default'
+                AND cohort_filters.sids IS NOT NULL
+        """)
+        db.session.execute(query, {'cohort_ids': cohort_ids, 'term_id': current_term_id()})
+        std_commit()
+
     @classmethod
     def find_by_id(cls, cohort_id, **kwargs):
         cohort = cls.query.filter_by(id=cohort_id).first()
@@ -284,6 +357,7 @@ class CohortFilter(Base):
         order_by=None,
         offset=0,
         limit=50,
+        cursor=None,
         alert_offset=None,
         alert_limit=None,
         include_sids=False,
@@ -299,32 +373,25 @@ class CohortFilter(Base):
             cohort_json.update({
                 'totalStudentCount': self.student_count,
             })
+            if include_sids:
+                cohort_json['sids'] = self.sids
             benchmark('end')
             return cohort_json
 
         benchmark('begin students query')
-        sids_only = not include_students
-
-        if self.domain == 'admitted_students':
-            results = _query_admitted_students(
-                benchmark=benchmark,
-                criteria=cohort_json['criteria'],
-                limit=limit,
-                offset=offset,
-                order_by=order_by,
-                sids_only=sids_only,
-            )
-        else:
-            results = _query_students(
-                benchmark=benchmark,
-                criteria=cohort_json['criteria'],
-                include_profiles=include_profiles,
-                limit=limit,
-                offset=offset,
-                order_by=order_by,
-                owner=self.owner,
-                sids_only=sids_only,
-            )
+        results = self._query_members(
+            benchmark=benchmark,
+            criteria=cohort_json['criteria'],
+            cursor=cursor,
+            include_profiles=include_profiles,
+            include_sids=include_sids or include_alerts_for_user_id is not None,
+            limit=limit,
+            offset=offset,
+            order_by=order_by,
+            sids_only=not include_students,
+        )
+        if results and 'nextCursor' in results:
+            cohort_json['nextCursor'] = results['nextCursor']
 
         if results:
             # Cohort might have tens of thousands of SIDs.
@@ -363,16 +430,99 @@ class CohortFilter(Base):
         benchmark('end')
         return cohort_json
 
+    def _query_members(self, benchmark, criteria, cursor, include_profiles, include_sids, limit, offset, order_by, sids_only):
+        if self.domain == 'admitted_students':
+            return _query_admitted_students(
+                benchmark=benchmark,
+                criteria=criteria,
+                limit=limit,
+                offset=offset,
+                order_by=order_by,
+                sids_only=sids_only,
+            )
+        if self.student_count is None:
+            # Keyset pagination relies on the SIDs and student count stashed in the database, so new or uncounted
+            # cohorts fall back to offset pagination.
+            return _query_students(
+                benchmark=benchmark,
+                criteria=criteria,
+                cursor=None,
+                include_profiles=include_profiles,
+                include_sids=True,
+                limit=limit,
+                offset=offset,
+                order_by=order_by,
+                owner=self.owner,
+                sids_only=sids_only,
+                total_count=None,
+            )
+        # Once SIDs and student count are stashed, the Data Loch is asked for one page of students only.
+        if sids_only:
+            results = {'totalStudentCount': self.student_count}
+        else:
+            results = _query_students(
+                benchmark=benchmark,
+                criteria=criteria,
+                cursor=cursor,
+                include_profiles=include_profiles,
+                include_sids=False,
+                limit=limit,
+                offset=offset,
+                order_by=order_by,
+                owner=self.owner,
+                sids_only=False,
+                total_count=self.student_count,
+            )
+        if results and include_sids:
+            results['sids'] = self.sids
+        return results
+
+
+def _recount_key(cohort, criteria):
+    # The "My Students" filter translates to the owner's own advisor-plan mappings, so it cannot be shared across owners.
+    owner_id = cohort.owner_id if criteria.get('cohortOwnerAcademicPlans') else None
+    return cohort.domain, owner_id, json.dumps(criteria, sort_keys=True)
+
+
+def _recount_sids(cohort, criteria):
+    benchmark = get_benchmarker(f'CohortFilter {cohort.id} recount')
+    if cohort.domain == 'admitted_students':
+        return _query_admitted_students(
+            benchmark=benchmark,
+            criteria=criteria,
+            limit=50,
+            offset=0,
+            order_by=None,
+            sids_only=True,
+        )
+    else:
+        return _query_students(
+            benchmark=benchmark,
+            criteria=criteria,
+            cursor=None,
+            include_profiles=False,
+            include_sids=True,
+            limit=50,
+            offset=0,
+            order_by=None,
+            owner=cohort.owner,
+            sids_only=True,
+            total_count=None,
+        )
+
 
 def _query_students(
         benchmark,
         criteria,
+        cursor,
         include_profiles,
+        include_sids,
         limit,
         offset,
         order_by,
         owner,
         sids_only,
+        total_count,
 ):
     benchmark('begin students query')
     # Translate the "My Students" filter, if present, into queryable criteria.
@@ -399,6 +549,7 @@ def _query_students(
         coe_underrepresented=criteria.get('coeUnderrepresented'),
         colleges=criteria.get('colleges'),
         curated_group_ids=criteria.get('curatedGroupIds'),
+        cursor=cursor,
         entering_terms=criteria.get('enteringTerms'),
         ethnicities=criteria.get('ethnicities'),
         expected_grad_terms=criteria.get('expectedGradTerms'),
@@ -407,6 +558,7 @@ def _query_students(
         group_codes=criteria.get('groupCodes'),
         in_intensive_cohort=criteria.get('inIntensiveCohort'),
         include_profiles=include_profiles,
+        include_sids=include_sids,
         intended_majors=criteria.get('intendedMajors'),
         is_active_asc=None if criteria.get('isInactiveAsc') is None else not criteria.get('isInactiveAsc'),
         is_active_coe=None if criteria.get('isInactiveCoe') is None else not criteria.get('isInactiveCoe'),
@@ -420,6 +572,7 @@ def _query_students(
         offset=offset,
         order_by=order_by,
         sids_only=sids_only,
+        total_count=total_count,
         transfer=criteria.get('transfer'),
         underrepresented=criteria.get('underrepresented'),
         unit_ranges=criteria.get('unitRanges'),
@@ -24,9 +24,10 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 from datetime import datetime
+import json
 
 from boac import db, std_commit
-from sqlalchemy import func
+from sqlalchemy import func, text
 from sqlalchemy.dialects.postgresql import ENUM
 from sqlalchemy.sql import desc
 
@@ -54,16 +55,55 @@ class CohortFilterEvent(db.Model):
         self.event_type = event_type
 
     @classmethod
-    def create_bulk(cls, cohort_filter_id, added_sids=(), removed_sids=()):
-        events = [cls(cohort_filter_id=cohort_filter_id, sid=sid, event_type='added') for sid in added_sids]
-        events.extend([cls(cohort_filter_id=cohort_filter_id, sid=sid, event_type='removed') for sid in removed_sids])
-        db.session.bulk_save_objects(events)
+    def track_membership_changes(cls, cohort_filter_id, old_sids):
+        # Diff previous membership against the sids now stored on the cohort, without loading either set into Python.
+        db.session.execute(
+            text("""
+                WITH old_sids AS (
+                    SELECT unnest(CAST(:old_sids AS VARCHAR[])) AS sid
+                ),
+                new_sids AS (
+                    SELECT unnest(sids) AS sid FROM cohort_filters WHERE id = :cohort_filter_id
+                )
+                INSERT INTO cohort_filter_events (cohort_filter_id, sid, event_type, created_at)
+                SELECT :cohort_filter_id, d.sid, d.event_type::cohort_filter_event_types, :created_at
+                FROM (
+                    (SELECT sid, 'added' AS event_type FROM new_sids EXCEPT SELECT sid, 'added' FROM old_sids)
+                    UNION ALL
+                    (SELECT sid, 'removed' AS event_type FROM old_sids EXCEPT SELECT sid, 'removed' FROM new_sids)
+                ) d
+                ORDER BY d.event_type, d.sid
+            """),
+            {'cohort_filter_id': cohort_filter_id, 'created_at': datetime.now(), 'old_sids': list(old_sids or [])},
+        )
+        std_commit()
+
+    @classmethod
+    def track_recounted_membership_changes(cls, rows):
+        # Each row is a dict with the id of a cohort and its recounted sids, if any. Diff against the sids stored on the
+        # cohort, so call before the recount is written.
+        db.session.execute(
+            text("""
+                INSERT INTO cohort_filter_events (cohort_filter_id, sid, event_type, created_at)
+                SELECT c.id, d.sid, d.event_type::cohort_filter_event_types, :created_at
+                FROM json_to_recordset(:rows) AS r(id INTEGER, sids JSON)
+                JOIN cohort_filters c ON c.id = r.id AND c.domain = 'default'
+                CROSS JOIN LATERAL (
+                    (SELECT json_array_elements_text(r.sids) AS sid, 'added' AS event_type EXCEPT SELECT unnest(c.sids), 'added')
+                    UNION ALL
+                    (SELECT unnest(c.sids) AS sid, 'removed' AS event_type EXCEPT SELECT json_array_elements_text(r.sids), 'removed')
+                ) d
+                WHERE r.sids IS NOT NULL
+                ORDER BY c.id, d.event_type, d.sid
+            """),
+            {'created_at': datetime.now(), 'rows': json.dumps(rows)},
+        )
         std_commit()
 
     @classmethod
     def events_for_cohort(cls, cohort_filter_id, offset=0, limit=50):
         count = db.session.query(func.count(cls.id)).filter_by(cohort_filter_id=cohort_filter_id).scalar()
-        events = cls.query.filter_by(cohort_filter_id=cohort_filter_id).order_by(desc(cls.created_at)).offset(offset).limit(limit).all()
+        events = cls.query.filter_by(cohort_filter_id=cohort_filter_id).order_by(desc(cls.created_at), desc(cls.id)).offset(offset).limit(limit).all()
         return {
             'count': count,
             'events': events,
@@ -86,9 +86,10 @@ class JobProgress:
             app.logger.error(f'Progress record {progress} not ready to append step {step_description} to {self.key()}')
             return False
         progress.update(properties)
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        step = f'{now} : {step_description}'
-        progress['steps'].append(step)
+        # Without a description, only properties are updated.
+        if step_description:
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            progress['steps'].append(f'{now} : {step_description}')
         update_jsonb_row(row)
         return progress
 
@@ -24,7 +24,10 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 
+from collections import OrderedDict
+import json
 import threading
+import time
 
 from boac import db, std_commit
 from boac.lib.berkeley import term_name_for_sis_id
@@ -32,6 +35,7 @@ from boac.lib.util import get_args_dict
 from boac.models.base import Base
 from decorator import decorator
 from flask import current_app as app
+from sqlalchemy import event
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm.attributes import flag_modified
@@ -54,10 +58,99 @@ class JsonCache(Base):
         return f'<JsonCache {self.key}, json={self.json}>'
 
 
+class L1Entry:
+    __slots__ = ['expires_at', 'size', 'value']
+
+    def __init__(self, value, expires_at):
+        self.expires_at = expires_at
+        self.size = len(value)
+        self.value = value
+
+
+class L1Cache:
+    """Bounded, TTL'd, in-process LRU tier in front of the json_cache table.
+
+    Entries hold serialized JSON, so that callers who modify a returned feed cannot modify the cached copy. A
+    generation counter, advanced by clear() and again when its delete commits, keeps a lookup that started before
+    either from caching what it found.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.total_size = 0
+
+    def discard(self, key):
+        with self.lock:
+            self._pop(key)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                self._pop(key)
+                return None
+            self.entries.move_to_end(key)
+            value = entry.value
+        return json.loads(value)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+            self.total_size = 0
+
+    def put(self, key, value, generation):
+        entry = L1Entry(json.dumps(value), expires_at=time.monotonic() + app.config['JSON_CACHE_L1_TTL'])
+        max_entries = app.config['JSON_CACHE_L1_MAX_ENTRIES']
+        max_size = app.config['JSON_CACHE_L1_MAX_SIZE']
+        if entry.size > max_size:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self._pop(key)
+            self.entries[key] = entry
+            self.total_size += entry.size
+            while len(self.entries) > max_entries or self.total_size > max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_size -= evicted.size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'generation': self.generation,
+                'size': self.total_size,
+            }
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_size -= entry.size
+
+
+l1_cache = L1Cache()
+
+
 def clear(key_like):
+    l1_cache.invalidate()
     matches = db.session.query(JsonCache).filter(JsonCache.key.like(key_like))
     app.logger.info(f'Will delete {matches.count()} entries matching {key_like}')
     matches.delete(synchronize_session=False)
+    # Until the delete commits, lookups in other sessions still find the rows, and may cache them in L1 again.
+    session = db.session()
+    if not session.info.get('json_cache_l1_stale'):
+        session.info['json_cache_l1_stale'] = True
+        event.listen(session, 'after_commit', _invalidate_l1_after_commit, once=True)
+
+
+def _invalidate_l1_after_commit(session):
+    session.info.pop('json_cache_l1_stale', None)
+    l1_cache.invalidate()
 
 
 def stow(key_pattern, for_term=False):
@@ -73,10 +166,18 @@ def stow(key_pattern, for_term=False):
         if for_term:
             term_name = term_name_for_sis_id(args_dict.get('term_id'))
             key = f'term_{term_name}-{key}'
+        l1_enabled = app.config['JSON_CACHE_L1_ENABLED']
+        if l1_enabled:
+            cached = l1_cache.get(key)
+            if cached is not None:
+                return cached
+            generation = l1_cache.generation
         stowed = JsonCache.query.filter_by(key=key).first()
         # Note that the query returns a DB row rather than the value of the JSON column.
         if stowed is not None:
             app.logger.debug(f'Returning stowed JSON for key {key}')
+            if l1_enabled:
+                l1_cache.put(key, stowed.json, generation)
             return stowed.json
         else:
             app.logger.info(f'{key} not found in runtime DB')
@@ -84,6 +185,8 @@ def stow(key_pattern, for_term=False):
             if to_stow is not None:
                 app.logger.debug(f'Will stow JSON for key {key}')
                 insert_row(key=key, json=to_stow)
+                if l1_enabled:
+                    l1_cache.put(key, to_stow, generation)
             else:
                 app.logger.info(f'{key} not generated and will not be stowed in DB')
             return to_stow
@@ -107,6 +210,7 @@ def fetch_bulk(keys):
 
 def insert_row(key, json):
     """Insert new cache row with conflict checks."""
+    l1_cache.discard(key)
     row = JsonCache(key=key, json=json)
     try:
         db.session.add(row)
@@ -118,8 +222,20 @@ def insert_row(key, json):
             return stowed.json
 
 
+def stage_row(key, value):
+    """Add a cache row to the current transaction, to be committed with it, unless the key is already stowed."""
+    l1_cache.discard(key)
+    db.session.execute(
+        text("""INSERT INTO json_cache (key, json, created_at, updated_at)
+            VALUES (:key, CAST(:json AS JSONB), now(), now())
+            ON CONFLICT (key) DO NOTHING"""),
+        {'key': key, 'json': json.dumps(value)},
+    )
+
+
 def update_jsonb_row(stowed):
     """Jump through some hoops to commit changes to a JSONB column."""
+    l1_cache.discard(stowed.key)
     flag_modified(stowed, 'json')
     db.session.merge(stowed)
     std_commit()
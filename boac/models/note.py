@@ -27,7 +27,8 @@ import json
 import time
 
 from boac import db, std_commit
-from boac.lib.util import put_attachment_to_s3, titleize, utc_now, vacuum_whitespace
+from boac.lib import search_index
+from boac.lib.util import keyset_filter, put_attachment_to_s3, titleize, utc_now, vacuum_whitespace
 from boac.models.authorized_user import AuthorizedUser
 from boac.models.base import Base
 from boac.models.note_attachment import NoteAttachment
@@ -149,7 +150,8 @@ class Note(Base):
         return ids_by_sid
 
     @classmethod
-    def search(cls, search_phrase, author_uid, student_csid, topic, datetime_from, datetime_to):
+    def search(cls, search_phrase, author_uid, student_csid, topic, datetime_from, datetime_to, after=None, limit=None):
+        """Return matching notes, with their rank, ordered by rank and id. Pass the (rank, id) of a previous result as after."""
         if search_phrase:
             fts_selector = """SELECT id, ts_rank(fts_index, plainto_tsquery('english', :search_phrase)) AS rank
                 FROM notes_fts_index
@@ -186,15 +188,19 @@ class Note(Base):
         else:
             topic_join = ''
 
+        after_filter = keyset_filter('fts.rank', 'notes.id', after, params)
+        limit_clause = f'LIMIT {int(limit)}' if limit else ''
         query = text(f"""
-            SELECT notes.* FROM ({fts_selector}) AS fts
+            SELECT notes.*, fts.rank FROM ({fts_selector}) AS fts
             JOIN notes
                 ON fts.id = notes.id
                 {author_filter}
                 {student_filter}
                 {date_filter}
             {topic_join}
+            WHERE {after_filter}
             ORDER BY fts.rank DESC, notes.id
+            {limit_clause}
         """).bindparams(**params)
         result = db.session.execute(query)
         keys = result.keys()
@@ -202,9 +208,8 @@ class Note(Base):
 
     @classmethod
     def refresh_search_index(cls):
-        db.session.execute(text('REFRESH MATERIALIZED VIEW notes_fts_index'))
-        db.session.execute(text('REFRESH MATERIALIZED VIEW advisor_author_index'))
         std_commit()
+        search_index.request_refresh(search_index.NOTE_SEARCH_INDEXES)
 
     @classmethod
     def update(cls, note_id, subject, body=None, topics=()):
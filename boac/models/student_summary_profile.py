@@ -0,0 +1,71 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from datetime import datetime
+
+from boac import db, std_commit
+import simplejson as json
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class StudentSummaryProfile(db.Model):
+    __tablename__ = 'student_summary_profiles'
+
+    sid = db.Column(db.String(80), nullable=False, primary_key=True)
+    term_id = db.Column(db.String(4), nullable=False, primary_key=True)
+    profile = db.Column(JSONB, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __init__(self, sid, term_id, profile):
+        self.sid = sid
+        self.term_id = term_id
+        self.profile = profile
+
+    @classmethod
+    def get_profiles_by_sid(cls, sids, term_id):
+        query = text('SELECT sid, profile FROM student_summary_profiles WHERE term_id = :term_id AND sid = ANY(:sids)')
+        results = db.session.execute(query, {'sids': sids, 'term_id': term_id})
+        return {row['sid']: row['profile'] for row in results}
+
+    @classmethod
+    def upsert(cls, term_id, profiles, created_at):
+        query = text("""
+            INSERT INTO student_summary_profiles (sid, term_id, profile, created_at)
+            SELECT p.sid, :term_id, p.profile, :created_at
+            FROM json_to_recordset(:profiles) AS p(sid VARCHAR, profile JSONB)
+            ON CONFLICT (sid, term_id) DO UPDATE
+                SET profile = EXCLUDED.profile, created_at = EXCLUDED.created_at
+        """)
+        # Term GPAs arrive from the loch as Decimal, which simplejson serializes as numbers.
+        rows = [{'sid': profile['sid'], 'profile': profile} for profile in profiles]
+        db.session.execute(query, {'created_at': created_at, 'profiles': json.dumps(rows), 'term_id': term_id})
+        std_commit()
+
+    @classmethod
+    def delete_stale(cls, term_id, refreshed_at):
+        query = text('DELETE FROM student_summary_profiles WHERE term_id = :term_id AND created_at < :refreshed_at')
+        db.session.execute(query, {'refreshed_at': refreshed_at, 'term_id': term_id})
+        std_commit()
@@ -26,7 +26,7 @@ ENHANCEMENTS, OR MODIFICATIONS.
 import datetime
 
 from boac.merged.user_session import UserSession
-from flask import jsonify, make_response, redirect, request, session
+from flask import g, jsonify, make_response, redirect, request, session
 from flask_login import LoginManager
 
 
@@ -87,6 +87,11 @@ def register_routes(app):
         app.permanent_session_lifetime = datetime.timedelta(minutes=app.config['INACTIVE_SESSION_LIFETIME'])
         session.modified = True
 
+    @app.teardown_request
+    def teardown_request(exception=None):
+        # Term metadata is resolved at most once per request.
+        g.pop('term_context', None)
+
     @app.after_request
     def after_api_request(response):
         if app.config['BOAC_ENV'] == 'development':
@@ -76,6 +76,7 @@ ALTER TABLE IF EXISTS ONLY public.user_logins DROP CONSTRAINT IF EXISTS user_log
 --
 
 DROP INDEX IF EXISTS public.idx_appointments_fts_index;
+DROP INDEX IF EXISTS public.idx_appointments_fts_index_id;
 DROP INDEX IF EXISTS public.appointment_availability_authorized_user_id_dept_code_idx;
 DROP INDEX IF EXISTS public.appointment_availability_weekday_idx;
 DROP INDEX IF EXISTS public.appointment_availability_date_override_idx;
@@ -91,13 +92,16 @@ DROP INDEX IF EXISTS public.appointments_read_viewer_id_idx;
 DROP INDEX IF EXISTS public.alert_views_alert_id_idx;
 DROP INDEX IF EXISTS public.alert_views_viewer_id_idx;
 DROP INDEX IF EXISTS public.alerts_sid_idx;
+DROP INDEX IF EXISTS public.alerts_term_id_sid_idx;
 DROP INDEX IF EXISTS public.cohort_filters_owner_id_idx;
 DROP INDEX IF EXISTS public.cohort_filter_events_cohort_filter_id_idx;
 DROP INDEX IF EXISTS public.cohort_filter_events_sid_idx;
 DROP INDEX IF EXISTS public.cohort_filter_events_event_type_idx;
 DROP INDEX IF EXISTS public.cohort_filter_events_created_at_idx;
 DROP INDEX IF EXISTS public.idx_advisor_author_index;
+DROP INDEX IF EXISTS public.idx_advisor_author_index_name_uid;
 DROP INDEX IF EXISTS public.idx_notes_fts_index;
+DROP INDEX IF EXISTS public.idx_notes_fts_index_id;
 DROP INDEX IF EXISTS public.note_attachments_note_id_idx;
 DROP INDEX IF EXISTS public.note_template_attachments_note_template_id_idx;
 DROP INDEX IF EXISTS public.note_template_topics_note_template_id_idx;
@@ -115,6 +119,8 @@ DROP INDEX IF EXISTS public.user_logins_uid_idx;
 --
 
 ALTER TABLE IF EXISTS ONLY public.alembic_version DROP CONSTRAINT IF EXISTS alembic_version_pkc;
+ALTER TABLE IF EXISTS ONLY public.alert_counts DROP CONSTRAINT IF EXISTS alert_counts_pkey;
+ALTER TABLE IF EXISTS ONLY public.alert_view_counts DROP CONSTRAINT IF EXISTS alert_view_counts_pkey;
 ALTER TABLE IF EXISTS ONLY public.alert_views DROP CONSTRAINT IF EXISTS alert_views_pkey;
 ALTER TABLE IF EXISTS ONLY public.alerts DROP CONSTRAINT IF EXISTS alerts_pkey;
 ALTER TABLE IF EXISTS ONLY public.alerts DROP CONSTRAINT IF EXISTS alerts_sid_alert_type_key_unique_constraint;
@@ -193,6 +199,8 @@ DROP SEQUENCE IF EXISTS public.appointments_id_seq;
 DROP TABLE IF EXISTS public.appointments_read;
 DROP SEQUENCE IF EXISTS public.alerts_id_seq;
 DROP TABLE IF EXISTS public.alerts;
+DROP TABLE IF EXISTS public.alert_counts;
+DROP TABLE IF EXISTS public.alert_view_counts;
 DROP TABLE IF EXISTS public.alert_views;
 DROP TABLE IF EXISTS public.alembic_version;
 DROP TABLE IF EXISTS public.same_day_advisors;
@@ -200,6 +208,7 @@ DROP TABLE IF EXISTS public.schedulers;
 DROP TABLE IF EXISTS public.student_group_members;
 DROP TABLE IF EXISTS public.student_groups;
 DROP SEQUENCE IF EXISTS public.student_groups_id_seq;
+DROP TABLE IF EXISTS public.student_summary_profiles;
 DROP TABLE IF EXISTS public.tool_settings;
 DROP SEQUENCE IF EXISTS public.tool_settings_id_seq;
 DROP TABLE IF EXISTS public.topics;
@@ -0,0 +1,39 @@
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS alert_counts (
+    sid character varying(80) NOT NULL,
+    term_id character varying(4) NOT NULL,
+    alert_count integer NOT NULL
+);
+ALTER TABLE alert_counts OWNER TO boac;
+ALTER TABLE ONLY alert_counts
+    ADD CONSTRAINT alert_counts_pkey PRIMARY KEY (term_id, sid);
+
+--
+
+CREATE TABLE IF NOT EXISTS alert_view_counts (
+    viewer_id integer NOT NULL,
+    sid character varying(80) NOT NULL,
+    term_id character varying(4) NOT NULL,
+    dismissed_count integer NOT NULL
+);
+ALTER TABLE alert_view_counts OWNER TO boac;
+ALTER TABLE ONLY alert_view_counts
+    ADD CONSTRAINT alert_view_counts_pkey PRIMARY KEY (viewer_id, term_id, sid);
+
+--
+
+INSERT INTO alert_counts (sid, term_id, alert_count)
+    SELECT sid, substring(key from '^(\d{4})_') AS term_id, count(*)
+    FROM alerts
+    WHERE active IS TRUE AND key ~ '^\d{4}_'
+    GROUP BY 1, 2;
+
+INSERT INTO alert_view_counts (viewer_id, sid, term_id, dismissed_count)
+    SELECT alert_views.viewer_id, alerts.sid, substring(alerts.key from '^(\d{4})_') AS term_id, count(*)
+    FROM alerts
+    JOIN alert_views ON alert_views.alert_id = alerts.id AND alert_views.dismissed_at IS NOT NULL
+    WHERE alerts.active IS TRUE AND alerts.key ~ '^\d{4}_'
+    GROUP BY 1, 2, 3;
+
+COMMIT;
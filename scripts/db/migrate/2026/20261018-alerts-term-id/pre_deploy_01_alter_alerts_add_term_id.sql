@@ -0,0 +1,9 @@
+BEGIN;
+
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS term_id VARCHAR(4);
+
+UPDATE alerts SET term_id = substring(key from '^(\d{4})_') WHERE term_id IS NULL AND key ~ '^\d{4}_';
+
+CREATE INDEX IF NOT EXISTS alerts_term_id_sid_idx ON alerts USING btree (term_id, sid) WHERE active IS TRUE;
+
+COMMIT;
@@ -0,0 +1,8 @@
+BEGIN;
+
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY requires a unique index on each view.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_fts_index_id ON appointments_fts_index (id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_fts_index_id ON notes_fts_index (id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_advisor_author_index_name_uid ON advisor_author_index (advisor_name, advisor_uid);
+
+COMMIT;
@@ -0,0 +1,13 @@
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS student_summary_profiles (
+  sid VARCHAR(80) NOT NULL,
+  term_id VARCHAR(4) NOT NULL,
+  profile JSONB NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+ALTER TABLE student_summary_profiles OWNER TO boac;
+ALTER TABLE ONLY student_summary_profiles
+    ADD CONSTRAINT student_summary_profiles_pkey PRIMARY KEY (sid, term_id);
+
+COMMIT;
@@ -40,6 +40,29 @@ SET default_with_oids = false;
 
 --
 
+CREATE TABLE alert_counts (
+    sid character varying(80) NOT NULL,
+    term_id character varying(4) NOT NULL,
+    alert_count integer NOT NULL
+);
+ALTER TABLE alert_counts OWNER TO boac;
+ALTER TABLE ONLY alert_counts
+    ADD CONSTRAINT alert_counts_pkey PRIMARY KEY (term_id, sid);
+
+--
+
+CREATE TABLE alert_view_counts (
+    viewer_id integer NOT NULL,
+    sid character varying(80) NOT NULL,
+    term_id character varying(4) NOT NULL,
+    dismissed_count integer NOT NULL
+);
+ALTER TABLE alert_view_counts OWNER TO boac;
+ALTER TABLE ONLY alert_view_counts
+    ADD CONSTRAINT alert_view_counts_pkey PRIMARY KEY (viewer_id, term_id, sid);
+
+--
+
 CREATE TABLE alert_views (
     alert_id integer NOT NULL,
     viewer_id integer NOT NULL,
@@ -59,6 +82,7 @@ CREATE TABLE alerts (
     sid character varying(80) NOT NULL,
     alert_type character varying(80) NOT NULL,
     key character varying(255) NOT NULL,
+    term_id character varying(4),
     message text NOT NULL,
     active boolean DEFAULT true NOT NULL,
     created_at timestamp with time zone NOT NULL,
@@ -79,6 +103,7 @@ ALTER TABLE ONLY alerts
 ALTER TABLE ONLY alerts
     ADD CONSTRAINT alerts_sid_alert_type_key_created_at_unique_constraint UNIQUE (sid, alert_type, key, created_at);
 CREATE INDEX alerts_sid_idx ON alerts USING btree (sid);
+CREATE INDEX alerts_term_id_sid_idx ON alerts USING btree (term_id, sid) WHERE active IS TRUE;
 
 --
 
@@ -235,6 +260,8 @@ CREATE INDEX idx_appointments_fts_index
 ON appointments_fts_index
 USING gin(fts_index);
 
+CREATE UNIQUE INDEX idx_appointments_fts_index_id ON appointments_fts_index (id);
+
 --
 
 CREATE TABLE appointments_read (
@@ -421,6 +448,8 @@ CREATE INDEX idx_notes_fts_index
 ON notes_fts_index
 USING gin(fts_index);
 
+CREATE UNIQUE INDEX idx_notes_fts_index_id ON notes_fts_index (id);
+
 --
 
 CREATE MATERIALIZED VIEW advisor_author_index AS (
@@ -435,6 +464,7 @@ CREATE MATERIALIZED VIEW advisor_author_index AS (
 );
 
 CREATE INDEX idx_advisor_author_index ON advisor_author_index USING btree(advisor_name);
+CREATE UNIQUE INDEX idx_advisor_author_index_name_uid ON advisor_author_index (advisor_name, advisor_uid);
 
 --
 
@@ -630,6 +660,18 @@ CREATE INDEX student_group_members_sid_idx ON student_group_members USING btree
 
 --
 
+CREATE TABLE student_summary_profiles (
+  sid VARCHAR(80) NOT NULL,
+  term_id VARCHAR(4) NOT NULL,
+  profile JSONB NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+ALTER TABLE student_summary_profiles OWNER TO boac;
+ALTER TABLE ONLY student_summary_profiles
+    ADD CONSTRAINT student_summary_profiles_pkey PRIMARY KEY (sid, term_id);
+
+--
+
 CREATE TABLE topics (
   id INTEGER NOT NULL,
   topic VARCHAR(50) NOT NULL,
@@ -120,3 +120,25 @@ class TestGetManuallyAddedAdvisees:
         with override_config(app, 'API_KEY', 'dongle'):
             headers = {'app_key': 'widget'}
             self._api_get_all(client=client, headers=headers, expected_status_code=401)
+
+
+class TestGetSearchIndexStatus:
+
+    def test_not_an_admin(self, client, asc_advisor_session):
+        """Return 401 for normal users."""
+        response = client.get('/api/admin/search_index')
+        assert response.status_code == 401
+
+    def test_admin(self, client, admin_session):
+        """Reports refresh state and lag per search index."""
+        from boac.lib import search_index
+        import time
+        search_index.index_states.clear()
+        state = search_index._get_state('notes_fts_index')
+        state['requestedAt'] = time.time()
+        state['staleSince'] = state['requestedAt'] - 1
+        response = client.get('/api/admin/search_index')
+        assert response.status_code == 200
+        assert response.json['notes_fts_index']['lagSeconds'] >= 1
+        assert response.json['notes_fts_index']['refreshCount'] == 0
+        search_index.index_states.clear()
@@ -24,15 +24,19 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 import datetime
+from threading import Barrier
+import time
 
 from boac import std_commit
 from boac.models.alert import Alert
 from boac.models.authorized_user import AuthorizedUser
 from boac.models.curated_group import CuratedGroup, CuratedGroupStudent
+from boac.models.job_progress import JobProgress
 from boac.models.university_dept import UniversityDept
 from boac.models.university_dept_member import UniversityDeptMember
 import pytest
 from tests.test_api.api_test_utils import all_cohorts_owned_by
+from tests.util import override_config
 
 
 coe_advisor_uid = '1022796'
@@ -86,6 +90,108 @@ class TestCacheUtils:
             assert cohort['alertCount'] >= 0
 
 
+@pytest.mark.usefixtures('db_session')
+class TestRefreshStages:
+    """Cache refresh job stages."""
+
+    def test_runs_stages_in_dependency_order(self):
+        from boac.api.cache_utils import RefreshStage, run_refresh_stages
+        JobProgress().start()
+        log = []
+        stages = [
+            RefreshStage('c', lambda progress: log.append('c'), depends_on=['b']),
+            RefreshStage('b', lambda progress: log.append('b'), depends_on=['a']),
+            RefreshStage('a', lambda progress: log.append('a')),
+        ]
+        assert run_refresh_stages(stages) == []
+        assert log == ['a', 'b', 'c']
+        stage_states = JobProgress().get()['stages']
+        for name in ['a', 'b', 'c']:
+            assert stage_states[name]['status'] == 'done'
+            assert stage_states[name]['duration'] >= 0
+            assert stage_states[name]['start'] and stage_states[name]['end']
+
+    def test_continuation_resumes_failed_stage(self, app):
+        from boac.api.cache_utils import RefreshStage, run_refresh_stages
+        JobProgress().start()
+        log = []
+        fail = [True]
+
+        def _items(progress):
+            for item_id in range(1, 6):
+                if item_id in progress.done:
+                    continue
+                if item_id == 4 and fail[0]:
+                    raise ValueError('Loch hiccup')
+                log.append(item_id)
+                progress.mark_done(item_id)
+
+        stages = [
+            RefreshStage('independent', lambda progress: log.append('independent')),
+            RefreshStage('items', _items),
+            RefreshStage('dependent', lambda progress: log.append('dependent'), depends_on=['items']),
+        ]
+        with override_config(app, 'REFRESH_JOB_CHECKPOINT_BATCH_SIZE', 2):
+            assert sorted(run_refresh_stages(stages)) == ['dependent', 'items']
+            stage_states = JobProgress().get()['stages']
+            assert stage_states['items']['status'] == 'failed'
+            assert stage_states['items']['error'] == 'Loch hiccup'
+            assert stage_states['items']['doneItems'] == [1, 2, 3]
+            assert stage_states['dependent']['status'] == 'pending'
+
+            fail[0] = False
+            log.clear()
+            assert run_refresh_stages(stages, continuation=True) == []
+        assert log == [4, 5, 'dependent']
+        assert JobProgress().get()['stages']['items']['doneItems'] == [1, 2, 3, 4, 5]
+
+    def test_refresh_stages(self):
+        from boac.api.cache_utils import refresh_stages
+        stages = {stage.name: stage for stage in refresh_stages(['2178', '2175'])}
+        assert set(stages.keys()) == {
+            'alerts_2175',
+            'alerts_2178',
+            'calnet_attributes',
+            'curated_group_lists',
+            'department_memberships',
+            'filtered_cohort_counts',
+            'summary_profiles',
+        }
+        assert stages['calnet_attributes'].depends_on == ['department_memberships']
+        assert stages['filtered_cohort_counts'].depends_on == ['alerts_2178', 'department_memberships', 'calnet_attributes']
+        assert stages['curated_group_lists'].depends_on == ['department_memberships', 'calnet_attributes']
+        assert [stage.name for stage in refresh_stages(['2175'])] == ['alerts_2175']
+
+    def test_saves_checkpoints_without_steps(self, app):
+        from boac.api.cache_utils import RefreshStage, run_refresh_stages
+        JobProgress().start()
+
+        def _items(progress):
+            for item_id in range(1, 5):
+                progress.mark_done(item_id)
+                if item_id == 2:
+                    progress.flush()
+                    time.sleep(1.5)
+
+        stages = [RefreshStage('items', _items)]
+        with override_config(app, 'REFRESH_JOB_MAX_WORKERS', 2), override_config(app, 'REFRESH_JOB_CHECKPOINT_INTERVAL', 0):
+            assert run_refresh_stages(stages) == []
+        progress = JobProgress().get()
+        assert progress['stages']['items']['doneItems'] == [1, 2, 3, 4]
+        assert [step.split(' : ')[1] for step in progress['steps']] == ['Stage items started', 'Stage items done']
+
+    def test_runs_independent_stages_concurrently(self, app):
+        from boac.api.cache_utils import RefreshStage, run_refresh_stages
+        JobProgress().start()
+        barrier = Barrier(2, timeout=10)
+        stages = [
+            RefreshStage('one', lambda progress: barrier.wait()),
+            RefreshStage('two', lambda progress: barrier.wait()),
+        ]
+        with override_config(app, 'REFRESH_JOB_MAX_WORKERS', 2):
+            assert run_refresh_stages(stages) == []
+
+
 class TestRefreshCalnetAttributes:
     def test_removes_and_restores(self, app):
         from boac.api.cache_utils import refresh_calnet_attributes
@@ -381,6 +381,21 @@ class TestCohortById:
         # Verify that a different offset results in a different member
         assert data_0['students'][0]['uid'] != data_1['students'][0]['uid']
 
+    def test_cursor(self, asc_advisor_login, asc_owned_cohort, client):
+        """Pages through cohort members by cursor."""
+        api_path = f'/api/cohort/{asc_owned_cohort["id"]}'
+        expected = json.loads(client.get(f'{api_path}?orderBy=gpa').data)
+        response = client.get(f'{api_path}?orderBy=gpa&limit=3&cursor=')
+        assert response.status_code == 200
+        page_1 = json.loads(response.data)
+        assert page_1['totalStudentCount'] == 4
+        assert len(page_1['students']) == 3
+        assert 'alerts' in page_1
+        page_2 = json.loads(client.get(f'{api_path}?orderBy=gpa&limit=3&cursor={page_1["nextCursor"]}').data)
+        assert page_2['nextCursor'] is None
+        assert [s['sid'] for s in page_1['students'] + page_2['students']] == [s['sid'] for s in expected['students']]
+        assert client.get(f'{api_path}?cursor=bogus').status_code == 400
+
     def test_unauthorized_request_for_athletic_study_center_data(self, client, fake_auth):
         """In order to access intensive_cohort, inactive status, etc. the user must be either ASC or Admin."""
         fake_auth.login('1133399')
@@ -26,6 +26,7 @@ ENHANCEMENTS, OR MODIFICATIONS.
 from boac import std_commit
 from boac.externals import data_loch
 from boac.lib import util
+from boac.merged.advisor_directory import advisor_directory
 from boac.models.appointment import Appointment
 from boac.models.authorized_user import AuthorizedUser
 from boac.models.manually_added_advisee import ManuallyAddedAdvisee
@@ -976,6 +977,19 @@ class TestFindAdvisorsByName:
         labels = set([s['label'] for s in response])
         assert labels == {'John Deleted-in-BOA', 'Joni Mitchell', 'Joni Mitchell CC', 'Robert Johnson'}
 
+    @pytest.mark.parametrize('query', ['Vis', 'Jo', 'joni mitch', 'Chris'])
+    def test_find_advisors_by_name_in_directory(self, app, client, coe_advisor, mock_advising_note, query):
+        """Finds the same matches in the advisor directory as in the database."""
+        expected = self._api_search_advisors(client, query)
+        with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', True):
+            advisor_directory.rebuild()
+            try:
+                response = self._api_search_advisors(client, query)
+            finally:
+                advisor_directory.clear()
+        assert expected
+        assert sorted(response, key=lambda a: a['uid']) == sorted(expected, key=lambda a: a['uid'])
+
 
 def _api_search(
         client,
@@ -25,6 +25,7 @@ ENHANCEMENTS, OR MODIFICATIONS.
 
 from boac import std_commit
 from boac.merged import calnet
+from boac.merged.advisor_directory import advisor_directory
 from boac.models.appointment import Appointment
 from boac.models.authorized_user import AuthorizedUser
 from boac.models.json_cache import insert_row as insert_in_json_cache
@@ -629,6 +630,21 @@ class TestUserSearch:
         assert len(api_json) == 1
         assert api_json[0]['uid'] == calnet_users[0]['uid']
 
+    def test_user_search_in_advisor_directory(self, client, fake_auth):
+        """Finds the same users by UID and by name in the advisor directory as in the database and CalNet."""
+        fake_auth.login(admin_uid)
+        calnet_users = list(calnet.get_calnet_users_for_uids(app, ['1081940']).values())
+        snippets = ['339', '3333', f"{calnet_users[0]['firstName'][:2]} {calnet_users[0]['lastName'][:3]}"]
+        expected = [self._api_users_autocomplete(client, snippet) for snippet in snippets]
+        with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', True):
+            advisor_directory.rebuild()
+            try:
+                for snippet, expected_json in zip(snippets, expected):
+                    api_json = self._api_users_autocomplete(client, snippet)
+                    assert sorted(u['uid'] for u in api_json) == sorted(u['uid'] for u in expected_json)
+            finally:
+                advisor_directory.clear()
+
 
 class TestDemoMode:
 
@@ -0,0 +1,76 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from boac.externals import calnet
+from ldap3.core.exceptions import LDAPSessionTerminatedByServerError
+from tests.util import override_config
+
+
+class TestCalnet:
+
+    def test_pooled_connections(self, app, monkeypatch):
+        """Reuses an idle connection across searches."""
+        calnet.clear_connection_pools()
+        connections = []
+        connect = calnet.MockClient.connect
+
+        def _counting_connect(self):
+            connections.append(connect(self))
+            return connections[-1]
+        monkeypatch.setattr(calnet.MockClient, 'connect', _counting_connect)
+
+        assert calnet.client(app).search_uids(['1133399'])[0]['uid'] == '1133399'
+        assert calnet.client(app).search_csids(['800700600'])[0]['uid'] == '1133399'
+        assert len(connections) == 1
+
+        # Connections idle past the timeout are replaced.
+        with override_config(app, 'LDAP_POOL_IDLE_TIMEOUT', 0):
+            calnet.clear_connection_pools()
+            calnet.client(app).search_uids(['1133399'])
+            calnet.client(app).search_uids(['1133399'])
+        assert len(connections) == 3
+        calnet.clear_connection_pools()
+
+    def test_reconnect(self, app, monkeypatch):
+        """Retries a search on a new connection when the pooled one was dropped by the server."""
+        calnet.clear_connection_pools()
+        calnet.client(app).search_uids(['1133399'])
+        pool = calnet._get_connection_pool(calnet.client(app))
+        stale_conn, last_used = pool.idle.queue[-1]
+
+        def _terminated(*args, **kwargs):
+            raise LDAPSessionTerminatedByServerError('session terminated by server')
+        monkeypatch.setattr(stale_conn, 'search', _terminated)
+        assert calnet.client(app).search_uids(['1133399'])[0]['uid'] == '1133399'
+        assert stale_conn not in [conn for conn, last_used in pool.idle.queue]
+        calnet.clear_connection_pools()
+
+    def test_combined_search(self, app):
+        """Searches active and expired people in a single filter."""
+        search_filter = calnet.Client._ldap_search_filter(['1133399'], 'uid', include_expired=True)
+        assert '(ou=people) (ou=advcon people) (ou=expired people)' in search_filter
+        persons = calnet.client(app).search_uids(['1133399'], include_expired=True)
+        assert len(persons) == 1
+        assert persons[0]['expired'] is False
@@ -25,10 +25,14 @@ ENHANCEMENTS, OR MODIFICATIONS.
 
 from decimal import Decimal
 import io
+import json
+from threading import Event
 
 from boac.externals import data_loch
 from boac.lib.mockingdata import MockRows, register_mock
 import pytest
+import sqlalchemy
+from tests.util import override_config
 
 
 @pytest.mark.usefixtures('db_session')
@@ -49,6 +53,138 @@ class TestDataLoch:
         assert advisors_by_uid['211159'] == [{'uid': '211159', 'can_access_advising_data': True, 'can_access_canvas_data': True}]
         assert advisors_by_uid['1022796'] == [{'uid': '1022796', 'can_access_advising_data': False, 'can_access_canvas_data': False}]
 
+    def test_pooled_engine(self, app):
+        """Builds a single engine with the configured pool."""
+        engine = data_loch.get_data_loch_db_rds()
+        assert engine is data_loch.get_data_loch_db_rds()
+        assert engine.pool.size() == app.config['DATA_LOCH_RDS_POOL_SIZE']
+        assert engine.pool._pre_ping is app.config['DATA_LOCH_RDS_POOL_PRE_PING']
+
+    def test_query_stats_per_call_site(self):
+        """Records query count, row count and timing under the name of the calling function."""
+        data_loch.reset_query_stats()
+        data_loch.get_term_gpas(['11667051'])
+        data_loch.get_term_gpas(['11667051'])
+        stats = data_loch.get_query_stats()
+        assert stats['pool']
+        assert list(stats['queries'].keys()) == ['get_term_gpas']
+        term_gpa_stats = stats['queries']['get_term_gpas']
+        assert term_gpa_stats['count'] == 2
+        assert term_gpa_stats['errors'] == 0
+        assert term_gpa_stats['rows'] == 8
+        assert term_gpa_stats['maxTime'] > 0
+        assert term_gpa_stats['meanTime'] <= term_gpa_stats['maxTime']
+
+    def test_query_shapes(self):
+        """Catalogs statements by joined tables and filter clauses, regardless of embedded literals."""
+        data_loch.reset_query_stats()
+        for gpa_ranges, genders in [([{'min': 0, 'max': 2}], None), ([{'min': 3, 'max': 4}], None), ([{'min': 0, 'max': 4}], ['Female'])]:
+            query_tables, query_filter, query_bindings = data_loch.get_students_query(gpa_ranges=gpa_ranges, genders=genders)
+            data_loch.safe_execute_rds(f'SELECT DISTINCT(sas.sid) {query_tables} {query_filter}', **query_bindings)
+        shapes = data_loch.get_query_stats()['shapes']
+        assert len(shapes) == 2
+        fingerprint, normalized_sql = data_loch.query_shape(f'SELECT DISTINCT(sas.sid) {query_tables} {query_filter}')
+        assert 'JOIN student.demographics d' in normalized_sql
+        assert 'sas.gpa >= ? AND sas.gpa <= ?' in normalized_sql
+        assert shapes[fingerprint]['sql'] == normalized_sql
+        assert shapes[fingerprint]['callSite'] == 'test_query_shapes'
+        assert shapes[fingerprint]['count'] == 1
+        other_shape = next(shape for f, shape in shapes.items() if f != fingerprint)
+        assert other_shape['count'] == 2
+        assert other_shape['errors'] == 0
+        assert 0 < other_shape['p50Time'] <= other_shape['p95Time'] <= other_shape['p99Time'] == other_shape['maxTime']
+
+    def test_statement_timeout_override(self, app):
+        """Cancels a query that runs past the statement timeout configured for its call site."""
+        data_loch.reset_query_stats()
+        call_site = 'test_statement_timeout_override'
+        with override_config(app, 'DATA_LOCH_RDS_STATEMENT_TIMEOUT_OVERRIDES', {call_site: 10}):
+            assert data_loch.safe_execute_rds('SELECT pg_sleep(1)') is None
+        assert data_loch.get_query_stats()['queries'][call_site]['errors'] == 1
+        # The timeout does not outlive its transaction.
+        assert data_loch.safe_execute_rds('SELECT pg_sleep(0.05) AS slept') == [{'slept': ''}]
+
+    def test_stream_rds(self):
+        """Streams the same rows as a fully materialized query, in batches of the requested size."""
+        data_loch.reset_query_stats()
+        sql = 'SELECT sid, term_id FROM student.student_enrollment_terms ORDER BY sid, term_id'
+        rows = data_loch.safe_execute_rds(sql)
+        assert len(rows) > 2
+        streamed = data_loch.stream_rds(sql, batch_size=2)
+        assert next(streamed) == rows[0]
+        assert list(streamed) == rows[1:]
+        stats = data_loch.get_query_stats()['queries']['test_stream_rds']
+        assert stats['count'] == 2
+        assert stats['rows'] == 2 * len(rows)
+
+    def test_stream_rds_abandoned(self):
+        """Releases the pooled connection when a consumer stops reading early."""
+        sql = 'SELECT sid FROM student.student_profiles'
+        for _ in range(data_loch.get_data_loch_db_rds().pool.size() + 1):
+            streamed = data_loch.stream_rds(sql, batch_size=1)
+            assert next(streamed)['sid']
+            streamed.close()
+        assert data_loch.get_data_loch_db_rds().pool.checkedout() == 0
+
+    def test_stream_rds_error(self):
+        """Raises a query error that interrupts the stream, after logging it."""
+        data_loch.reset_query_stats()
+        streamed = data_loch.stream_rds('SELECT 1 / (3 - n) AS x FROM generate_series(1, 5) AS n', batch_size=1)
+        assert next(streamed) == {'x': 0}
+        with pytest.raises(sqlalchemy.exc.SQLAlchemyError):
+            list(streamed)
+        assert data_loch.get_query_stats()['queries']['test_stream_rds_error']['errors'] == 1
+        assert data_loch.get_data_loch_db_rds().pool.checkedout() == 0
+
+    def test_stream_enrollments_for_term(self):
+        streamed = list(data_loch.stream_enrollments_for_term('2178'))
+        assert sorted(r['sid'] for r in streamed) == sorted(r['sid'] for r in data_loch.get_enrollments_for_term('2178'))
+
+    def test_submit_rds(self, app):
+        """Runs independent queries on worker threads, each with an app context, or inline if so configured."""
+        sids = ['11667051', '2345678901']
+        expected = data_loch.get_enrollments_for_term('2178', sids)
+        with override_config(app, 'DATA_LOCH_RDS_QUERY_WORKERS', 4):
+            futures = [data_loch.submit_rds(data_loch.get_enrollments_for_term, '2178', sids) for _ in range(3)]
+            assert all(f.result() == expected for f in futures)
+        future = data_loch.submit_rds(data_loch.get_enrollments_for_term, '2178', sids)
+        assert future.done()
+        assert future.result() == expected
+        with pytest.raises(ZeroDivisionError):
+            data_loch.submit_rds(lambda: 1 / 0).result()
+
+    def test_submit_rds_with_workers_busy(self, app):
+        """Runs inline rather than queue behind other reads when every worker is busy."""
+        release = Event()
+        with override_config(app, 'DATA_LOCH_RDS_QUERY_WORKERS', 4):
+            busy = [data_loch.submit_rds(release.wait) for _ in range(4)]
+            try:
+                future = data_loch.submit_rds(lambda: 1)
+                assert future.done()
+                assert future.result() == 1
+            finally:
+                release.set()
+            assert all(f.result() for f in busy)
+            assert data_loch.submit_rds(lambda: 2).result() == 2
+
+    def test_parse_json(self):
+        """Decodes JSON text with the configured decoder and passes through values the driver has already decoded."""
+        assert data_loch.parse_json('{"sid": "11667051", "units": 12.5}') == {'sid': '11667051', 'units': 12.5}
+        assert data_loch.parse_json({'sid': '11667051'}) == {'sid': '11667051'}
+        assert data_loch.parse_json(None) is None
+        assert data_loch._load_json_decoder(['no_such_json_module']) is json.loads
+
+    def test_cast_json_columns(self, app):
+        """Optionally returns JSON columns already decoded by the driver."""
+        sids = ['11667051', '2345678901']
+        text_rows = data_loch.get_enrollments_for_term('2178', sids)
+        assert isinstance(text_rows[0]['enrollment_term'], str)
+        with override_config(app, 'DATA_LOCH_RDS_CAST_JSON_COLUMNS', True):
+            decoded_rows = data_loch.get_enrollments_for_term('2178', sids)
+        assert len(decoded_rows) == len(text_rows)
+        for text_row, decoded_row in zip(text_rows, decoded_rows):
+            assert decoded_row['enrollment_term'] == data_loch.parse_json(text_row['enrollment_term'])
+
     def test_get_current_term_index(self):
         index = data_loch.get_current_term_index()
         assert index['current_term_name'] == 'Fall 2017'
@@ -0,0 +1,85 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from boac.externals import s3
+from tests.util import override_config
+
+
+class TestS3:
+
+    def test_signed_urls_reuse_credentials_and_urls(self, app, monkeypatch):
+        """Assumes the app role once, and signs each key once, while credentials and URLs are fresh."""
+        s3.clear_caches()
+        assume_role_calls = []
+        assume_role = s3._assume_role
+
+        def _counting_assume_role():
+            assume_role_calls.append(1)
+            return assume_role()
+        monkeypatch.setattr(s3, '_assume_role', _counting_assume_role)
+
+        bucket = app.config['DATA_LOCH_S3_PHOTO_BUCKET']
+        urls = s3.get_signed_urls(bucket=bucket, keys=['photo-path/1.jpg', 'photo-path/2.jpg'], expiration=900)
+        assert len(assume_role_calls) == 1
+        assert 'photo-path/1.jpg' in urls['photo-path/1.jpg']
+
+        more_urls = s3.get_signed_urls(bucket=bucket, keys=['photo-path/2.jpg', 'photo-path/3.jpg'], expiration=900)
+        assert len(assume_role_calls) == 1
+        assert more_urls['photo-path/2.jpg'] == urls['photo-path/2.jpg']
+        assert 'photo-path/3.jpg' in more_urls['photo-path/3.jpg']
+
+        # URLs and credentials too close to expiry are replaced.
+        with override_config(app, 'AWS_CREDENTIALS_REFRESH_MARGIN', s3.STS_CREDENTIALS_DURATION):
+            s3.get_signed_urls(bucket=bucket, keys=['photo-path/1.jpg'], expiration=900)
+        assert len(assume_role_calls) == 2
+        s3.clear_caches()
+
+    def test_signed_url_cache_size(self, app):
+        """Evicts least recently used URLs beyond the configured number of entries."""
+        s3.clear_caches()
+        bucket = app.config['DATA_LOCH_S3_PHOTO_BUCKET']
+        with override_config(app, 'S3_SIGNED_URL_CACHE_MAX_ENTRIES', 2):
+            s3.get_signed_urls(bucket=bucket, keys=['a.jpg', 'b.jpg'], expiration=900)
+            s3.get_signed_urls(bucket=bucket, keys=['a.jpg', 'c.jpg'], expiration=900)
+        assert list(s3.signed_urls.keys()) == [(bucket, 'a.jpg'), (bucket, 'c.jpg')]
+        s3.clear_caches()
+
+    def test_client_built_from_current_credentials(self, app, monkeypatch):
+        """Clients are cached per set of credentials, and replaced when credentials rotate."""
+        s3.clear_caches()
+        access_key_ids = iter(['FIRST', 'SECOND'])
+
+        def _assume_role():
+            return {'AccessKeyId': next(access_key_ids), 'SecretAccessKey': 'secret', 'SessionToken': 'token'}
+        monkeypatch.setattr(s3, '_assume_role', _assume_role)
+
+        client = s3._get_client()
+        assert client is s3._get_client()
+        assert client._request_signer._credentials.access_key == 'FIRST'
+        with override_config(app, 'AWS_CREDENTIALS_REFRESH_MARGIN', s3.STS_CREDENTIALS_DURATION):
+            rotated_client = s3._get_client()
+        assert rotated_client._request_signer._credentials.access_key == 'SECOND'
+        assert [access_key_id for region, access_key_id in s3.s3_clients.keys()] == ['SECOND']
+        s3.clear_caches()
@@ -0,0 +1,98 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from threading import Event
+
+from boac.lib.prefix_index import LazyIndex, PrefixIndex
+from tests.util import override_config
+
+
+class TestPrefixIndex:
+    """In-memory prefix index."""
+
+    def test_match(self):
+        index = PrefixIndex([('PAULI', 3), ('PAUL', 1), ('PATRICK', 4), ('PAUL', 2), ('QUINN', 5)])
+        assert len(index) == 5
+        assert index.match('PAUL') == [1, 2, 3]
+        assert index.match('PA') == [4, 1, 2, 3]
+        assert index.match('PAULINE') == []
+        assert index.match('') == [4, 1, 2, 3, 5]
+
+
+class TestLazyIndex:
+    """Index built in the background and rebuilt when expired."""
+
+    def test_disabled(self, app):
+        lazy_index = LazyIndex('test', lambda: PrefixIndex([]))
+        with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', False):
+            assert lazy_index.get() is None
+            assert lazy_index.build_thread is None
+
+    def test_build_in_background(self, app):
+        loads = []
+        loading = Event()
+
+        def _load():
+            loading.wait()
+            loads.append(True)
+            return PrefixIndex([('KEY', len(loads))])
+        lazy_index = LazyIndex('test', _load)
+        with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', True):
+            # Cold start: callers fall back to SQL while the index builds.
+            assert lazy_index.get() is None
+            assert lazy_index.get() is None
+            loading.set()
+            lazy_index.build_thread.join()
+            assert lazy_index.get().match('K') == [1]
+            assert len(loads) == 1
+            # Expired: the stale index is served while it is rebuilt.
+            loading.clear()
+            with override_config(app, 'TYPEAHEAD_INDEX_TTL', -1):
+                assert lazy_index.get().match('K') == [1]
+                loading.set()
+                lazy_index.build_thread.join()
+            assert lazy_index.get().match('K') == [2]
+            lazy_index.clear()
+            assert lazy_index.index is None
+
+    def test_backs_off_after_failed_build(self, app):
+        loads = []
+
+        def _load():
+            loads.append(True)
+            return None
+        lazy_index = LazyIndex('test', _load)
+        with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', True):
+            assert lazy_index.get() is None
+            lazy_index.build_thread.join()
+            assert lazy_index.failed_at
+            for _ in range(3):
+                assert lazy_index.get() is None
+            assert len(loads) == 1
+            # Once the retry interval has passed, the build is tried again.
+            with override_config(app, 'TYPEAHEAD_INDEX_RETRY_INTERVAL', 0):
+                assert lazy_index.get() is None
+                lazy_index.build_thread.join()
+            assert len(loads) == 2
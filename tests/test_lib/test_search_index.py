@@ -0,0 +1,70 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import time
+
+from boac.lib import search_index
+from tests.util import override_config
+
+
+class TestSearchIndex:
+    """Debounced refresh of search indexes."""
+
+    def test_async_refresh(self, app):
+        """Returns at once, then refreshes each stale view once writes pause."""
+        search_index.index_states.clear()
+        with override_config(app, 'SEARCH_INDEX_REFRESH_ASYNC', True), override_config(app, 'SEARCH_INDEX_REFRESH_DEBOUNCE', 0.2):
+            search_index.request_refresh(search_index.NOTE_SEARCH_INDEXES)
+            search_index.request_refresh(search_index.APPOINTMENT_SEARCH_INDEXES)
+            status = search_index.get_status()
+            assert set(status.keys()) == {'advisor_author_index', 'appointments_fts_index', 'notes_fts_index'}
+            assert status['notes_fts_index']['refreshCount'] == 0
+            assert status['notes_fts_index']['lagSeconds'] > 0
+            for i in range(100):
+                if all(s['refreshCount'] for s in search_index.get_status().values()):
+                    break
+                time.sleep(0.1)
+        status = search_index.get_status()
+        for view_name, state in status.items():
+            assert state['refreshCount'] == 1
+            assert state['errors'] == 0
+            assert state['failures'] == 0
+            assert state['lagSeconds'] == 0
+            assert state['lastLagSeconds'] >= 0.2
+            assert state['lastRefreshSeconds'] > 0
+
+    def test_failed_refresh_backs_off(self, app):
+        """Retries a failed refresh after an exponentially growing delay."""
+        search_index.index_states.clear()
+        with override_config(app, 'SEARCH_INDEX_REFRESH_DEBOUNCE', 10), override_config(app, 'SEARCH_INDEX_REFRESH_MAX_BACKOFF', 30):
+            state = search_index._get_state('no_such_view')
+            stale_since = time.time()
+            for failures, backoff in [(1, 20), (2, 30)]:
+                started_at = time.time()
+                search_index._refresh_concurrently('no_such_view', stale_since)
+                assert state['errors'] == state['failures'] == failures
+                assert state['staleSince'] == stale_since
+                assert started_at + backoff <= state['retryAt'] <= time.time() + backoff
+        search_index.index_states.clear()
@@ -0,0 +1,95 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import os
+import random
+import time
+
+from boac.lib import util
+import pytest
+
+"""Micro-benchmarks of search result snippets, which are rendered for every hit on a search results page."""
+
+# Ceiling on the mean time to snippet one note, in milliseconds. Wall-clock time depends on the machine and its load,
+# so it is enforced only when BOAC_BENCHMARK_BUDGETS is set; otherwise timings are just logged.
+ENFORCE_BUDGETS = bool(os.environ.get('BOAC_BENCHMARK_BUDGETS'))
+MAX_MEAN_MILLISECONDS = 5
+PAGE_SIZE = 50
+
+SENTENCES = [
+    'Student came in to discuss dropping {course} after the second midterm.',
+    'We reviewed the degree audit and confirmed that <b>{count}</b> breadth requirements remain.',
+    'Advised to meet with the instructor during office hours before the add/drop deadline.',
+    'Student is considering declaring the {major} major next semester.',
+    'Referred to the Tang Center for counseling &amp; will follow up in two weeks.',
+    'GPA is 2.87 this term, below the 3.0 required for continued eligibility.',
+    'Discussed summer session options and the financial aid implications.',
+    'Email from student (oski@berkeley.edu) asked about late withdrawal petitions.',
+    'Planned course load: {course}, {course} and a freshman seminar.',
+]
+COURSES = ['CHEM 3B', 'COMPSCI 61A', 'ECON 100B', 'HISTORY 7B', 'MATH 1A', 'PHYSICS 7A']
+MAJORS = ['Data Science', 'Economics', 'History', 'Molecular and Cell Biology']
+
+
+def _note_body(rng, paragraph_count):
+    paragraphs = []
+    for _ in range(paragraph_count):
+        sentences = [
+            rng.choice(SENTENCES).format(course=rng.choice(COURSES), count=rng.randint(1, 4), major=rng.choice(MAJORS))
+            for _ in range(3)
+        ]
+        paragraphs.append(f"<p>{' '.join(sentences)}</p>")
+    return ''.join(paragraphs)
+
+
+@pytest.fixture(scope='module')
+def note_bodies():
+    rng = random.Random(20201018)
+    # Mostly short and typical notes, with the occasional long write-up.
+    return [_note_body(rng, rng.choice([1, 1, 3, 3, 3, 10, 30])) for _ in range(PAGE_SIZE)]
+
+
+class TestSearchResultTextSnippetBenchmark:
+    """Search result snippet benchmarks."""
+
+    @pytest.mark.parametrize(
+        'search_phrase',
+        ['withdrawal', 'tang center', 'economics major', 'nonexistent'],
+    )
+    def test_results_page(self, app, note_bodies, search_phrase):
+        """Snippets a page of realistic note bodies, within budget if enforced."""
+        search_terms = search_phrase.split()
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for body in note_bodies:
+                util.search_result_text_snippet(body, search_terms, util.TEXT_SEARCH_PATTERN)
+            timings.append((time.perf_counter() - start) * 1000 / len(note_bodies))
+        mean_milliseconds = sum(timings) / len(timings)
+        app.logger.info(
+            f"Snippet benchmark '{search_phrase}': mean {mean_milliseconds:.3f} ms, best {min(timings):.3f} ms per result",
+        )
+        if ENFORCE_BUDGETS:
+            assert mean_milliseconds < MAX_MEAN_MILLISECONDS
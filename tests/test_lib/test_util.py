@@ -24,7 +24,10 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 
+from concurrent.futures import ThreadPoolExecutor
+
 from boac.lib import util
+from tests.util import override_config
 
 
 class TestUtil:
@@ -66,3 +69,46 @@ class TestUtil:
         assert util.unix_timestamp_to_localtime(1536300000).hour == 23
         assert util.unix_timestamp_to_localtime(1536305000).day == 7
         assert util.unix_timestamp_to_localtime(1536305000).hour == 0
+
+
+class TestSearchResultTextSnippet:
+    """Search result snippets."""
+
+    def test_highlights_stemmed_terms(self, app):
+        """Highlights words sharing a stem with a search term, stripping HTML tags."""
+        snippet = util.search_result_text_snippet(
+            '<p>Student was <b>confounded</b> by the confounding schedule.</p>',
+            ['confound'],
+            util.TEXT_SEARCH_PATTERN,
+        )
+        assert snippet == 'Student was <strong>confounded</strong> by the <strong>confounding</strong> schedule.'
+
+    def test_pads_window_around_first_match(self, app):
+        """Trims text before and after the padded window around the first match."""
+        words = [f'word{i}' for i in range(100)]
+        words[50] = 'needle'
+        with override_config(app, 'NOTES_SEARCH_RESULT_SNIPPET_PADDING', 3):
+            snippet = util.search_result_text_snippet(' '.join(words), ['needle'], util.TEXT_SEARCH_PATTERN)
+            assert snippet == '...word47 word48 word49 <strong>needle</strong> word51 word52 word53...'
+            snippet = util.search_result_text_snippet(' '.join(words[0:53]), ['needle'], util.TEXT_SEARCH_PATTERN)
+            assert snippet == '...word47 word48 word49 <strong>needle</strong> word51 word52'
+
+    def test_no_match(self, app):
+        """Without a match, returns the start of the text."""
+        with override_config(app, 'NOTES_SEARCH_RESULT_SNIPPET_PADDING', 2):
+            assert util.search_result_text_snippet('One two three four', ['five'], util.TEXT_SEARCH_PATTERN) == 'One two three...'
+            assert util.search_result_text_snippet('<p>One &amp; two</p>', ['five'], util.TEXT_SEARCH_PATTERN) == 'One & two...'
+            assert util.search_result_text_snippet('<p>One two</p>', ['five'], util.TEXT_SEARCH_PATTERN) == 'One two'
+
+    def test_thread_safe(self, app):
+        """Concurrent snippets do not share HTML parser state."""
+        def _snippets(i):
+            with app.app_context():
+                return [
+                    util.search_result_text_snippet(f'<p>Note {i} about <i>advising</i></p>', ['advise'], util.TEXT_SEARCH_PATTERN)
+                    for _ in range(200)
+                ]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(_snippets, range(16)))
+        for i, snippets in enumerate(results):
+            assert set(snippets) == {f'Note {i} about <strong>advising</strong>'}
@@ -27,7 +27,9 @@ ENHANCEMENTS, OR MODIFICATIONS.
 from boac.merged.advising_appointment import (
     get_advising_appointments,
     search_advising_appointments,
+    search_advising_appointments_page,
 )
+from boac.models.appointment import Appointment
 
 
 coe_advisor_uid = '1133399'
@@ -190,3 +192,24 @@ you got to pull up the intruder by the root of the weed; N.Y. Chew through the m
         assert results[2]['student']['lastName'] == 'Barney'
         assert results[2]['createdAt']
         assert results[2]['updatedAt'] is None
+
+    def test_search_cursor_pagination(self, fake_auth, app):
+        """Keyset cursor pages from new appointments to legacy ones in the same order as offset pagination."""
+        fake_auth.login(coe_advisor_uid)
+        expected = search_advising_appointments(search_phrase='life', limit=10)
+        # BOA appointment ids are integers, legacy ones strings.
+        assert [isinstance(a['id'], str) for a in expected] == [False, False, True]
+        for limit in [1, 2]:
+            pages = []
+            next_cursor = ''
+            while next_cursor is not None:
+                page, next_cursor = search_advising_appointments_page(search_phrase='life', limit=limit, cursor=next_cursor)
+                pages.append([a['id'] for a in page])
+            assert sum(pages, []) == [a['id'] for a in expected]
+            assert len(pages) == (3 if limit == 1 else 2)
+
+    def test_local_search_by_offset(self, fake_auth, app):
+        """Pages through BOA appointments by offset, with search snippets."""
+        results = Appointment.search(search_phrase='life', limit=1, offset=1)
+        assert len(results) == 1
+        assert results[0]['detailsSnippet'] == '<strong>Life</strong> is what happens while you\'re making appointments.'
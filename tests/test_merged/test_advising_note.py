@@ -27,10 +27,12 @@ from datetime import datetime, timedelta
 import io
 from zipfile import ZipFile
 
+from boac.api.errors import BadRequestError
 from boac.lib.util import localize_datetime, utc_now
-from boac.merged.advising_note import get_advising_notes, get_zip_stream_for_sid, search_advising_notes
+from boac.merged.advising_note import get_advising_notes, get_zip_stream_for_sid, search_advising_notes, search_advising_notes_page
 from boac.models.note import Note
 from dateutil.parser import parse
+import pytest
 import pytz
 from tests.util import mock_legacy_note_attachment
 
@@ -305,6 +307,29 @@ class TestMergedAdvisingNote:
         assert response[1]['noteSnippet'].startswith('I am <strong>confounded</strong>')
         assert response[2]['noteSnippet'].startswith('...pity the founder')
 
+    def test_search_advising_notes_cursor_pagination(self, app, fake_auth):
+        """Keyset cursor pages through new and old notes in the same order as offset pagination."""
+        fake_auth.login(coe_advisor)
+        for i in range(0, 5):
+            _create_coe_advisor_note(
+                sid='11667051',
+                subject='Planned redundancy',
+                body=f'Confounded note {i + 1}',
+            )
+        expected = search_advising_notes(search_phrase='confound', offset=0, limit=10)
+        assert len(expected) == 7
+        note_ids = []
+        next_cursor = ''
+        while next_cursor is not None:
+            page, next_cursor = search_advising_notes_page(search_phrase='confound', limit=2, cursor=next_cursor)
+            note_ids += [n['id'] for n in page]
+        assert note_ids == [n['id'] for n in expected]
+
+    def test_search_advising_notes_bad_cursor(self, app, fake_auth):
+        fake_auth.login(coe_advisor)
+        with pytest.raises(BadRequestError):
+            search_advising_notes_page(search_phrase='confound', cursor='not-a-cursor')
+
     def test_search_advising_notes_narrowed_by_author(self, app, fake_auth):
         """Narrows results for both new and legacy advising notes by author SID."""
         joni = {
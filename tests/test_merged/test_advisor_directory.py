@@ -0,0 +1,75 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from boac.externals import data_loch
+from boac.merged import calnet
+from boac.merged.advisor_directory import advisor_directory, AdvisorDirectory, calnet_users_for_uids, \
+    match_advising_note_authors_by_name
+import pytest
+from tests.util import override_config
+
+
+@pytest.fixture()
+def directory(app):
+    with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', True):
+        yield advisor_directory.rebuild()
+    advisor_directory.clear()
+
+
+def _labels(people):
+    return sorted(f"{p['first_name']} {p['last_name']} ({p['uid']})" for p in people)
+
+
+class TestAdvisorDirectory:
+    """Advisor and note author typeahead directory."""
+
+    def test_disabled(self, app):
+        """Without the directory, typeahead searches SQL and CalNet."""
+        assert advisor_directory.get() is None
+        assert _labels(match_advising_note_authors_by_name(['JO'])) == _labels(data_loch.match_advising_note_authors_by_name(['JO']))
+        assert calnet_users_for_uids(['1081940']) == calnet.get_calnet_users_for_uids(app, ['1081940'])
+
+    @pytest.mark.parametrize('prefixes', [['JO'], ['JOHN', 'DEL'], ['CH'], ['MITCHELL', 'JONI']])
+    def test_note_authors(self, app, directory, prefixes):
+        """Matches the same legacy note authors as SQL."""
+        expected = _labels(data_loch.match_advising_note_authors_by_name(prefixes))
+        assert expected
+        assert _labels(match_advising_note_authors_by_name(prefixes)) == expected
+
+    def test_limit(self, app, directory):
+        authors = match_advising_note_authors_by_name(['JO'], limit='2')
+        assert [a['uid'] for a in authors] == ['33333', '1133399']
+
+    def test_calnet_users(self, app, directory):
+        """Profiles come from the directory, or from CalNet for users new since it was built."""
+        assert '1081940' in directory.calnet_users
+        directory.calnet_users['1081940'] = {'name': 'Indexed Name', 'uid': '1081940'}
+        assert calnet_users_for_uids(['1081940'])['1081940']['name'] == 'Indexed Name'
+        del directory.calnet_users['1081940']
+        assert calnet_users_for_uids(['1081940']) == calnet.get_calnet_users_for_uids(app, ['1081940'])
+
+    def test_miss_falls_back_to_sql(self, app, directory):
+        advisor_directory.index = AdvisorDirectory([], {})
+        assert _labels(match_advising_note_authors_by_name(['JO'])) == _labels(data_loch.match_advising_note_authors_by_name(['JO']))
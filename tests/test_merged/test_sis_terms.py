@@ -78,3 +78,45 @@ class TestSisTerms:
         """Falls back on configured future term ID when not set to auto."""
         with override_config(app, 'CANVAS_FUTURE_ENROLLMENT_TERM', 'Summer 1969'):
             assert(sis_terms.future_term_id()) == '1695'
+
+    def test_all_term_ids_from_config(self, app):
+        """Counts back to the configured earliest term."""
+        with override_config(app, 'CANVAS_EARLIEST_TERM', 'Spring 2017'):
+            assert sis_terms.all_term_ids() == ['2178', '2175', '2172']
+
+
+class TestTermContext:
+
+    def test_resolved_once_per_request(self, app):
+        """Keeps term metadata on flask.g until the request ends or the term index is refreshed."""
+        from flask import g
+        from boac.models import json_cache
+        from boac.models.json_cache import JsonCache
+
+        with app.test_request_context():
+            assert sis_terms.current_term_id() == '2178'
+            assert sis_terms.future_term_id() == '2182'
+            index_row = JsonCache.query.filter_by(key='current_term_index').first()
+            index_row.json = {'current_term_name': 'Spring 2020', 'future_term_name': 'Summer 2020'}
+            json_cache.update_jsonb_row(index_row)
+            assert sis_terms.current_term_id() == '2178'
+            assert sis_terms.future_term_id() == '2182'
+            sis_terms.refresh_term_context()
+            assert sis_terms.current_term_id() == '2202'
+            assert sis_terms.current_term_name() == 'Spring 2020'
+            assert sis_terms.future_term_id() == '2205'
+            assert sis_terms.all_term_ids()[0] == '2202'
+        assert 'term_context' not in g
+
+    def test_job_context(self, app):
+        """Background jobs opt in to a term context of their own."""
+        from flask import g
+
+        sis_terms.start_term_context()
+        try:
+            assert sis_terms.current_term_id() == '2178'
+            with override_config(app, 'CANVAS_CURRENT_ENROLLMENT_TERM', 'Summer 1969'):
+                assert sis_terms.current_term_id() == '2178'
+        finally:
+            sis_terms.end_term_context()
+        assert 'term_context' not in g
@@ -23,8 +23,15 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from types import SimpleNamespace
+
+from boac.api.errors import BadRequestError, InternalServerError
+from boac.externals import data_loch
 from boac.merged import student
 from boac.models.manually_added_advisee import ManuallyAddedAdvisee
+from boac.models.student_summary_profile import StudentSummaryProfile
+import pytest
+import simplejson as json
 
 
 coe_advisor = '1133399'
@@ -66,6 +73,123 @@ class TestMergedStudent:
         assert profiles[1]['uid'] == '27182'
         assert profiles[1]['underrepresented'] is None
 
+    def test_get_full_student_profiles(self, monkeypatch):
+        """Assembles SIS, ASC and COE profile data in a single Data Loch query, matching the sequential queries."""
+        sids = ['9100000000', '11667051', '2345678901', '7890123456', '9000000000']
+        monkeypatch.setattr(student, 'get_student_query_scope', lambda: ['ADMIN'])
+        data_loch.reset_query_stats()
+        profiles = student.get_full_student_profiles(sids)
+        assert list(data_loch.get_query_stats()['queries'].keys()) == ['get_student_profiles_with_advising_data']
+        assert [p['sid'] for p in profiles] == sids
+        assert profiles[1]['athleticsProfile']
+        assert profiles[1]['coeProfile']['isActiveCoe'] is True
+        assert 'athleticsProfile' not in profiles[0]
+        assert profiles[0]['coeProfile']
+        assert 'coeProfile' not in profiles[2]
+
+        monkeypatch.setattr(data_loch, 'get_student_profiles_with_advising_data', lambda sids, include_coe: None)
+        sequential_profiles = student.get_full_student_profiles(sids)
+        for p in profiles + sequential_profiles:
+            p.pop('photoUrl')
+        assert profiles == sequential_profiles
+
+    def test_stored_summary_profiles(self, monkeypatch):
+        """Serves lists of students from summary profiles stored by the cache job, restricted to the current user's scope."""
+        monkeypatch.setattr(student, 'current_user', SimpleNamespace(can_access_canvas_data=True))
+        monkeypatch.setattr(student, 'get_student_query_scope', lambda: ['ADMIN'])
+        sids = ['11667051', '9000000000', '2345678901', '7890123456']
+        expected = student.get_summary_student_profiles(sids)
+        assert student.get_stored_summary_profiles(sids, '2178') == {}
+
+        assert student.refresh_summary_profiles('2178', batch_size=4) == 9
+        data_loch.reset_query_stats()
+        stored = student.get_summary_student_profiles(sids, term_id='2178')
+        assert '_query_ordered_sids' not in data_loch.get_query_stats()['queries']
+        for p in expected + stored:
+            p.pop('photoUrl')
+        assert json.loads(json.dumps(stored)) == json.loads(json.dumps(expected))
+
+        monkeypatch.setattr(student, 'current_user', SimpleNamespace(can_access_canvas_data=False))
+        monkeypatch.setattr(student, 'get_student_query_scope', lambda: ['QCADV'])
+        profiles = student.get_summary_student_profiles(sids, term_id='2178')
+        assert [p['sid'] for p in profiles] == sids
+        assert profiles[0]['athleticsProfile'] == {'athletics': expected[0]['athleticsProfile']['athletics']}
+        assert 'coeProfile' not in profiles[0]
+        assert profiles[0]['photoUrl']
+        for p in profiles:
+            for enrollment in p.get('term', {}).get('enrollments', []):
+                assert enrollment['canvasSites'] == []
+
+        distilled = student.get_distilled_student_profiles(sids)
+        assert [p['sid'] for p in distilled] == sids
+        assert distilled[0]['termsInAttendance'] == expected[0]['termsInAttendance']
+
+    def test_summary_profiles_refresh_aborted(self, monkeypatch):
+        """Leaves stored summary profiles alone if a loch read fails."""
+        assert student.refresh_summary_profiles('2178', batch_size=4) == 9
+        stored = StudentSummaryProfile.get_profiles_by_sid(['11667051'], '2178')
+        assert stored['11667051']['term']
+        monkeypatch.setattr(data_loch, 'get_enrollments_for_term', lambda term_id, sids=None: None)
+        with pytest.raises(InternalServerError):
+            student.refresh_summary_profiles('2178', batch_size=4)
+        assert StudentSummaryProfile.get_profiles_by_sid(['11667051'], '2178') == stored
+
+    def test_keyset_pagination(self, monkeypatch):
+        """Pages through students by cursor in the same order as offset pagination."""
+        monkeypatch.setattr(student, 'get_student_query_scope', lambda: ['ADMIN'])
+        gpa_ranges = [{'min': 0, 'max': 4}]
+        for order_by in ['last_name', 'gpa desc', 'entering_term', 'group_name', 'terms_in_attendance desc', 'units']:
+            expected = student.query_students(gpa_ranges=gpa_ranges, order_by=order_by, limit=50)
+            sids = []
+            cursor = ''
+            while cursor is not None:
+                page = student.query_students(cursor=cursor, gpa_ranges=gpa_ranges, order_by=order_by, limit=2)
+                assert 'sids' not in page
+                assert page['totalStudentCount'] == expected['totalStudentCount']
+                assert len(page['students']) <= 2
+                sids += [s['sid'] for s in page['students']]
+                cursor = page['nextCursor']
+            assert sids == [s['sid'] for s in expected['students']]
+
+        page = student.query_students(cursor='', gpa_ranges=gpa_ranges, limit=3, total_count=99)
+        assert page['totalStudentCount'] == 99
+        with pytest.raises(BadRequestError):
+            student.query_students(cursor='not-a-cursor', gpa_ranges=gpa_ranges)
+
+        expected = student.search_for_students(search_phrase='dav', order_by='major', limit=50)
+        first_page = student.search_for_students(search_phrase='dav', order_by='major', limit=2, cursor='')
+        second_page = student.search_for_students(search_phrase='dav', order_by='major', limit=2, cursor=first_page['nextCursor'])
+        assert first_page['totalStudentCount'] == second_page['totalStudentCount'] == 3
+        assert second_page['nextCursor'] is None
+        assert [s['sid'] for s in first_page['students'] + second_page['students']] == [s['sid'] for s in expected['students']]
+
+    def test_query_cache(self, monkeypatch):
+        """Serves other pages of a cohort from its cached SID list until the cache is cleared."""
+        monkeypatch.setattr(student, 'get_student_query_scope', lambda: ['ADMIN'])
+        gpa_ranges = [{'min': 0, 'max': 4}]
+        expected = student.query_students(gpa_ranges=gpa_ranges, include_sids=True, order_by='gpa desc', limit=50)
+        assert expected['totalStudentCount'] == len(expected['sids']) > 2
+
+        data_loch.reset_query_stats()
+        page = student.query_students(gpa_ranges=gpa_ranges, include_sids=True, order_by='gpa desc', offset=1, limit=2)
+        assert '_query_ordered_sids' not in data_loch.get_query_stats()['queries']
+        assert page['totalStudentCount'] == expected['totalStudentCount']
+        assert page['sids'] == expected['sids']
+        assert [s['sid'] for s in page['students']] == expected['sids'][1:3]
+
+        student.query_students(gpa_ranges=gpa_ranges, order_by='last_name', limit=2)
+        assert data_loch.get_query_stats()['queries']['_query_ordered_sids']['count'] == 1
+
+        student.clear_cohort_query_cache()
+        data_loch.reset_query_stats()
+        student.query_students(gpa_ranges=gpa_ranges, order_by='gpa desc', limit=2)
+        assert data_loch.get_query_stats()['queries']['_query_ordered_sids']['count'] == 1
+
+        # The loch reloads nightly, so entries are not read on a later date.
+        monkeypatch.setattr(student, '_loch_data_version', lambda: '20991231')
+        student.query_students(gpa_ranges=gpa_ranges, order_by='gpa desc', limit=2)
+        assert data_loch.get_query_stats()['queries']['_query_ordered_sids']['count'] == 2
+
     def test_get_historical_student_profiles(self):
         """Returns profiles of non-current students after adding them to manually_added_advisees."""
         ManuallyAddedAdvisee.query.delete()
@@ -0,0 +1,92 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from boac.externals import data_loch
+from boac.merged import student
+from boac.merged.student_name_index import match_sids_by_name, match_students_by_name_or_sid, student_name_index, \
+    StudentNameIndex
+import pytest
+from tests.util import override_config
+
+
+@pytest.fixture()
+def name_index(app):
+    with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', True):
+        index = student_name_index.rebuild()
+        yield index
+    student_name_index.clear()
+
+
+def _labels(students):
+    return sorted(f"{s['first_name']} {s['last_name']} ({s['sid']})" for s in students)
+
+
+class TestStudentNameIndex:
+    """Student name and SID typeahead index."""
+
+    def test_disabled(self, app):
+        """Without the index, typeahead searches SQL."""
+        assert student_name_index.get() is None
+        assert match_sids_by_name('Paul') is None
+        assert _labels(match_students_by_name_or_sid(['PAUL'])) == _labels(data_loch.match_students_by_name_or_sid(['PAUL']))
+
+    @pytest.mark.parametrize('prefixes', [['PAUL'], ['PAUL', 'K'], ['9'], ['9', 'NORA'], ['890'], ['JOH']])
+    def test_matches_sql(self, app, name_index, prefixes):
+        """Matches the same current and historical students as SQL."""
+        expected = _labels(data_loch.match_students_by_name_or_sid(prefixes))
+        assert expected
+        assert _labels(name_index.match_students(prefixes)) == expected
+        assert _labels(match_students_by_name_or_sid(prefixes)) == expected
+
+    def test_order_and_limit(self, app, name_index):
+        students = match_students_by_name_or_sid(['PAUL'], limit='2')
+        assert [s['sid'] for s in students] == ['7890123456', '3456789012']
+
+    def test_miss_falls_back_to_sql(self, app, name_index):
+        """A student missing from the index is found in SQL."""
+        student_name_index.index = StudentNameIndex([], [])
+        assert _labels(match_students_by_name_or_sid(['KERSCHEN'])) == ['Paul Kerschen (3456789012)']
+
+    def test_match_sids_by_name(self, app, name_index):
+        assert match_sids_by_name('paul') == {'3456789012', '7890123456', '9000000000'}
+        assert match_sids_by_name('Paul Ker') == {'3456789012'}
+        assert match_sids_by_name('Pauli-ORourke') == {'9000000000'}
+        assert match_sids_by_name('Zebulon') is None
+
+    def test_match_sids_by_name_over_threshold(self, app, name_index):
+        """A phrase matching too many students is searched in SQL."""
+        with override_config(app, 'TYPEAHEAD_INDEX_MAX_NAME_MATCHES', 2):
+            assert match_sids_by_name('paul') is None
+            assert match_sids_by_name('Paul Ker') == {'3456789012'}
+            assert student.search_for_students(search_phrase='paul')['totalStudentCount'] == 3
+
+    @pytest.mark.parametrize('search_phrase', ['Paul', 'paul ker', 'dav', 'Pauli-ORourke', 'Deborah Davies', '11667051'])
+    def test_search_for_students(self, app, name_index, search_phrase):
+        """Student search finds the same students with the index as without."""
+        indexed = student.search_for_students(search_phrase=search_phrase)
+        with override_config(app, 'TYPEAHEAD_INDEX_ENABLED', False):
+            expected = student.search_for_students(search_phrase=search_phrase)
+        assert indexed['totalStudentCount'] == expected['totalStudentCount'] > 0
+        assert [s['sid'] for s in indexed['students']] == [s['sid'] for s in expected['students']]
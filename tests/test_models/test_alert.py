@@ -27,8 +27,10 @@ from datetime import datetime, timedelta, timezone
 from time import sleep
 
 from boac import std_commit
+from boac.externals import data_loch
 from boac.models.alert import Alert
 import pytest
+from sqlalchemy.exc import OperationalError
 from tests.util import override_config
 
 
@@ -107,6 +109,86 @@ class TestAlert:
         assert len(get_current_alerts('11667051')) == 0
         assert len(get_current_alerts('3456789012')) == 0
 
+    def test_update_all_deactivating_missing(self):
+        """Deactivates alerts no longer supported by loch data, in the same pass that creates and updates the rest."""
+        Alert.update_assignment_alerts(**alert_props)
+        Alert.update_all_for_term(2178)
+        assert len(get_current_alerts('11667051')) == 3
+        ids_before = {a['id'] for a in get_current_alerts('11667051')}
+
+        Alert.update_all_for_term(2178, deactivate_missing=True)
+        alerts = get_current_alerts('11667051')
+        assert len(alerts) == 2
+        assert '2178_987654321' not in [a['key'] for a in alerts]
+        assert {a['id'] for a in alerts} < ids_before
+        assert len(get_current_alerts('3456789012')) == 1
+
+        alert_count = Alert.query.filter(Alert.sid == '11667051').count()
+        Alert.update_all_for_term(2178, deactivate_missing=True)
+        assert {a['id'] for a in get_current_alerts('11667051')} == {a['id'] for a in alerts}
+        assert Alert.query.filter(Alert.sid == '11667051').count() == alert_count
+
+    def test_update_all_interrupted_stream(self, monkeypatch):
+        """Deactivates nothing if loch data could not be read in full."""
+        Alert.update_all_for_term(2178)
+        ids_before = {a['id'] for a in get_current_alerts('11667051') + get_current_alerts('3456789012')}
+        assert ids_before
+        stream_student_profiles = data_loch.stream_student_profiles
+
+        def _interrupted_stream():
+            yield next(stream_student_profiles())
+            raise OperationalError('SELECT', {}, Exception('connection lost'))
+        monkeypatch.setattr(data_loch, 'stream_student_profiles', _interrupted_stream)
+        with pytest.raises(OperationalError):
+            Alert.update_all_for_term(2178, deactivate_missing=True)
+        assert {a['id'] for a in get_current_alerts('11667051') + get_current_alerts('3456789012')} == ids_before
+
+    def test_term_id(self):
+        """Stores the term of term-specific alerts."""
+        Alert.update_assignment_alerts(**alert_props)
+        assert Alert.query.filter_by(key='2178_987654321').first().term_id == '2178'
+        Alert.create(sid='11667051', alert_type='late_assignment', message='Late.')
+        assert Alert.query.filter_by(alert_type='late_assignment').first().term_id is None
+        Alert.update_all_for_term(2178)
+        assert {a.term_id for a in Alert.query.filter(Alert.key.like('2178_%')).all()} == {'2178'}
+
+    def test_alert_counts_rollup(self):
+        """Maintains per-student alert counts, net of alerts dismissed by each viewer."""
+        from boac.models.authorized_user import AuthorizedUser
+        viewer_id = AuthorizedUser.get_id_per_uid('2040')
+        sids = ['11667051', '3456789012']
+
+        def _alert_counts():
+            return {a['sid']: a['alertCount'] for a in Alert.current_alert_counts_for_sids(viewer_id, sids, count_only=True)}
+        assert _alert_counts() == {}
+        Alert.update_all_for_term(2178)
+        Alert.update_assignment_alerts(**alert_props)
+        assert _alert_counts() == {'11667051': 3, '3456789012': 1}
+
+        alert = Alert.query.filter_by(sid='3456789012', active=True).first()
+        Alert.dismiss(alert.id, viewer_id)
+        assert _alert_counts() == {'11667051': 3}
+        assert Alert.current_alert_counts_for_sids(AuthorizedUser.get_id_per_uid('6446'), sids, count_only=True)
+
+        alert.deactivate()
+        Alert.deactivate_all(sid='11667051', term_id='2178', alert_types=['missing_assignment'])
+        assert _alert_counts() == {'11667051': 2}
+        Alert.deactivate_all_for_term(2178)
+        assert _alert_counts() == {}
+
+    def test_alert_counts_rebuild_in_place(self):
+        """Rebuilds update existing count rows and remove rows no longer counted."""
+        from boac import db
+        from sqlalchemy import text
+        Alert.update_all_for_term(2178)
+        db.session.execute(text("INSERT INTO alert_counts (sid, term_id, alert_count) VALUES ('2345678901', '2178', 7)"))
+        db.session.execute(text("UPDATE alert_counts SET alert_count = 99 WHERE sid = '11667051'"))
+        Alert.refresh_alert_counts(term_id='2178')
+        Alert.refresh_alert_counts(sids=['11667051'], term_id='2178')
+        counts = dict(db.session.execute(text("SELECT sid, alert_count FROM alert_counts WHERE term_id = '2178'")).fetchall())
+        assert '2345678901' not in counts
+        assert counts['11667051'] == Alert.query.filter_by(sid='11667051', term_id='2178', active=True).count()
+
     def test_assignment_alerts_change_updated_at_timestamp(self):
         Alert.update_all_for_term(2178)
         alerts = Alert.current_alerts_for_sid(sid='3456789012', viewer_id='2040')
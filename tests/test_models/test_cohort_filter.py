@@ -23,12 +23,13 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
-from boac import std_commit
+from boac import db, std_commit
 from boac.api.errors import InternalServerError
 from boac.models.authorized_user import AuthorizedUser
 from boac.models.cohort_filter import CohortFilter
 import pytest
 from tests.test_api.api_test_utils import all_cohorts_owned_by
+from tests.util import override_config
 
 asc_advisor_uid = '2040'
 coe_advisor_uid = '1133399'
@@ -167,6 +168,83 @@ class TestCohortFilter:
         assert admit_cohort
         assert admit_cohort.to_api_json()['name'] == expected_name
 
+    def test_refresh_all_counts(self, monkeypatch):
+        """Evaluates each distinct criteria set once and stores sids, counts and membership events for all cohorts."""
+        from boac.models import cohort_filter
+        from boac.models.cohort_filter_event import CohortFilterEvent
+        criteria = {'groupCodes': ['MFB-DB', 'MFB-DL', 'MFB-MLB', 'MFB-OLB']}
+        cohort_ids = [
+            CohortFilter.create(uid=asc_advisor_uid, name='Football, Defense', filter_criteria=criteria)['id'],
+            CohortFilter.create(uid=coe_advisor_uid, name='Also Football, Defense', filter_criteria=criteria)['id'],
+        ]
+        expected_sids = sorted(CohortFilter.get_sids(cohort_ids[0]))
+        CohortFilter.query.filter(CohortFilter.id.in_(cohort_ids)).update({'sids': expected_sids[1:]}, synchronize_session=False)
+        std_commit()
+        db.session.expire_all()
+
+        evaluated = []
+        query_students = cohort_filter._query_students
+
+        def _counting_query_students(**kwargs):
+            evaluated.append(kwargs['criteria'])
+            return query_students(**kwargs)
+        monkeypatch.setattr(cohort_filter, '_query_students', _counting_query_students)
+        CohortFilter.refresh_all_counts()
+        std_commit()
+
+        assert evaluated.count(criteria) == 1
+        for cohort_id in cohort_ids:
+            cohort = CohortFilter.query.filter_by(id=cohort_id).first()
+            assert sorted(CohortFilter.get_sids(cohort_id)) == expected_sids
+            assert cohort.student_count == len(expected_sids)
+            assert cohort.alert_count >= 0
+            events = CohortFilterEvent.events_for_cohort(cohort_id)
+            assert events['count'] == len(expected_sids) + 1
+            assert events['events'][0].sid == expected_sids[0]
+            assert events['events'][0].event_type == 'added'
+
+    def test_page_of_stored_cohort(self, app, monkeypatch):
+        """Once SIDs and student count are stored, fetches a page of students without the full list of SIDs."""
+        from boac.externals import data_loch
+        from boac.merged import student
+        monkeypatch.setattr(student, 'get_student_query_scope', lambda: ['ADMIN'])
+        with override_config(app, 'COHORT_QUERY_CACHE_ENABLED', False):
+            criteria = {'groupCodes': ['MFB-DB', 'MFB-DL', 'MFB-MLB', 'MFB-OLB']}
+            cohort_id = CohortFilter.create(uid=asc_advisor_uid, name='Football, Defense', filter_criteria=criteria)['id']
+            cohort = CohortFilter.query.filter_by(id=cohort_id).first()
+            expected = cohort.to_api_json(limit=1, include_sids=True)
+            assert cohort.student_count == expected['totalStudentCount'] == len(expected['sids']) > 1
+
+            data_loch.reset_query_stats()
+            page = cohort.to_api_json(offset=1, limit=1, include_sids=True)
+            queries = data_loch.get_query_stats()['queries']
+            assert queries['query_students']['count'] == 1
+            assert queries['query_students']['rows'] == 1
+            assert '_count_students' not in queries
+            assert page['totalStudentCount'] == expected['totalStudentCount']
+            assert sorted(page['sids']) == sorted(expected['sids'])
+            assert len(page['students']) == 1
+
+            page = student.query_students(group_codes=criteria['groupCodes'], include_sids=False, limit=1)
+            assert 'sids' not in page
+            assert page['totalStudentCount'] == expected['totalStudentCount']
+            assert [s['sid'] for s in page['students']] == [s['sid'] for s in expected['students']]
+
+    def test_track_membership_changes(self):
+        """Records added and removed SIDs when a cleared cohort is recounted."""
+        from boac.models.cohort_filter_event import CohortFilterEvent
+        criteria = {'groupCodes': ['MFB-DB', 'MFB-DL', 'MFB-MLB', 'MFB-OLB']}
+        cohort_id = CohortFilter.create(uid=asc_advisor_uid, name='Football, Defense', filter_criteria=criteria)['id']
+        cohort = CohortFilter.query.filter_by(id=cohort_id).first()
+        sids = sorted(cohort.sids)
+        cohort.update_sids_and_student_count(sids[1:] + ['0000000000'], len(sids))
+        cohort.clear_sids_and_student_count()
+        cohort.to_api_json()
+        assert sorted(cohort.sids) == sids
+
+        events = CohortFilterEvent.events_for_cohort(cohort_id)['events']
+        assert [(e.sid, e.event_type) for e in events[0:2]] == [('0000000000', 'removed'), (sids[0], 'added')]
+
 
 def cohort_count(user_uid):
     return len(all_cohorts_owned_by(user_uid))
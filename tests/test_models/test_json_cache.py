@@ -0,0 +1,116 @@
+"""
+Copyright ©2020. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from boac import std_commit
+from boac.merged import sis_terms
+from boac.models import json_cache
+from boac.models.json_cache import JsonCache
+import pytest
+from tests.util import override_config
+
+
+@pytest.fixture()
+def l1_enabled(app):
+    json_cache.l1_cache.invalidate()
+    with override_config(app, 'JSON_CACHE_L1_ENABLED', True):
+        yield
+    json_cache.l1_cache.invalidate()
+
+
+@pytest.mark.usefixtures('db_session', 'l1_enabled')
+class TestL1Cache:
+    """In-process tier in front of the json_cache table."""
+
+    def test_stowed_lookup_served_in_process(self):
+        """Second lookup of a stowed key does not go to the database."""
+        index = sis_terms.get_current_term_index()
+        JsonCache.query.filter_by(key='current_term_index').delete()
+        assert sis_terms.get_current_term_index() == index
+        assert json_cache.l1_cache.stats()['entries'] == 1
+
+    def test_clear_invalidates(self):
+        sis_terms.get_current_term_index()
+        generation = json_cache.l1_cache.stats()['generation']
+        index_row = JsonCache.query.filter_by(key='current_term_index').first()
+        index_row.json = {'current_term_name': 'Spring 2020'}
+        json_cache.update_jsonb_row(index_row)
+        assert sis_terms.get_current_term_index() == {'current_term_name': 'Spring 2020'}
+        json_cache.clear('current_term_index')
+        assert json_cache.l1_cache.stats()['generation'] == generation + 1
+        assert sis_terms.get_current_term_index()['current_term_name'] == 'Fall 2017'
+
+    def test_clear_invalidates_again_on_commit(self):
+        """Drops values cached from rows that other sessions read before the delete committed."""
+        json_cache.clear('l1_test_%')
+        json_cache.l1_cache.put('l1_test_key', {'a': 1}, json_cache.l1_cache.generation)
+        assert json_cache.l1_cache.get('l1_test_key') == {'a': 1}
+        std_commit(allow_test_environment=True)
+        assert json_cache.l1_cache.get('l1_test_key') is None
+        json_cache.l1_cache.put('l1_test_key', {'a': 1}, json_cache.l1_cache.generation)
+        std_commit(allow_test_environment=True)
+        assert json_cache.l1_cache.get('l1_test_key') == {'a': 1}
+
+    def test_lookup_spanning_clear_not_cached(self):
+        """A value fetched before a clear is not cached after it."""
+        generation = json_cache.l1_cache.generation
+        json_cache.l1_cache.invalidate()
+        json_cache.l1_cache.put('stale', {'a': 1}, generation)
+        assert json_cache.l1_cache.get('stale') is None
+
+    def test_cached_copy_not_mutated(self):
+        index = sis_terms.get_current_term_index()
+        index['current_term_name'] = 'Summer 1969'
+        assert sis_terms.get_current_term_index()['current_term_name'] == 'Fall 2017'
+
+    def test_ttl(self, app):
+        with override_config(app, 'JSON_CACHE_L1_TTL', -1):
+            json_cache.l1_cache.put('expired', {'a': 1}, json_cache.l1_cache.generation)
+        assert json_cache.l1_cache.get('expired') is None
+        assert json_cache.l1_cache.stats()['entries'] == 0
+
+    def test_lru_eviction_by_count(self, app):
+        cache = json_cache.l1_cache
+        with override_config(app, 'JSON_CACHE_L1_MAX_ENTRIES', 2):
+            cache.put('a', 1, cache.generation)
+            cache.put('b', 2, cache.generation)
+            assert cache.get('a') == 1
+            cache.put('c', 3, cache.generation)
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+    def test_lru_eviction_by_size(self, app):
+        cache = json_cache.l1_cache
+        with override_config(app, 'JSON_CACHE_L1_MAX_SIZE', 20):
+            cache.put('a', 'x' * 8, cache.generation)
+            cache.put('b', 'y' * 8, cache.generation)
+            assert cache.stats()['size'] == 20
+            cache.put('c', 'z' * 8, cache.generation)
+            assert cache.stats()['size'] == 20
+            cache.put('d', 'x' * 100, cache.generation)
+        assert cache.get('a') is None
+        assert cache.get('b') == 'y' * 8
+        assert cache.get('c') == 'z' * 8
+        assert cache.get('d') is None